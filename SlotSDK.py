@@ -1,4 +1,3 @@
-
 """
 TelePAT SlotSDK - Python SDK for communicating with Relay servers
 
@@ -10,15 +9,24 @@ This SDK handles all communication with the Relay server including:
 - Message handling
 """
 
-import json
+import random
 import socket
 import platform
+import queue
+import threading
 import time
 import uuid
+from collections import deque, OrderedDict
 from datetime import datetime, UTC
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable
 from urllib.parse import urlparse, urlunparse
 
+import jsoncodec
+from hostmetrics import HostSampler
+from scheduler import Scheduler, default_scheduler
+from spool import Spool
+from telelog import get_logger, SAMPLE_100
+
 try:
     import websocket
 except ImportError:
@@ -28,9 +36,149 @@ except ImportError:
     sys.exit(1)
 
 
-def _log_timestamp():
-    """Return formatted timestamp for logging"""
-    return datetime.now().strftime("%H:%M:%S.%f")[:-3]
+log = get_logger("sdk")
+
+
+class RttStats:
+    """
+    Round-trip time statistics for one relay connection
+
+    Keeps an RFC 6298 style smoothed RTT / RTT variance plus a coarse
+    histogram of ping/pong samples. The smoothed values of the previous
+    connection can be passed as a seed so timeouts stay sensible right
+    after a reconnect.
+    """
+
+    # Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, url: str, seed: Optional["RttStats"] = None):
+        self.url = url
+        self.started_at = time.time()
+        self.samples = 0
+        self.last = None
+        self.min = None
+        self.max = None
+        self.srtt = seed.srtt if seed else None
+        self.rttvar = seed.rttvar if seed else None
+        self.histogram = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def add(self, rtt: float):
+        """Record one RTT sample in seconds"""
+        self.samples += 1
+        self.last = rtt
+        self.min = rtt if self.min is None else min(self.min, rtt)
+        self.max = rtt if self.max is None else max(self.max, rtt)
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        rtt_ms = rtt * 1000
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if rtt_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def rto(self) -> Optional[float]:
+        """Retransmission-style timeout estimate (srtt + 4 * rttvar), None without samples"""
+        if self.srtt is None:
+            return None
+        return self.srtt + max(0.001, 4 * self.rttvar)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the statistics as a plain dict (times in milliseconds)"""
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        return {
+            "url": self.url,
+            "connected_for": round(time.time() - self.started_at, 1),
+            "samples": self.samples,
+            "last_ms": ms(self.last),
+            "min_ms": ms(self.min),
+            "max_ms": ms(self.max),
+            "srtt_ms": ms(self.srtt),
+            "rttvar_ms": ms(self.rttvar),
+            "histogram": dict(zip(labels, self.histogram))
+        }
+
+
+class KeyedDispatcher:
+    """
+    Bounded worker pool that runs message handlers off the receive thread
+
+    Every key is pinned to one worker (by hash), so handlers for the same
+    agent or command run in arrival order while different keys proceed in
+    parallel. Worker queues are bounded: when a queue is full, submit()
+    waits up to put_timeout seconds and then drops the task.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 1000, put_timeout: float = 1.0, name: str = "sdk-handler"):
+        self.workers = max(1, workers)
+        self.put_timeout = put_timeout
+        self.name = name
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self.threads:
+                return
+            for index, work_queue in enumerate(self.queues):
+                thread = threading.Thread(target=self._worker, args=(work_queue,), name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, key: Any, fn: Callable, *args) -> bool:
+        """
+        Queue fn(*args) on the worker that owns key
+
+        Returns:
+            True if queued, False if the worker queue stayed full
+        """
+        if not self.threads:
+            self.start()
+        work_queue = self.queues[hash(key) % self.workers]
+        try:
+            work_queue.put((fn, args), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            log.warning("Handler queue full, dropping task for key %s", key)
+            return False
+
+    def pending(self) -> int:
+        """Number of tasks waiting in all worker queues"""
+        return sum(work_queue.qsize() for work_queue in self.queues)
+
+    def stop(self):
+        """Ask the workers to exit once their queues are drained"""
+        with self._lock:
+            for work_queue in self.queues:
+                try:
+                    work_queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            self.threads = []
+
+    def _worker(self, work_queue: queue.Queue):
+        while True:
+            task = work_queue.get()
+            if task is None:
+                return
+            fn, args = task
+            try:
+                fn(*args)
+            except Exception as e:
+                log.exception("Handler error: %s", e)
 
 
 class SlotSDK:
@@ -47,7 +195,25 @@ class SlotSDK:
         slot_id: str,
         command_handler: Callable[[Dict[str, Any]], None],
         heartbeat_interval: int = 10,
-        command_poll_interval: int = 5
+        command_poll_interval: int = 5,
+        reconnect_base_delay: float = 0.1,
+        max_reconnect_delay: float = 300,
+        dedicated_retry_limit: int = 3,
+        outbox_limit: int = 1000,
+        ping_interval: float = 3,
+        ping_timeout: float = 2,
+        min_request_timeout: float = 2.0,
+        max_request_timeout: float = 15.0,
+        timeout_rtt_multiplier: float = 8,
+        handler_workers: int = 4,
+        handler_queue_size: int = 1000,
+        scheduler: Optional[Scheduler] = None,
+        ack_timeout: float = 10.0,
+        max_send_attempts: int = 5,
+        spool_dir: Optional[str] = None,
+        spool_max_bytes: int = 1024 * 1024 * 1024,
+        stable_session: float = 30.0,
+        send_window: int = 0
     ):
         """
         Initialize the SlotSDK
@@ -57,7 +223,41 @@ class SlotSDK:
             slot_id: Unique identifier for this slot (server.py instance)
             command_handler: Callback function to handle command execution
             heartbeat_interval: Seconds between heartbeat messages (default: 10)
-            command_poll_interval: Seconds between command poll requests (default: 5)
+            command_poll_interval: Unused, kept for compatibility (commands are requested on demand)
+            reconnect_base_delay: Smallest reconnect backoff in seconds (default: 0.1)
+            max_reconnect_delay: Largest reconnect backoff in seconds (default: 300)
+            dedicated_retry_limit: Failed attempts on the cached dedicated port before
+                falling back to a full SLOT_REGISTER handshake (default: 3)
+            outbox_limit: Max outbound messages kept while disconnected (default: 1000)
+            ping_interval: Seconds between WebSocket pings, 0 disables keepalive (default: 3)
+            ping_timeout: Seconds to wait for a pong before the connection is
+                considered dead; must be below ping_interval (default: 2)
+            min_request_timeout: Lower bound for RTT-derived request timeouts (default: 2.0)
+            max_request_timeout: Upper bound for RTT-derived request timeouts (default: 15.0)
+            timeout_rtt_multiplier: Request timeout as a multiple of the RTT
+                estimate, leaving room for relay/core processing (default: 8)
+            handler_workers: Threads running command_handler and other slow
+                callbacks off the receive thread (default: 4)
+            handler_queue_size: Max queued messages per handler thread (default: 1000)
+            scheduler: Timer thread for heartbeats, request expiry and reconnect
+                backoff (default: the process-wide default_scheduler())
+            ack_timeout: Seconds to wait for the relay's ACK of a RESULT or
+                COMMAND_STATUS_UPDATE before re-sending it; 0 sends them
+                fire-and-forget (default: 10)
+            max_send_attempts: Sends of an unacknowledged message before it is
+                given up on (default: 5). Spooled messages are never given up
+                on; past this limit they are only re-sent after a reconnect
+            spool_dir: Directory of the on-disk spool that every RESULT and
+                COMMAND_STATUS_UPDATE is written to until the relay ACKs it,
+                so they survive outages and restarts (default: None, in memory only)
+            spool_max_bytes: Spool size limit; sends block and then raise
+                SpoolFull when it is reached (default: 1 GB)
+            stable_session: Seconds a dedicated session must stay up before a
+                drop is retried after only a short jitter; sessions that drop
+                sooner back off like failed attempts (default: 30)
+            send_window: Max reliable messages sent but not yet acknowledged;
+                the rest wait (in the spool, when there is one) and go out as
+                ACKs free room. 0 means no limit (default: 0)
         """
         self.registration_url = relay_url
         self.assigned_url: Optional[str] = None
@@ -71,7 +271,64 @@ class SlotSDK:
         self.heartbeat_interval = heartbeat_interval
         self.last_heartbeat = 0
         self.command_poll_interval = command_poll_interval
-        self.last_command_poll = 0
+        self.scheduler = scheduler or default_scheduler()
+        self._heartbeat_timer = None
+        self._wakeup = threading.Event()
+
+        # Reconnect state: the dedicated port is kept across drops and retried first
+        self.on_dedicated_port = False
+        self.dedicated_failures = 0
+        self.dedicated_retry_limit = dedicated_retry_limit
+        self.reconnect_base_delay = reconnect_base_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stable_session = stable_session
+        self._reconnect_now = False
+        self._session_opened: Optional[float] = None  # monotonic time the dedicated session opened
+
+        # Messages that could not be sent while disconnected, replayed on reconnect
+        self.outbox = deque()
+        self.outbox_limit = outbox_limit
+        self._send_lock = threading.RLock()
+
+        # Request messages (GET_COMMANDS, AGENT_REGISTER) still waiting for a reply,
+        # re-sent after a reconnect so their waiters survive the gap
+        self._inflight_requests = {}  # message_id -> message
+
+        # Messages awaiting an ACK, in send order: message_id -> [message, attempts, sent_at, on_ack]
+        # (message is None for spooled messages; their encoded form is read back from the spool)
+        self.ack_timeout = ack_timeout
+        self.max_send_attempts = max_send_attempts
+        self._unacked = OrderedDict()
+        self._ack_timer = None
+        self.send_window = send_window
+        self._in_window = 0  # entries of _unacked that have been sent (sent_at set)
+
+        # Durable copy of _unacked; messages left from a previous run are replayed on connect
+        self.spool: Optional[Spool] = None
+        if spool_dir and ack_timeout:
+            self.spool = Spool(spool_dir, max_bytes=spool_max_bytes)
+            for message_id in self.spool.pending():
+                self._unacked[message_id] = [None, 0, None, None]
+            if self._unacked:
+                log.info("Recovered %d unacknowledged message(s) from spool %s", len(self._unacked), spool_dir)
+        elif spool_dir:
+            log.warning("Spool disabled: it needs relay ACKs (ack_timeout > 0)")
+
+        # Keepalive and per-connection RTT statistics
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout if ping_interval else None
+        self.min_request_timeout = min_request_timeout
+        self.max_request_timeout = max_request_timeout
+        self.timeout_rtt_multiplier = timeout_rtt_multiplier
+        self.rtt: Optional[RttStats] = None
+        self.previous_rtt: Optional[RttStats] = None
+
+        # Host/process load reported in heartbeats
+        self.host_sampler = HostSampler()
+        self.hostname = socket.gethostname()
+
+        # Slow callbacks run here; request/response correlation stays on the receive thread
+        self.dispatcher = KeyedDispatcher(workers=handler_workers, queue_size=handler_queue_size)
 
         # Track pending agent registrations and their responses
         self.pending_agent_registrations = {}  # message_id -> event for waiting
@@ -81,6 +338,12 @@ class SlotSDK:
         self.pending_command_requests = {}  # message_id -> event for waiting
         self.command_responses = {}  # message_id -> command data or None
 
+        # Non-blocking command requests: message_id -> (callback, expiry timer)
+        self.command_callbacks = {}
+
+        # Non-blocking agent registrations: message_id -> (callback, expiry timer)
+        self.registration_callbacks = {}
+
     def connect(self, url: str = None):
         """
         Connect to the Relay WebSocket server
@@ -89,14 +352,20 @@ class SlotSDK:
             url: Optional specific URL to connect to (defaults to assigned_url or registration_url)
         """
         connect_url = url or (self.assigned_url if self.registered else self.registration_url)
-        print(f"[{_log_timestamp()}] [SDK] Connecting to Relay at {connect_url}...")
+        log.info("Connecting to Relay at %s...", connect_url)
+
+        # Fresh statistics per connection, seeded with the last known RTT
+        if self.rtt and self.rtt.samples:
+            self.previous_rtt = self.rtt
+        self.rtt = RttStats(connect_url, seed=self.previous_rtt)
 
         self.ws = websocket.WebSocketApp(
             connect_url,
             on_message=self.on_message,
             on_error=self.on_error,
             on_close=self.on_close,
-            on_open=self.on_open
+            on_open=self.on_open,
+            on_pong=self.on_pong
         )
 
         # Set max message size to None (unlimited) for large file transfers
@@ -107,53 +376,103 @@ class SlotSDK:
         self.connected = True
 
         if not self.registered:
-            print(f"[{_log_timestamp()}] [SDK] Connected to Relay registration port")
+            log.info("Connected to Relay registration port")
             self.register()
         else:
-            print(f"[{_log_timestamp()}] [SDK] Connected to dedicated port: {self.assigned_url}")
-            print(f"[{_log_timestamp()}] [SDK] Heartbeat enabled (command polling is on-demand only)")
+            log.info("Connected to dedicated port: %s (heartbeat enabled, command polling is on-demand only)", self.assigned_url)
+            self.on_dedicated_port = True
+            self.dedicated_failures = 0
+            self._session_opened = time.monotonic()
+            # Replay whatever was queued or left unanswered while we were away
+            self._flush_outbox()
             # Send a heartbeat immediately after reconnecting
             self.send_heartbeat()
             # Don't automatically request commands - let agents poll when they want
 
     def on_message(self, ws, message):
-        """Handle incoming messages from Relay"""
+        """
+        Handle incoming messages from Relay
+
+        ACKs and responses to pending GET_COMMANDS requests are resolved
+        right here so waiters wake up immediately. Everything else (the user
+        command_handler) goes to the dispatcher, keyed by agent or command,
+        so a slow handler never holds up the receive loop.
+        """
         try:
-            msg = json.loads(message)
+            msg = jsoncodec.loads(message)
             msg_type = msg.get("type")
 
             if msg_type == "ACK":
                 self.handle_ack(msg)
             elif msg_type == "COMMAND":
-                self.handle_command(msg)
+                if not self._resolve_command_response(msg):
+                    payload = msg.get("payload") or {}
+                    key = payload.get("agent_id") or msg.get("agent_id") or payload.get("command_id") or msg.get("id")
+                    self.dispatcher.submit(key, self.handle_command, msg)
             else:
-                print(f"[{_log_timestamp()}] [SDK] Unknown message type: {msg_type}")
+                log.warning("Unknown message type: %s", msg_type)
 
-        except json.JSONDecodeError as e:
-            print(f"[{_log_timestamp()}] [SDK] Failed to parse message: {e}")
+        except jsoncodec.DecodeError as e:
+            log.warning("Failed to parse message: %s", e)
         except Exception as e:
-            print(f"[{_log_timestamp()}] [SDK] Error handling message: {e}")
+            log.exception("Error handling message: %s", e)
+
+    def on_pong(self, ws, data):
+        """Record the round-trip time of the keepalive ping that was just answered"""
+        if ws.last_ping_tm and self.rtt:
+            self.rtt.add(max(0.0, ws.last_pong_tm - ws.last_ping_tm))
+
+    def request_timeout(self, default: float) -> float:
+        """
+        Timeout for a request/response exchange with the relay
+
+        Derived from the measured RTT of the current connection (or the
+        previous one right after a reconnect), clamped between
+        min_request_timeout and max_request_timeout.
+
+        Args:
+            default: Timeout to use while no RTT sample exists yet
+
+        Returns:
+            Timeout in seconds
+        """
+        rto = self.rtt.rto() if self.rtt else None
+        if rto is None:
+            return default
+        return min(self.max_request_timeout, max(self.min_request_timeout, rto * self.timeout_rtt_multiplier))
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Return RTT statistics of the current and previous connection and send backlogs"""
+        return {
+            "connected": self.connected,
+            "current": self.rtt.snapshot() if self.rtt else None,
+            "previous": self.previous_rtt.snapshot() if self.previous_rtt else None,
+            "request_timeout": round(self.request_timeout(5), 3),
+            "outbox": len(self.outbox),
+            "unacked": len(self._unacked),
+            "spool": self.spool.snapshot() if self.spool else None
+        }
 
     def on_error(self, ws, error):
         """Handle WebSocket errors"""
-        print(f"[{_log_timestamp()}] [SDK] WebSocket error: {error}")
+        log.warning("WebSocket error: %s", error)
 
     def on_close(self, ws, close_status_code, close_msg):
         """Handle WebSocket connection close"""
         self.connected = False
-        print(f"[{_log_timestamp()}] [SDK] Connection closed: {close_status_code} - {close_msg}")
+        self.on_dedicated_port = False
+        log.info("Connection closed: %s - %s", close_status_code, close_msg)
 
         # If we're switching ports intentionally, don't reset
         if self.switching_ports:
-            print(f"[{_log_timestamp()}] [SDK] Switching to dedicated port...")
+            log.info("Switching to dedicated port...")
             self.switching_ports = False
+            self._reconnect_now = True
             return
 
-        # If we were on a dedicated port, immediately reset to re-register
+        # Keep the dedicated port cached - run() retries it before re-registering
         if self.registered:
-            print(f"[{_log_timestamp()}] [SDK] Dedicated port connection lost. Will re-register on next connection.")
-            self.registered = False
-            self.assigned_url = None
+            log.warning("Dedicated port connection lost. Will retry %s first.", self.assigned_url)
 
     def register(self):
         """Send registration message to Relay"""
@@ -178,7 +497,7 @@ class SlotSDK:
         }
 
         self.send_message(message)
-        print(f"[{_log_timestamp()}] [SDK] Registration sent: slot_id={self.slot_id}")
+        log.info("Registration sent: slot_id=%s", self.slot_id)
 
     def handle_ack(self, msg: Dict[str, Any]):
         """Handle acknowledgment messages"""
@@ -188,32 +507,55 @@ class SlotSDK:
         assigned_port = payload.get("assigned_port", 0)
         agent_id = payload.get("agent_id")  # For AGENT_REGISTER ACK
 
-        print(f"[{_log_timestamp()}] [SDK] ACK received: message_id={message_id}, success={success}, agent_id={agent_id}")
-        print(f"[{_log_timestamp()}] [SDK] DEBUG: Pending registrations: {list(self.pending_agent_registrations.keys())}")
+        log.debug("ACK received: message_id=%s success=%s agent_id=%s", message_id, success, agent_id)
+
+        callback = self.registration_callbacks.pop(message_id, None)
+        if callback is not None:
+            fn, expiry = callback
+            expiry.cancel()
+            self._inflight_requests.pop(message_id, None)
+            if success and agent_id:
+                log.info("Agent registration successful: agent_id=%s", agent_id)
+                response = agent_id
+            else:
+                response = {"error": payload.get("error", "Unknown error")}
+                log.warning("Agent registration failed: %s", response["error"])
+            try:
+                fn(response)
+            except Exception as e:
+                log.exception("Registration callback failed: %s", e)
+            return
+
+        if message_id in self._unacked:
+            if not success:
+                log.warning("Relay rejected message %s: %s", message_id, payload.get("error", "Unknown error"))
+            self._acknowledge(message_id, success)
+            return
 
         # Check if this is an agent registration ACK
         if message_id in self.pending_agent_registrations:
             if success and agent_id:
-                print(f"[{_log_timestamp()}] [SDK] Agent registration successful: agent_id={agent_id}")
+                log.info("Agent registration successful: agent_id=%s", agent_id)
                 self.agent_registration_responses[message_id] = agent_id
             else:
                 error = payload.get("error", "Unknown error")
-                print(f"[{_log_timestamp()}] [SDK] Agent registration failed: {error}")
+                log.warning("Agent registration failed: %s", error)
                 self.agent_registration_responses[message_id] = {"error": error}
 
             # Signal the waiting thread
+            self._inflight_requests.pop(message_id, None)
             if message_id in self.pending_agent_registrations:
                 self.pending_agent_registrations[message_id].set()
             return
 
         if not success:
             error = payload.get("error", "")
-            print(f"[{_log_timestamp()}] [SDK] ACK error: {error}")
+            log.warning("ACK error: %s", error)
             return
 
         # Check if this is a slot registration ACK with port assignment
         if assigned_port > 0 and not self.registered:
-            print(f"[{_log_timestamp()}] [SDK] Port assigned: {assigned_port}")
+            log.info("Port assigned: %s", assigned_port)
 
             # Parse the registration URL to replace port
             parsed = urlparse(self.registration_url)
@@ -236,8 +578,7 @@ class SlotSDK:
                 parsed.fragment
             ))
 
-            print(f"[{_log_timestamp()}] [SDK] Assigned URL: {self.assigned_url}")
-            print(f"[{_log_timestamp()}] [SDK] Disconnecting from registration port...")
+            log.info("Assigned URL: %s, disconnecting from registration port...", self.assigned_url)
 
             # Close current connection and reconnect to assigned port
             self.registered = True
@@ -255,41 +596,19 @@ class SlotSDK:
         If not, passes to command handler (for backward compatibility).
         """
         try:
-            # Log all incoming COMMAND messages
-            msg_id = msg.get("id")
-            print(f"[{_log_timestamp()}] [SDK] Received COMMAND message: id={msg_id}")
-
             # Check if this is a response to a pending command request (pull-based)
-            # The relay sets the COMMAND message ID to match our GET_COMMANDS request ID
-            print(f"[{_log_timestamp()}] [SDK] Checking if message ID {msg_id} is a pending request")
-
-            if msg_id in self.pending_command_requests:
-                # This is a response to a synchronous request_commands() call
-                print(f"[{_log_timestamp()}] [SDK] This is a response to our GET_COMMANDS request")
-                print(f"[{_log_timestamp()}] [SDK] Received command response for request: {msg_id}")
-
-                # Check if it's a "no commands" response
-                payload = msg.get("payload", {})
-                if payload.get("no_command"):
-                    print(f"[{_log_timestamp()}] [SDK] Relay says no commands available")
-                    self.command_responses[msg_id] = None
-                else:
-                    print(f"[{_log_timestamp()}] [SDK] Relay returned command: {payload.get('command_id')}")
-                    self.command_responses[msg_id] = payload
-
-                # Signal the waiting thread
-                self.pending_command_requests[msg_id].set()
+            if self._resolve_command_response(msg):
                 return
 
             # If no original_message_id or not a pending request, treat as unsolicited
             # This shouldn't happen in pure pull-based mode, but handle for backward compatibility
-            print(f"[{_log_timestamp()}] [SDK] Warning: Received unsolicited COMMAND message (not pull-based): {msg.get('id')}")
+            log.warning("Received unsolicited COMMAND message (not pull-based): %s", msg.get('id'))
 
             # Call the command handler provided by the agent
             self.command_handler(msg)
 
         except Exception as e:
-            print(f"[{_log_timestamp()}] [SDK] Error in command handler: {e}")
+            log.exception("Error in command handler: %s", e)
             # Send error result
             payload = msg.get("payload", {})
             error_command_id = payload.get("command_id", msg.get("id"))
@@ -302,16 +621,299 @@ class SlotSDK:
             }
             self.send_result(error_command_id, error_result)
 
-    def send_message(self, message: Dict[str, Any]):
-        """Send a message to Relay"""
-        if self.ws and self.connected:
+    def _resolve_command_response(self, msg: Dict[str, Any]) -> bool:
+        """
+        Hand a COMMAND message to the request_commands() call waiting for it
+
+        The relay sets the COMMAND message ID to match our GET_COMMANDS request ID.
+
+        Returns:
+            True if the message answered a pending request, False otherwise
+        """
+        msg_id = msg.get("id")
+        payload = msg.get("payload", {})
+
+        callback = self.command_callbacks.pop(msg_id, None)
+        if callback is not None:
+            fn, expiry = callback
+            expiry.cancel()
+            self._inflight_requests.pop(msg_id, None)
+            try:
+                fn(self.command_list(payload))
+            except Exception as e:
+                log.exception("Command callback failed: %s", e)
+            return True
+
+        event = self.pending_command_requests.get(msg_id)
+        if event is None:
+            return False
+
+        # Check if it's a "no commands" response
+        if payload.get("no_command"):
+            log.debug("Response for request %s: no commands available", msg_id)
+            self.command_responses[msg_id] = None
+        else:
+            log.debug("Response for request %s: command %s", msg_id, payload.get('command_id'))
+            self.command_responses[msg_id] = payload
+
+        # Signal the waiting thread
+        self._inflight_requests.pop(msg_id, None)
+        event.set()
+        return True
+
+    def send_message(self, message: Dict[str, Any], buffer: bool = True) -> bool:
+        """Send a message to Relay
+
+        Messages that cannot go out right now (not connected to the dedicated
+        port, or the send fails) are kept in the outbox and replayed on the
+        next dedicated connection; a connected send first tries to empty the
+        outbox, so ordering is kept. Registrations, heartbeats and command
+        requests are never queued since they are only meaningful on the
+        current connection, so they go out whenever the socket is connected,
+        even past a non-empty outbox.
+
+        Args:
+            message: The message envelope
+            buffer: Keep the message in the outbox if it cannot be sent
+                (send_reliable() tracks its messages itself)
+
+        Returns:
+            True if the message was written to the socket, False otherwise
+        """
+        msg_type = message.get("type")
+        if msg_type in ("GET_COMMANDS", "AGENT_REGISTER"):
+            self._inflight_requests[message["id"]] = message
+
+        unbuffered = msg_type in ("SLOT_REGISTER", "SLOT_HEARTBEAT", "GET_COMMANDS", "AGENT_REGISTER")
+        with self._send_lock:
+            can_send = self.ws and self.connected and (self.on_dedicated_port or msg_type == "SLOT_REGISTER")
+            if can_send and self.outbox and self.on_dedicated_port:
+                self._drain_outbox()
+            # Keep ordering: while older messages still wait in the outbox, new bufferable ones queue behind them
+            if can_send and (unbuffered or not self.outbox):
+                try:
+                    self.ws.send(jsoncodec.dumpb(message))
+                    return True
+                except Exception as e:
+                    log.warning("Failed to send message: %s", e)
+
+            if buffer and not unbuffered:
+                self._enqueue_outbox(message)
+            return False
+
+    def _drain_outbox(self) -> int:
+        """Send queued messages in order until the outbox is empty or a send fails (send lock held)"""
+        sent = 0
+        while self.outbox and self.connected:
+            try:
+                self.ws.send(jsoncodec.dumpb(self.outbox[0]))
+            except Exception as e:
+                log.warning("Outbox replay interrupted: %s", e)
+                break
+            self.outbox.popleft()
+            sent += 1
+        return sent
+
+    def _enqueue_outbox(self, message: Dict[str, Any]):
+        """Queue a message for replay, dropping the oldest one when full"""
+        if len(self.outbox) >= self.outbox_limit:
+            dropped = self.outbox.popleft()
+            log.warning("Outbox full, dropping oldest %s message: %s", dropped.get('type'), dropped.get('id'), extra=SAMPLE_100)
+        self.outbox.append(message)
+
+    def _flush_outbox(self):
+        """Replay queued messages and re-send unanswered requests after reconnecting"""
+        with self._send_lock:
+            replayed = self._drain_outbox()
+            if self.outbox:
+                return
+
+            # Unacknowledged messages go out again in their original order, then unsent ones as the window allows
+            now = time.monotonic()
+            for message_id, entry in list(self._unacked.items()):
+                if entry[2] is None:
+                    continue
+                data = self._encoded(message_id, entry)
+                if data is None:
+                    continue
+                try:
+                    self.ws.send(data)
+                except Exception as e:
+                    log.warning("Unacked replay interrupted: %s", e)
+                    return
+                entry[2] = now
+                replayed += 1
+            replayed += self._fill_window()
+
+            # Requests whose waiter already gave up are dropped instead of re-sent
+            for message_id, message in list(self._inflight_requests.items()):
+                if (message_id not in self.pending_command_requests and message_id not in self.pending_agent_registrations
+                        and message_id not in self.command_callbacks and message_id not in self.registration_callbacks):
+                    self._inflight_requests.pop(message_id, None)
+                    continue
+                try:
+                    self.ws.send(jsoncodec.dumpb(message))
+                except Exception as e:
+                    log.warning("Request replay interrupted: %s", e)
+                    return
+                replayed += 1
+
+        if replayed:
+            log.info("Replayed %d message(s) after reconnect", replayed)
+
+    def send_reliable(self, message: Dict[str, Any], on_ack: Optional[Callable[[str, bool], None]] = None,
+                      durable: bool = False) -> str:
+        """Send a message the relay acknowledges, re-sending it until it does
+
+        The message is kept by ID until an ACK with a matching
+        original_message_id arrives. It is re-sent after every reconnect
+        and whenever ack_timeout passes without an ACK, and given up on
+        after max_send_attempts sends. With ack_timeout=0 the message is
+        sent fire-and-forget through the outbox instead.
+
+        With a spool the message is appended to it first and removed when
+        the ACK arrives. With a send_window, a message that finds the window
+        full is only registered; it goes out once ACKs free room.
+
+        Args:
+            message: The message envelope (RESULT, COMMAND_STATUS_UPDATE)
+            on_ack: Called once as on_ack(message_id, delivered); delivered is
+                False when the relay rejected the message or it was given up on
+            durable: Return only after the spool record is fsynced
+
+        Returns:
+            The message ID
+
+        Raises:
+            SpoolFull: The spool is full (back-pressure for the caller)
+        """
+        message_id = message["id"]
+        if not self.ack_timeout:
+            self.send_message(message)
+            if on_ack:
+                on_ack(message_id, True)
+            return message_id
+
+        data = jsoncodec.dumpb(message)
+        if self.spool:
+            self.spool.append(message_id, data, durable=durable)
+
+        with self._send_lock:
+            # Spooled messages are not kept in memory; the spool has them
+            entry = [None if self.spool else message, 0, None, on_ack]
+            self._unacked[message_id] = entry
+            if self._window_open() and self._send_encoded(data):
+                entry[1] = 1
+                entry[2] = time.monotonic()
+                self._in_window += 1
+
+        self._start_ack_timer()
+        return message_id
+
+    def _encoded(self, message_id: str, entry: list) -> Optional[bytes]:
+        """Wire form of an unacknowledged message (None if the spool no longer has it)"""
+        if entry[0] is not None:
+            return jsoncodec.dumpb(entry[0])
+        return self.spool.read(message_id) if self.spool else None
+
+    def _send_encoded(self, data: bytes) -> bool:
+        """Write an encoded reliable message to the dedicated connection, never buffering it (send_reliable() re-sends)"""
+        with self._send_lock:
+            if not (self.ws and self.connected and self.on_dedicated_port) or self.outbox:
+                return False
+            try:
+                self.ws.send(data)
+                return True
+            except Exception as e:
+                log.warning("Failed to send message: %s", e)
+                return False
+
+    def _window_open(self) -> bool:
+        return not self.send_window or self._in_window < self.send_window
+
+    def _fill_window(self) -> int:
+        """Send never-sent reliable messages, oldest first, while the window has room (send lock held)"""
+        sent = 0
+        now = time.monotonic()
+        for message_id, entry in self._unacked.items():
+            if not self._window_open():
+                break
+            if entry[2] is not None:
+                continue
+            data = self._encoded(message_id, entry)
+            if data is None:
+                continue
+            if not self._send_encoded(data):
+                break
+            entry[1] += 1
+            entry[2] = now
+            self._in_window += 1
+            sent += 1
+        return sent
+
+    def _start_ack_timer(self):
+        if self._ack_timer is None:
+            self._ack_timer = self.scheduler.every(max(0.5, self.ack_timeout / 2), self._resend_unacked, blocking=True)
+
+    def unacked(self) -> int:
+        """Number of sent messages still waiting for an ACK"""
+        return len(self._unacked)
+
+    def _acknowledge(self, message_id: str, delivered: bool):
+        with self._send_lock:
+            entry = self._unacked.pop(message_id, None)
+            if entry and entry[2] is not None:
+                self._in_window -= 1
+                if self.send_window:
+                    # The ACK freed room for a waiting message
+                    self._fill_window()
+        if self.spool:
+            self.spool.ack(message_id)
+        if entry and entry[3]:
             try:
-                self.ws.send(json.dumps(message))
+                entry[3](message_id, delivered)
             except Exception as e:
-                print(f"[{_log_timestamp()}] [SDK] Failed to send message: {e}")
+                log.exception("ACK callback failed: %s", e)
 
-    def send_result(self, command_id: str, result: Dict[str, Any]):
-        """Send command execution result to Relay (relay will lookup agent from command_id)"""
+    def _resend_unacked(self):
+        """Scheduled job: re-send messages whose ACK is overdue, give up after max_send_attempts"""
+        if not (self.connected and self.on_dedicated_port) or not self._unacked:
+            return
+
+        now = time.monotonic()
+        given_up = []
+        with self._send_lock:
+            for message_id, entry in list(self._unacked.items()):
+                if entry[2] is None or now - entry[2] < self.ack_timeout:
+                    # Never sent ones are left to _fill_window() below
+                    continue
+                if entry[1] >= self.max_send_attempts:
+                    if not self.spool:
+                        given_up.append(message_id)
+                    # Spooled messages wait for the next reconnect instead
+                    continue
+                data = self._encoded(message_id, entry)
+                if data is None:
+                    continue
+                if not self._send_encoded(data):
+                    break
+                entry[1] += 1
+                entry[2] = now
+            self._fill_window()
+
+        for message_id in given_up:
+            log.warning("No ACK for message %s after %d attempts, giving up", message_id, self.max_send_attempts)
+            self._acknowledge(message_id, False)
+
+    def send_result(self, command_id: str, result: Dict[str, Any],
+                    on_ack: Optional[Callable[[str, bool], None]] = None, durable: bool = False) -> str:
+        """Send command execution result to Relay (relay will lookup agent from command_id)
+
+        Delivery is tracked until the relay ACKs it, see send_reliable().
+
+        Returns:
+            The RESULT message ID
+        """
         result["command_id"] = command_id
 
         message = {
@@ -323,18 +925,24 @@ class SlotSDK:
             "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
         }
 
-        self.send_message(message)
-        print(f"[{_log_timestamp()}] [SDK] Result sent: command_id={command_id}, exit_code={result.get('exit_code', 'N/A')}")
+        self.send_reliable(message, on_ack, durable=durable)
+        log.debug("Result sent: command_id=%s exit_code=%s", command_id, result.get('exit_code', 'N/A'))
+        return message["id"]
 
     def send_heartbeat(self):
-        """Send heartbeat to Relay"""
+        """Send heartbeat to Relay, including host load and SDK backlog"""
+        metrics = self.host_sampler.sample({
+            "pending_requests": (len(self.pending_command_requests) + len(self.pending_agent_registrations)
+                                 + len(self.command_callbacks) + len(self.registration_callbacks)),
+            "outbox": len(self.outbox),
+            "unacked": len(self._unacked),
+            "spool_bytes": self.spool.total_bytes if self.spool else 0,
+            "handler_backlog": self.dispatcher.pending()
+        })
         payload = {
             "agent_id": self.slot_id,
-            "hostname": socket.gethostname(),
-            "uptime_seconds": 0,
-            "cpu_percent": 0,
-            "memory_mb": 0,
-            "disk_free_gb": 0
+            "hostname": self.hostname,
+            **metrics
         }
 
         message = {
@@ -347,15 +955,27 @@ class SlotSDK:
         }
 
         self.send_message(message)
-        self.last_heartbeat = time.time()
+        self.last_heartbeat = time.monotonic()
 
-    def send_status_update(self, command_id: str, status: str):
-        """Send command status update to Relay"""
+    def send_status_update(self, command_id: str, status: str,
+                           on_ack: Optional[Callable[[str, bool], None]] = None,
+                           output: Optional[Dict[str, Any]] = None) -> str:
+        """Send command status update to Relay (delivery tracked like send_result())
+
+        Args:
+            command_id: The command the update is about
+            status: New status (e.g. "running", "pending")
+            on_ack: See send_reliable()
+            output: Optional partial output of a running command
+                ({"seq": n, "stdout": ..., "stderr": ...})
+        """
         payload = {
             "command_id": command_id,
             "agent_id": self.slot_id,
             "status": status
         }
+        if output:
+            payload["output"] = output
 
         message = {
             "id": str(uuid.uuid4()),
@@ -366,22 +986,13 @@ class SlotSDK:
             "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
         }
 
-        self.send_message(message)
-        print(f"[{_log_timestamp()}] [SDK] Status update sent: command_id={command_id}, status={status}")
-
-    def send_agent_registration(self, description: str = None, hostname: str = None, os_name: str = None, arch: str = None, domain: str = None, version: str = "1.0.0", timeout: int = 10):
-        """Send individual agent registration to Relay (will be forwarded to Core)
-
-        All fields are optional except slot_id and version.
-        Core will assign an auto-increment agent_id and send back an ACK.
-
-        Returns:
-            int: Assigned agent_id on success
-            dict: {"error": "message"} on failure
-            None: On timeout
-        """
-        import threading
+        self.send_reliable(message, on_ack)
+        log.debug("Status update sent: command_id=%s status=%s", command_id, status)
+        return message["id"]
 
+    def _agent_registration_message(self, description: str = None, hostname: str = None, os_name: str = None,
+                                    arch: str = None, domain: str = None, version: str = "1.0.0") -> Dict[str, Any]:
+        """Build an AGENT_REGISTER message; optional fields are only included when set"""
         payload = {
             "slot_id": self.slot_id,  # Slot ID (this server.py instance)
             "version": version
@@ -399,9 +1010,8 @@ class SlotSDK:
         if domain:
             payload["domain"] = domain
 
-        message_id = str(uuid.uuid4())
-        message = {
-            "id": message_id,
+        return {
+            "id": str(uuid.uuid4()),
             "type": "AGENT_REGISTER",
             "relay_id": "",
             "agent_id": self.slot_id,
@@ -409,49 +1019,66 @@ class SlotSDK:
             "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
         }
 
+    def send_agent_registration(self, description: str = None, hostname: str = None, os_name: str = None, arch: str = None, domain: str = None, version: str = "1.0.0", timeout: Optional[float] = None):
+        """Send individual agent registration to Relay (will be forwarded to Core)
+
+        All fields are optional except slot_id and version.
+        Core will assign an auto-increment agent_id and send back an ACK.
+        Without an explicit timeout the wait is derived from the measured RTT
+        (10 seconds until the first sample).
+
+        Returns:
+            int: Assigned agent_id on success
+            dict: {"error": "message"} on failure
+            None: On timeout
+        """
+        if timeout is None:
+            timeout = self.request_timeout(10)
+
+        message = self._agent_registration_message(description, hostname, os_name, arch, domain, version)
+        message_id = message["id"]
+
         # Create event for waiting
         event = threading.Event()
         self.pending_agent_registrations[message_id] = event
 
         # Send message
         self.send_message(message)
-        print(f"[{_log_timestamp()}] [SDK] Agent registration sent: message_id={message_id}, slot_id={self.slot_id}, description={description or 'none'}")
+        log.debug("Agent registration sent: message_id=%s slot_id=%s description=%s", message_id, self.slot_id, description or 'none')
 
         # Wait for ACK response
-        if event.wait(timeout=timeout):
+        if self._await_reply(message_id, event, self.pending_agent_registrations, self.agent_registration_responses, timeout):
             # Got response
             response = self.agent_registration_responses.pop(message_id, None)
-            self.pending_agent_registrations.pop(message_id, None)
 
             if isinstance(response, int):
-                print(f"[{_log_timestamp()}] [SDK] Agent registration completed: agent_id={response}")
+                log.info("Agent registration completed: agent_id=%s", response)
                 return response
             elif isinstance(response, dict) and "error" in response:
-                print(f"[{_log_timestamp()}] [SDK] Agent registration error: {response['error']}")
+                log.warning("Agent registration error: %s", response['error'])
                 return response
             else:
-                print(f"[{_log_timestamp()}] [SDK] Unexpected response: {response}")
+                log.warning("Unexpected registration response: %r", response)
                 return {"error": "Unexpected response format"}
         else:
             # Timeout
-            self.pending_agent_registrations.pop(message_id, None)
-            print(f"[{_log_timestamp()}] [SDK] Agent registration timeout after {timeout}s")
+            log.warning("Agent registration timeout after %.2fs", timeout)
             return None
 
-    def request_commands(self, agent_id: int, count: int = 1, timeout: int = 5) -> Optional[Dict[str, Any]]:
+    def request_commands(self, agent_id: int, count: int = 1, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """Request pending commands from Relay for a specific agent (pull-based, synchronous)
 
         Args:
             agent_id: The agent ID to request commands for
             count: Number of commands to request (default: 1)
-            timeout: Timeout in seconds to wait for response (default: 5)
+            timeout: Timeout in seconds to wait for response (default: derived
+                from the measured RTT, 5 until the first sample)
 
         Returns:
             Dict with command data if available, None if no commands or timeout
         """
-        import threading
-
-        print(f"[{_log_timestamp()}] [SDK] Requesting {count} commands for agent {agent_id}, timeout={timeout}s")
+        if timeout is None:
+            timeout = self.request_timeout(5)
 
         payload = {
             "agent_id": agent_id,
@@ -474,91 +1101,234 @@ class SlotSDK:
 
         # Send message
         self.send_message(message)
-        print(f"[{_log_timestamp()}] [SDK] GET_COMMANDS sent: message_id={message_id}, agent_id={agent_id}, count={count}")
+        log.debug("GET_COMMANDS sent: message_id=%s agent_id=%s count=%s timeout=%.2fs", message_id, agent_id, count, timeout)
 
         # Wait for response
-        print(f"[{_log_timestamp()}] [SDK] Waiting for relay response...")
-        if event.wait(timeout=timeout):
+        if self._await_reply(message_id, event, self.pending_command_requests, self.command_responses, timeout):
             # Got response
             response = self.command_responses.pop(message_id, None)
-            self.pending_command_requests.pop(message_id, None)
-
-            print(f"[{_log_timestamp()}] [SDK] Got response: {response}")
 
             if response is None:
-                print(f"[{_log_timestamp()}] [SDK] No commands available for agent {agent_id}")
+                log.debug("No commands available for agent %s", agent_id)
                 return None
             else:
-                print(f"[{_log_timestamp()}] [SDK] Command received for agent {agent_id}: {response.get('command_id')}")
+                log.debug("Command received for agent %s: %s", agent_id, response.get('command_id'))
                 return response
         else:
             # Timeout
-            self.pending_command_requests.pop(message_id, None)
-            print(f"[{_log_timestamp()}] [SDK] Timeout waiting for relay response after {timeout}s")
+            log.warning("Timeout waiting for GET_COMMANDS response for agent %s after %.2fs", agent_id, timeout, extra=SAMPLE_100)
             return None
 
-    def heartbeat_loop(self):
-        """Send periodic heartbeats (only when registered on dedicated port)"""
-        while self.should_run:
-            if self.registered and self.connected and (time.time() - self.last_heartbeat) >= self.heartbeat_interval:
-                self.send_heartbeat()
-            time.sleep(1)
+    @staticmethod
+    def command_list(payload: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Normalize a GET_COMMANDS reply payload to a list of commands
 
-    def command_poll_loop(self):
-        """Poll for pending commands (pull-based)"""
-        while self.should_run:
-            if self.registered and self.connected and (time.time() - self.last_command_poll) >= self.command_poll_interval:
-                self.request_commands()
-            time.sleep(1)
+        The relay answers with a single command, {"commands": [...]} for
+        batches, or {"no_command": true}.
+        """
+        if not payload or payload.get("no_command"):
+            return []
+        if isinstance(payload.get("commands"), list):
+            return payload["commands"]
+        return [payload]
+
+    def request_command_batch(self, agent_id: int, count: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Like request_commands(), but always returns a list (empty on timeout or no commands)"""
+        return self.command_list(self.request_commands(agent_id, count=count, timeout=timeout))
+
+    def request_commands_async(self, agent_id: int, count: int, callback: Callable[[Optional[List[Dict[str, Any]]]], None],
+                               timeout: Optional[float] = None) -> str:
+        """Request commands without blocking the caller
+
+        Args:
+            agent_id: The agent ID to request commands for
+            count: Number of commands to request
+            callback: Called with the list of commands (possibly empty) when the
+                reply arrives, or with None on timeout. It runs on the receive or
+                scheduler thread and must not block.
+            timeout: Seconds before the request expires (default: derived from the RTT)
+
+        Returns:
+            The GET_COMMANDS message ID
+        """
+        if timeout is None:
+            timeout = self.request_timeout(5)
+
+        message_id = str(uuid.uuid4())
+        message = {
+            "id": message_id,
+            "type": "GET_COMMANDS",
+            "relay_id": "",
+            "agent_id": str(agent_id),
+            "payload": {"agent_id": agent_id, "count": count},
+            "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
+        }
+
+        expiry = self.scheduler.call_later(timeout, self._expire_callback, message_id)
+        self.command_callbacks[message_id] = (callback, expiry)
+        self.send_message(message)
+        log.debug("GET_COMMANDS sent (async): message_id=%s agent_id=%s count=%s", message_id, agent_id, count)
+        return message_id
+
+    def register_agent_async(self, callback: Callable[[Any], None], description: str = None, hostname: str = None,
+                             os_name: str = None, arch: str = None, domain: str = None, version: str = "1.0.0",
+                             timeout: Optional[float] = None) -> str:
+        """Send an agent registration without blocking the caller
+
+        Args:
+            callback: Called once with the assigned agent_id (int), {"error": "message"}
+                on failure, or None on timeout. It runs on the receive or
+                scheduler thread and must not block.
+            description, hostname, os_name, arch, domain, version: As for send_agent_registration()
+            timeout: Seconds before the registration expires (default: derived from the RTT)
+
+        Returns:
+            The AGENT_REGISTER message ID
+        """
+        if timeout is None:
+            timeout = self.request_timeout(10)
+
+        message = self._agent_registration_message(description, hostname, os_name, arch, domain, version)
+        message_id = message["id"]
+        expiry = self.scheduler.call_later(timeout, self._expire_callback, message_id, self.registration_callbacks)
+        self.registration_callbacks[message_id] = (callback, expiry)
+        self.send_message(message)
+        log.debug("Agent registration sent (async): message_id=%s description=%s", message_id, description or 'none')
+        return message_id
+
+    def _expire_callback(self, message_id: str, callbacks: Optional[Dict[str, Any]] = None):
+        """Scheduler callback: report a timed-out non-blocking request"""
+        callback = (self.command_callbacks if callbacks is None else callbacks).pop(message_id, None)
+        self._inflight_requests.pop(message_id, None)
+        if callback is not None:
+            try:
+                callback[0](None)
+            except Exception as e:
+                log.exception("Request callback failed: %s", e)
+
+    def _expire_request(self, message_id: str, pending: Dict[str, threading.Event]):
+        """Scheduler callback: give up on a request that got no reply in time"""
+        event = pending.pop(message_id, None)
+        self._inflight_requests.pop(message_id, None)
+        if event:
+            event.set()
+
+    def _await_reply(self, message_id: str, event: threading.Event, pending: Dict[str, threading.Event],
+                     responses: Dict[str, Any], timeout: float) -> bool:
+        """
+        Block until a request is answered or expired by the scheduler
+
+        Returns:
+            True if a reply was stored in responses, False on timeout
+        """
+        expiry = self.scheduler.call_later(timeout, self._expire_request, message_id, pending)
+        # The scheduler wakes us on expiry; the local timeout is only a safety net
+        event.wait(timeout=timeout + 1)
+        expiry.cancel()
+        pending.pop(message_id, None)
+        self._inflight_requests.pop(message_id, None)
+        return message_id in responses
+
+    def _heartbeat_tick(self):
+        """Scheduled every heartbeat_interval seconds (only sends when on the dedicated port)"""
+        if self.registered and self.connected and self.on_dedicated_port:
+            self.send_heartbeat()
+
+    def _next_reconnect_delay(self, delay: float) -> float:
+        """
+        Pick the wait before the next connection attempt
+
+        A dedicated session that stayed up for stable_session seconds and
+        then dropped is retried on the cached port after a short jitter (up
+        to reconnect_base_delay), so many slots dropped by the same relay
+        restart do not reconnect in lockstep. Failed attempts and sessions
+        that dropped sooner back off with decorrelated jitter, and after
+        dedicated_retry_limit failures the cached port is discarded so the
+        next attempt re-registers.
+
+        Args:
+            delay: The previous backoff delay
+
+        Returns:
+            Seconds to wait before reconnecting (0 means reconnect now)
+        """
+        if self._reconnect_now:
+            # Intentional switch to the freshly assigned dedicated port
+            self._reconnect_now = False
+            return 0
+
+        opened, self._session_opened = self._session_opened, None
+        if opened is not None and time.monotonic() - opened >= self.stable_session:
+            # A stable dedicated session just dropped: retry the cached port almost at once
+            return random.uniform(0, self.reconnect_base_delay)
+
+        if self.registered:
+            self.dedicated_failures += 1
+            if self.dedicated_failures >= self.dedicated_retry_limit:
+                log.warning("Dedicated port %s unreachable after %d attempts. Re-registering.", self.assigned_url, self.dedicated_failures)
+                self.registered = False
+                self.assigned_url = None
+                self.dedicated_failures = 0
+                return 0
+
+        # Decorrelated jitter: random between the base and three times the last delay
+        delay = max(delay, self.reconnect_base_delay)
+        return min(self.max_reconnect_delay, random.uniform(self.reconnect_base_delay, delay * 3))
 
     def run(self):
         """Run the SDK with automatic reconnection"""
-        import threading
+        self.dispatcher.start()
 
-        # Start heartbeat thread
-        heartbeat_thread = threading.Thread(target=self.heartbeat_loop, daemon=True)
-        heartbeat_thread.start()
+        # Heartbeats run on the shared scheduler instead of a polling thread
+        self._heartbeat_timer = self.scheduler.every(self.heartbeat_interval, self._heartbeat_tick)
+        if self._unacked:
+            # Messages recovered from the spool
+            self._start_ack_timer()
 
         # Don't start automatic command polling thread - commands are requested on-demand when agents poll
 
-        reconnect_delay = 1
-        max_reconnect_delay = 300  # 5 minutes
+        reconnect_delay = 0
 
         while self.should_run:
             try:
                 self.connect()
-                self.ws.run_forever()
-
-                # Connection lost, attempt reconnection
-                if self.should_run:
-                    print(f"[{_log_timestamp()}] [SDK] Reconnecting in {reconnect_delay} seconds...")
-                    time.sleep(reconnect_delay)
-
-                    # Exponential backoff (but faster for registration)
-                    if self.registered:
-                        reconnect_delay = min(reconnect_delay * 2, max_reconnect_delay)
-                    else:
-                        # Faster retry for registration
-                        reconnect_delay = 1
+                # UTF-8 validation is skipped so text frames arrive as bytes for jsoncodec.loads
+                self.ws.run_forever(
+                    ping_interval=self.ping_interval,
+                    ping_timeout=self.ping_timeout,
+                    skip_utf8_validation=True
+                )
 
             except KeyboardInterrupt:
-                print(f"\n[{_log_timestamp()}] [SDK] Shutting down SDK...")
+                log.info("Shutting down SDK...")
                 self.should_run = False
                 break
             except Exception as e:
-                print(f"[{_log_timestamp()}] [SDK] SDK error: {e}")
-                if self.should_run:
-                    print(f"[{_log_timestamp()}] [SDK] Reconnecting in {reconnect_delay} seconds...")
-                    time.sleep(reconnect_delay)
-
-                    # Exponential backoff (but faster for registration)
-                    if self.registered:
-                        reconnect_delay = min(reconnect_delay * 2, max_reconnect_delay)
-                    else:
-                        reconnect_delay = 1
+                log.exception("SDK error: %s", e)
+
+            # Connection lost, attempt reconnection
+            if self.should_run:
+                reconnect_delay = self._next_reconnect_delay(reconnect_delay)
+                if reconnect_delay > 0:
+                    log.info("Reconnecting in %.2f seconds...", reconnect_delay)
+                    # Backoff timer on the scheduler; stop() wakes us early
+                    self._wakeup.clear()
+                    backoff = self.scheduler.call_later(reconnect_delay, self._wakeup.set)
+                    self._wakeup.wait()
+                    backoff.cancel()
 
     def stop(self):
         """Stop the SDK and close connections"""
         self.should_run = False
+        self._wakeup.set()
+        if self._heartbeat_timer:
+            self._heartbeat_timer.cancel()
+        if self._ack_timer:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+        if self.spool:
+            self.spool.close()
         if self.ws:
-            self.ws.close()
\ No newline at end of file
+            self.ws.close()
+        self.dispatcher.stop()
\ No newline at end of file
@@ -5,6 +5,10 @@ TelePAT Python Agent
 Simple agent that polls the server for commands, executes them, and returns results.
 Communicates with server.py via HTTP.
 
+Commands run on worker pools, one per command class (shell execution vs
+file transfer) with separate concurrency limits, while the main loop keeps
+polling and tells the server how many worker slots are free.
+
 Agent ID Assignment:
 - First run: Registers and polls API to discover assigned ID, saves to id.txt
 - Future runs: Reads ID from id.txt
@@ -12,14 +16,48 @@ Agent ID Assignment:
 
 import os
 import time
+import logging
 import socket
 import platform
+import random
+import signal
 import subprocess
 import hashlib
 import mimetypes
 import base64
+import codecs
+import gzip
+import re
+import tempfile
+import threading
+import uuid
 import requests # type: ignore
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter # type: ignore
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Tuple
+
+# agent.py is deployed as a single file: the repo's JSON codec is used when it sits next to it
+try:
+    import jsoncodec
+except ImportError:
+    import json
+    jsoncodec = SimpleNamespace(
+        dumpb=lambda obj: json.dumps(obj, separators=(",", ":")).encode("utf-8"),
+        loads=json.loads,
+        DecodeError=json.JSONDecodeError
+    )
+
+# ... and so is its body compression; alone it gzips with the stdlib
+try:
+    from compression import encode_body
+except ImportError:
+    def encode_body(data: bytes, encoding: str = "gzip", min_size: int = 1024) -> Tuple[bytes, Optional[str]]:
+        """Stand-in for compression.encode_body: gzip only"""
+        if encoding != "gzip" or len(data) < min_size:
+            return data, None
+        return gzip.compress(data, mtime=0), "gzip"
 
 
 # Configuration
@@ -27,7 +65,51 @@ AGENT_ID_FILE = os.path.join(os.path.dirname(__file__), "id.txt")
 AGENT_DESCRIPTION = os.getenv("AGENT_DESCRIPTION", "")  # Optional: Human-readable description
 AGENT_DOMAIN = os.getenv("AGENT_DOMAIN", "")  # Optional: Domain like "production" or "dev"
 SERVER_URL = os.getenv("SERVER_URL", "http://10.20.30.4:44399")
-POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "2"))  # seconds
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "2"))  # seconds; first idle back-off step
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "30"))  # idle back-off cap
+LOG_LEVEL = os.getenv("AGENT_LOG_LEVEL", "INFO")  # DEBUG shows every poll
+RESULT_ENCODING = os.getenv("AGENT_RESULT_ENCODING", "gzip")  # compress result bodies ("" = off)
+EXECUTE_WORKERS = int(os.getenv("AGENT_EXECUTE_WORKERS", "4"))  # shell commands run in parallel
+TRANSFER_WORKERS = int(os.getenv("AGENT_TRANSFER_WORKERS", "2"))  # file downloads/uploads run in parallel
+# Commands a full class may hold waiting for a worker (default: one full poll's worth)
+CLASS_BACKLOG = int(os.getenv("AGENT_CLASS_BACKLOG", str(EXECUTE_WORKERS + TRANSFER_WORKERS)))
+
+STREAM_OUTPUT = os.getenv("AGENT_STREAM_OUTPUT", "1") == "1"  # stream output of running commands
+STREAM_FLUSH_BYTES = int(os.getenv("AGENT_STREAM_FLUSH_BYTES", "65536"))  # send a chunk once this much is buffered
+STREAM_FLUSH_INTERVAL = float(os.getenv("AGENT_STREAM_FLUSH_INTERVAL", "0.5"))  # ... or this many seconds passed
+STREAM_MAX_BUFFER = int(os.getenv("AGENT_STREAM_MAX_BUFFER_KB", "1024")) * 1024  # unsent output kept; more is dropped
+STREAM_MAX_PAUSE = 30.0  # longest Retry-After honoured between chunks
+
+# Bounded output capture: head and tail stay in memory, the middle is spilled to disk
+OUTPUT_HEAD_BYTES = int(os.getenv("AGENT_OUTPUT_HEAD_KB", "256")) * 1024
+OUTPUT_TAIL_BYTES = int(os.getenv("AGENT_OUTPUT_TAIL_KB", "256")) * 1024
+SPILL_DIR = os.getenv("AGENT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "telepat-spill"))
+SPILL_MAX_BYTES = int(os.getenv("AGENT_SPILL_MAX_MB", "1024")) * 1024 * 1024  # per stream; more is counted, not kept
+SPILL_RETENTION = float(os.getenv("AGENT_SPILL_RETENTION_HOURS", "24")) * 3600
+FETCH_CHUNK_BYTES = 1024 * 1024  # default fetch_output length
+
+# File downloads: larger files are streamed to the server in chunks instead of inline base64
+FILE_INLINE_BYTES = int(os.getenv("AGENT_FILE_INLINE_KB", "1024")) * 1024
+FILE_CHUNK_BYTES = int(os.getenv("AGENT_FILE_CHUNK_MB", "8")) * 1024 * 1024
+FILE_CHUNK_TIMEOUT = float(os.getenv("AGENT_FILE_CHUNK_TIMEOUT", "120"))  # seconds per chunk upload
+
+# Command type -> worker class; unknown types are answered by the execute pool
+COMMAND_CLASSES = {"execute": "execute", "download": "transfer", "upload": "transfer", "fetch_output": "transfer"}
+REGISTER_WAIT = int(os.getenv("REGISTER_WAIT", "10"))  # seconds per registration long-poll
+REGISTER_DEADLINE = int(os.getenv("REGISTER_DEADLINE", "60"))  # give up following a ticket after this
+
+# HTTP transport to server.py: one keep-alive session shared by the poll loop and every worker
+HTTP_POOL_SIZE = int(os.getenv("AGENT_HTTP_POOL", str(2 * EXECUTE_WORKERS + TRANSFER_WORKERS + 1)))  # workers + streamers + poller
+HTTP_RETRIES = int(os.getenv("AGENT_HTTP_RETRIES", "3"))  # per request, for connection errors and 429/502/503/504
+RETRY_BUDGET = float(os.getenv("AGENT_RETRY_BUDGET", "0.1"))  # retries allowed per request sent, on average
+RETRY_BASE_DELAY = float(os.getenv("AGENT_RETRY_BASE_DELAY", "0.25"))  # seconds, doubled per attempt (full jitter)
+RETRY_MAX_DELAY = float(os.getenv("AGENT_RETRY_MAX_DELAY", "10"))
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Per-process nonce: retries of this process share one registration, other agents with identical fields do not
+INSTANCE_ID = uuid.uuid4().hex
+
+log = logging.getLogger("telepat.agent")
 
 
 def read_agent_id() -> Optional[int]:
@@ -36,10 +118,10 @@ def read_agent_id() -> Optional[int]:
         try:
             with open(AGENT_ID_FILE, 'r') as f:
                 agent_id = int(f.read().strip())
-                print(f"Found existing agent ID: {agent_id}")
+                log.info("Found existing agent ID: %s", agent_id)
                 return agent_id
         except (ValueError, IOError) as e:
-            print(f"Warning: Could not read agent ID from {AGENT_ID_FILE}: {e}")
+            log.warning("Could not read agent ID from %s: %s", AGENT_ID_FILE, e)
     return None
 
 
@@ -48,13 +130,297 @@ def save_agent_id(agent_id: int):
     try:
         with open(AGENT_ID_FILE, 'w') as f:
             f.write(str(agent_id))
-        print(f"Agent ID {agent_id} saved to {AGENT_ID_FILE}")
+        log.info("Agent ID %s saved to %s", agent_id, AGENT_ID_FILE)
     except IOError as e:
-        print(f"Warning: Could not save agent ID to {AGENT_ID_FILE}: {e}")
+        log.warning("Could not save agent ID to %s: %s", AGENT_ID_FILE, e)
+
+
+class OutputStreamer:
+    """
+    Streams output of a running command to server.py's /results/partial
+
+    Reader threads feed() decoded output; a flusher thread posts whatever
+    accumulated once STREAM_FLUSH_BYTES are buffered or STREAM_FLUSH_INTERVAL
+    has passed since the first unsent byte. Chunks carry sequence numbers
+    starting at 1. A command that finishes before the first flush sends no
+    chunks at all: its final result carries the output.
+
+    Memory is bounded: chunks carry at most STREAM_FLUSH_BYTES, and while
+    the server is slower than the command, output beyond STREAM_MAX_BUFFER
+    unsent bytes is dropped rather than buffered (the reader is never
+    blocked). The next chunk reports how much was dropped in "dropped";
+    the final result still has the head and tail (see OutputCapture).
+    When the server refuses a chunk (spool full, relay down) the streamer
+    waits for its Retry-After before sending the next one. Sizes are
+    measured in UTF-8 bytes, and chunks are cut on character boundaries.
+
+    close() drops whatever was not sent yet (the final result carries all
+    of it) and only waits for a chunk already on the wire, so the result
+    is never held up behind the backlog of a slow server.
+    """
+
+    def __init__(self, command_id: str):
+        self.command_id = command_id
+        self.seq = 0
+        self.pending = {"stdout": [], "stderr": []}
+        self.pending_bytes = 0
+        self.dropped = 0
+        self.first_pending: Optional[float] = None
+        self.closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._flusher, name=f"stream-{command_id}", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _cut(data: bytes, size: int) -> int:
+        """Largest length up to size that does not split a UTF-8 character"""
+        size = max(0, min(size, len(data)))
+        while 0 < size < len(data) and data[size] & 0xC0 == 0x80:
+            size -= 1
+        return size
+
+    def feed(self, stream: str, text: str):
+        data = text.encode("utf-8")
+        with self._cond:
+            if self.closed:
+                return
+            keep = self._cut(data, STREAM_MAX_BUFFER - self.pending_bytes)
+            if keep < len(data):
+                self.dropped += len(data) - keep
+                data = data[:keep]
+                if not data:
+                    return
+            self.pending[stream].append(data)
+            self.pending_bytes += len(data)
+            if self.first_pending is None:
+                # Wake the flusher to start the flush timer
+                self.first_pending = time.monotonic()
+                self._cond.notify()
+            elif self.pending_bytes >= STREAM_FLUSH_BYTES:
+                self._cond.notify()
+
+    def close(self):
+        """Drop unsent output and stop (waits only for a chunk that is already being sent)"""
+        with self._cond:
+            self.closed = True
+            self.pending = {"stdout": [], "stderr": []}
+            self.pending_bytes = 0
+            self.first_pending = None
+            self._cond.notify()
+        self._thread.join()
+
+    def _take(self) -> Dict[str, Any]:
+        """Pop up to STREAM_FLUSH_BYTES of buffered output as the next chunk (lock held)"""
+        self.seq += 1
+        chunk = {"command_id": self.command_id, "seq": self.seq}
+        budget = STREAM_FLUSH_BYTES
+        for stream in ("stdout", "stderr"):
+            data = b"".join(self.pending[stream])
+            size = self._cut(data, budget)
+            chunk[stream] = data[:size].decode("utf-8", errors="replace")
+            budget -= size
+            self.pending[stream] = [data[size:]] if size < len(data) else []
+        if self.dropped:
+            chunk["dropped"] = self.dropped
+            self.dropped = 0
+        self.pending_bytes = sum(len(data) for parts in self.pending.values() for data in parts)
+        # Whatever is left is already overdue
+        self.first_pending = time.monotonic() - STREAM_FLUSH_INTERVAL if self.pending_bytes else None
+        return chunk
+
+    def _flusher(self):
+        while True:
+            with self._cond:
+                while not self.closed:
+                    if self.pending_bytes >= STREAM_FLUSH_BYTES:
+                        break
+                    if self.first_pending is not None:
+                        remaining = self.first_pending + STREAM_FLUSH_INTERVAL - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self.closed:
+                    return
+                chunk = self._take()
+            pause = send_partial_to_server(chunk)
+            if pause:
+                # Back-pressure: hold further chunks (output keeps being capped meanwhile) unless the command ends
+                with self._cond:
+                    self._cond.wait_for(lambda: self.closed, min(pause, STREAM_MAX_PAUSE))
+
+
+class OutputCapture:
+    """
+    Bounded-memory capture of one output stream
+
+    The first head_bytes and the last tail_bytes are kept in memory; bytes
+    pushed out of the tail go to a spill file in SPILL_DIR (up to
+    SPILL_MAX_BYTES, beyond that they are only counted). The spilled middle
+    can be read back later with a fetch_output command. Memory use stays at
+    head_bytes + tail_bytes however much the command prints.
+    """
+
+    def __init__(self, command_id: Optional[str], stream: str, head_bytes: int = OUTPUT_HEAD_BYTES,
+                 tail_bytes: int = OUTPUT_TAIL_BYTES):
+        self.command_id = command_id
+        self.stream = stream
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0  # bytes the command wrote
+        self.spilled = 0  # bytes in the spill file
+        self.dropped = 0  # middle bytes beyond SPILL_MAX_BYTES (or without a command_id)
+        self.spill_path: Optional[str] = None
+        self._spill = None
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        if len(self.head) < self.head_bytes:
+            room = self.head_bytes - len(self.head)
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail += data
+        overflow = len(self.tail) - self.tail_bytes
+        if overflow > 0:
+            self._spill_bytes(bytes(self.tail[:overflow]))
+            del self.tail[:overflow]
+
+    def close(self):
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.spilled + self.dropped > 0
+
+    def text(self) -> str:
+        """Captured output; a marker stands in for the middle when it was not kept in memory"""
+        if not self.truncated:
+            return bytes(self.head + self.tail).decode("utf-8", errors="replace")
+        marker = f"\n... [{self.spilled + self.dropped} bytes omitted"
+        marker += f", fetch_output {self.stream} to read them] ...\n" if self.spilled else "] ...\n"
+        return self.head.decode("utf-8", errors="replace") + marker + self.tail.decode("utf-8", errors="replace")
+
+    def result_fields(self) -> Dict[str, Any]:
+        """True byte counts (and what happened to the middle) for the result"""
+        fields = {f"{self.stream}_bytes": self.total}
+        if self.truncated:
+            fields[f"{self.stream}_truncated"] = True
+            fields[f"{self.stream}_spilled"] = self.spilled
+            if self.dropped:
+                fields[f"{self.stream}_dropped"] = self.dropped
+        return fields
+
+    def _spill_bytes(self, data: bytes):
+        room = SPILL_MAX_BYTES - self.spilled
+        if self._spill is None and room > 0 and self.command_id and not self.dropped:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            cleanup_spills()
+            self.spill_path = spill_path(self.command_id, self.stream)
+            self._spill = open(self.spill_path, "wb")
+        if self._spill is None or room <= 0:
+            self.dropped += len(data)
+            return
+        kept = data[:room]
+        self._spill.write(kept)
+        self.spilled += len(kept)
+        self.dropped += len(data) - len(kept)
+
+
+def spill_path(command_id: str, stream: str) -> str:
+    """Spill file of a command's stream (the command ID is sanitized into the name)"""
+    return os.path.join(SPILL_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', command_id)}.{stream}")
+
+
+def cleanup_spills():
+    """Delete spill files older than SPILL_RETENTION"""
+    cutoff = time.time() - SPILL_RETENTION
+    try:
+        for entry in os.scandir(SPILL_DIR):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    except OSError as e:
+        log.debug("Spill cleanup failed: %s", e)
+
+
+def fetch_output(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+    """Read part of the spilled output of an earlier command
+
+    input_data: command_id, stream ("stdout" or "stderr"), offset, length
+    """
+    command_id = str(input_data.get("command_id", ""))
+    stream = input_data.get("stream", "stdout")
 
+    if not command_id or stream not in ("stdout", "stderr"):
+        return {
+            "stdout": "",
+            "stderr": "command_id and stream (stdout or stderr) required",
+            "exit_code": 1,
+            "duration": 0,
+            "error": "command_id and stream (stdout or stderr) required"
+        }
+
+    offset = max(0, int(input_data.get("offset", 0)))
+    length = max(0, min(int(input_data.get("length", FETCH_CHUNK_BYTES)), FETCH_CHUNK_BYTES))
+    try:
+        with open(spill_path(command_id, stream), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            data = f.read(length)
+    except FileNotFoundError:
+        return {
+            "stdout": "",
+            "stderr": f"No spilled {stream} for command {command_id}",
+            "exit_code": 1,
+            "duration": 0,
+            "error": f"No spilled {stream} for command {command_id}"
+        }
 
-def execute_command(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
-    """Execute a shell command and return the result"""
+    return {
+        "stdout": data.decode("utf-8", errors="replace"),
+        "stderr": "",
+        "exit_code": 0,
+        "duration": 0,
+        "error": "",
+        "offset": offset,
+        "next_offset": offset + len(data),
+        "spill_bytes": size,
+        "eof": offset + len(data) >= size
+    }
+
+
+def _pump(pipe, capture: OutputCapture, streamer: Optional[OutputStreamer]):
+    """Reader thread: copy a pipe into its capture (and the streamer) as it produces output"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace") if streamer else None
+    try:
+        while True:
+            data = pipe.read1(65536)
+            capture.write(data)
+            if decoder:
+                text = decoder.decode(data, final=not data)
+                if text:
+                    streamer.feed(capture.stream, text)
+            if not data:
+                break
+    finally:
+        pipe.close()
+        capture.close()
+
+
+def execute_command(input_data: Dict[str, Any], timeout: int, command_id: Optional[str] = None) -> Dict[str, Any]:
+    """Execute a shell command and return the result
+
+    Output is read as it is produced; with a command_id (and STREAM_OUTPUT
+    on) it is also streamed to the server while the command runs. Only the
+    head and tail of each stream are kept in memory (see OutputCapture);
+    stdout_bytes/stderr_bytes report the true sizes.
+    """
     start_time = time.time()
     command = input_data.get("command", "")
 
@@ -67,38 +433,59 @@ def execute_command(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
             "error": "No command specified"
         }
 
+    streamer = None
     try:
         timeout_val = float(timeout) if timeout > 0 else None
 
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
             shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout_val
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=os.name == "posix"  # own process group, so a timeout kills the whole pipeline
         )
-
+        streamer = OutputStreamer(command_id) if STREAM_OUTPUT and command_id else None
+        captures = [OutputCapture(command_id, "stdout"), OutputCapture(command_id, "stderr")]
+        readers = [
+            threading.Thread(target=_pump, args=(process.stdout, captures[0], streamer), daemon=True),
+            threading.Thread(target=_pump, args=(process.stderr, captures[1], streamer), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        try:
+            process.wait(timeout=timeout_val)
+        except subprocess.TimeoutExpired:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.wait()
+            timed_out = True
+        # Background children may keep the pipes open; don't wait on them forever
+        for reader in readers:
+            reader.join(timeout=5)
+
+        if streamer:
+            streamer.close()
         duration = int((time.time() - start_time) * 1000)
 
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "exit_code": result.returncode,
+        result = {
+            "stdout": captures[0].text(),
+            "stderr": captures[1].text(),
+            "exit_code": 1 if timed_out else process.returncode,
             "duration": duration,
-            "error": ""
-        }
-
-    except subprocess.TimeoutExpired:
-        duration = int((time.time() - start_time) * 1000)
-        return {
-            "stdout": "",
-            "stderr": "",
-            "exit_code": 1,
-            "duration": duration,
-            "error": "command timed out"
+            "error": "command timed out" if timed_out else ""
         }
+        for capture in captures:
+            result.update(capture.result_fields())
+        return result
 
     except Exception as e:
+        if streamer:
+            streamer.close()
         duration = int((time.time() - start_time) * 1000)
         return {
             "stdout": "",
@@ -109,8 +496,13 @@ def execute_command(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
         }
 
 
-def download_file(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
-    """Download a file from agent and return file data"""
+def download_file(input_data: Dict[str, Any], timeout: int, command_id: Optional[str] = None) -> Dict[str, Any]:
+    """Download a file from agent and return file data
+
+    Files up to FILE_INLINE_BYTES (or without a command_id) are returned
+    inline as base64. Larger files are streamed to the server in chunks
+    first (see upload_file_chunks) and the result only describes them.
+    """
     start_time = time.time()
     file_path = input_data.get("path", "")
 
@@ -144,6 +536,25 @@ def download_file(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
                 "error": f"Path is not a file: {file_path}"
             }
 
+        if command_id and os.path.getsize(file_path) > FILE_INLINE_BYTES:
+            with open(file_path, 'rb') as f:
+                file_size, file_hash = upload_file_chunks(command_id, f)
+            file_name = os.path.basename(file_path)
+            file_mime, _ = mimetypes.guess_type(file_path)
+            return {
+                "result_type": "file",
+                "file_transfer": "chunked",
+                "file_name": file_name,
+                "file_size": file_size,
+                "file_mime": file_mime or "application/octet-stream",
+                "file_hash": file_hash,
+                "stdout": f"File downloaded: {file_name} ({file_size} bytes)",
+                "stderr": "",
+                "exit_code": 0,
+                "duration": int((time.time() - start_time) * 1000),
+                "error": ""
+            }
+
         # Read file
         with open(file_path, 'rb') as f:
             file_data = f.read()
@@ -196,6 +607,67 @@ def download_file(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
         }
 
 
+def _hash_prefix(f, length: int, digest, buffer: bytearray):
+    """Feed the first length bytes of f into digest, leaving f positioned at length"""
+    view = memoryview(buffer)
+    f.seek(0)
+    remaining = length
+    while remaining > 0:
+        n = f.readinto(view[:min(remaining, len(buffer))])
+        if not n:
+            raise ValueError(f"file is shorter than the {length} bytes the server already has")
+        digest.update(view[:n])
+        remaining -= n
+
+
+def upload_file_chunks(command_id: str, f) -> Tuple[int, str]:
+    """
+    Stream a file to the server's /results/file/<command_id> in FILE_CHUNK_BYTES chunks
+
+    Memory stays at one chunk buffer, reused for every read (readinto) and
+    sent without copying. The sha256 is computed incrementally. The upload
+    resumes from the offset the server already holds, and restarts from the
+    server's offset whenever it answers 409.
+
+    Returns:
+        (bytes sent, sha256 hex digest)
+
+    Raises:
+        RuntimeError: The server refused a chunk
+        requests.exceptions.RequestException: The server could not be reached
+    """
+    path = f"/results/file/{command_id}"
+    buffer = bytearray(FILE_CHUNK_BYTES)
+    view = memoryview(buffer)
+    digest = hashlib.sha256()
+
+    response = client.request("GET", path)
+    offset = jsoncodec.loads(response.content).get("offset", 0) if response.status_code == 200 else 0
+    if offset:
+        log.info("[TRANSFER] Resuming %s at offset %d", command_id, offset)
+        _hash_prefix(f, offset, digest, buffer)
+
+    restarts = 0
+    while True:
+        n = f.readinto(buffer)
+        if not n:
+            return offset, digest.hexdigest()
+        response = client.request("PUT", path, params={"offset": offset}, data=view[:n], timeout=FILE_CHUNK_TIMEOUT)
+        if response.status_code == 200:
+            digest.update(view[:n])
+            offset += n
+            continue
+        if response.status_code == 409 and restarts < 3:
+            # The server holds a different amount (e.g. a retried chunk did arrive): continue from its offset
+            restarts += 1
+            offset = jsoncodec.loads(response.content).get("offset", 0)
+            log.info("[TRANSFER] Server expects offset %d for %s", offset, command_id)
+            digest = hashlib.sha256()
+            _hash_prefix(f, offset, digest, buffer)
+            continue
+        raise RuntimeError(f"file chunk at offset {offset} rejected: {response.status_code}")
+
+
 def upload_file(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
     """Upload a file to agent"""
     start_time = time.time()
@@ -280,36 +752,215 @@ def upload_file(input_data: Dict[str, Any], timeout: int) -> Dict[str, Any]:
         }
 
 
-def get_command_from_server(agent_id: int):
-    """Poll server for pending commands using agent ID"""
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), None if absent/invalid"""
+    if not value:
+        return None
     try:
-        print(f"[POLL] Requesting commands for agent {agent_id}")
-        response = requests.get(
-            f"{SERVER_URL}/commands",
-            params={"agent_id": agent_id},
-            timeout=10
-        )
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
-        print(f"[POLL] Response status: {response.status_code}")
-        print(f"[POLL] Response body: {response.text[:200]}")  # First 200 chars
+class ServerClient:
+    """
+    Persistent HTTP client for server.py
+
+    - One requests.Session with a pooled HTTPAdapter: connections are kept
+      alive and reused by the poll loop, the workers and the output
+      streamers, so an agent holds a handful of connections for hours
+      instead of opening one per request
+    - Connection errors (including a stale pooled connection the server
+      closed) and 429/502/503/504 are retried up to `retries` times with
+      full-jitter exponential backoff, waiting at least Retry-After when the
+      server sends one. Read timeouts are not retried: the server may have
+      acted on the request
+    - Retries draw on a shared budget that earns `budget` tokens per request,
+      so an outage does not multiply the load on a recovering server
+    - JSON bodies are compressed with encode_body() when large enough
+
+    Args:
+        base_url: server.py (or router) base URL
+        pool_size: Max pooled connections
+        retries: Default retries per request
+        budget: Retry tokens earned per request
+        encoding: Content-Encoding for JSON bodies ("" = off)
+    """
+
+    def __init__(self, base_url: str, pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES,
+                 budget: float = RETRY_BUDGET, encoding: str = RESULT_ENCODING):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.budget = budget
+        self.encoding = encoding
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "telepat-agent/1.0"
+        # Start with a few tokens so the first failures can be retried
+        self.max_tokens = 10.0
+        self.tokens = self.max_tokens
+        self.stats = {"requests": 0, "retries": 0, "budget_exhausted": 0}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                json_body: Any = None, data: Any = None, timeout: float = 10,
+                retries: Optional[int] = None) -> requests.Response:
+        """
+        Send a request, retrying transient failures within the budget
+
+        Args:
+            json_body: Sent as (possibly compressed) JSON
+            data: Sent as is, as application/octet-stream (bytes or a memoryview)
+
+        Returns:
+            The last response (possibly still an error status)
+
+        Raises:
+            requests.exceptions.RequestException: When the last attempt failed to connect or timed out
+        """
+        headers = {}
+        if data is not None:
+            headers["Content-Type"] = "application/octet-stream"
+        elif json_body is not None:
+            data, encoding = encode_body(jsoncodec.dumpb(json_body), self.encoding)
+            headers["Content-Type"] = "application/json"
+            if encoding:
+                headers["Content-Encoding"] = encoding
+        retries = self.retries if retries is None else retries
+        with self._lock:
+            self.stats["requests"] += 1
+            self.tokens = min(self.max_tokens, self.tokens + self.budget)
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, self.base_url + path, params=params, data=data,
+                                                headers=headers, timeout=timeout)
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= retries or not self._spend_retry():
+                    raise
+                delay = self._backoff(attempt)
+                log.debug("%s %s failed (%s), retry %d in %.2fs", method, path, e, attempt + 1, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries or not self._spend_retry():
+                    return response
+                delay = self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                log.debug("%s %s returned %s, retry %d in %.2fs", method, path, response.status_code, attempt + 1, delay)
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def _spend_retry(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                self.stats["budget_exhausted"] += 1
+                return False
+            self.tokens -= 1
+            self.stats["retries"] += 1
+            return True
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full jitter over the exponential window, but never less than Retry-After"""
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(RETRY_MAX_DELAY, retry_after))
+        return delay
+
+
+client = ServerClient(SERVER_URL)
+
+
+def get_commands_from_server(agent_id: int, free: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+    """Poll server for pending commands using agent ID
+
+    Args:
+        agent_id: Our agent ID
+        free: Commands we can take now (CommandPool.free(), which counts
+            the fullest class); the server hands out up to this many in
+            one answer
+
+    Returns:
+        (commands, possibly empty; seconds the server asked us to wait
+        before the next poll via next_poll_ms or Retry-After, or None)
+    """
+    params = {"agent_id": agent_id}
+    if free is not None:
+        params["free"] = free
+        params["max"] = free
+    try:
+        # No retries: the poll loop polls again anyway
+        response = client.request("GET", "/commands", params=params, retries=0)
 
+        hint = parse_retry_after(response.headers.get("Retry-After"))
         if response.status_code == 200:
-            data = response.json()
-            print(f"[POLL] Parsed JSON: {data}")
+            data = jsoncodec.loads(response.content)
+            if data.get("next_poll_ms") is not None:
+                hint = max(0.0, float(data["next_poll_ms"]) / 1000)
 
             if data.get("no_command"):
-                print(f"[POLL] No commands available")
-                return None
-
-            print(f"[POLL] Command received: {data.get('command_id', 'NO_ID')}")
-            return data
+                log.debug("[POLL] No commands available")
+                return [], hint
+
+            # List form for ?max=, a single command payload from older servers
+            commands = data["commands"] if "commands" in data else [data]
+            log.debug("[POLL] %d command(s) received: %s", len(commands),
+                      ", ".join(str(command.get('command_id', 'NO_ID')) for command in commands))
+            return commands, hint
         else:
-            print(f"[POLL] Error getting commands: {response.status_code}")
-            return None
+            log.warning("[POLL] Error getting commands: %s", response.status_code)
+            return [], hint
 
-    except requests.exceptions.RequestException as e:
-        print(f"[POLL] Failed to get commands from server: {e}")
-        return None
+    except (requests.exceptions.RequestException, jsoncodec.DecodeError, ValueError) as e:
+        log.warning("[POLL] Failed to get commands from server: %s", e)
+        return [], None
+
+
+class PollSchedule:
+    """
+    Adaptive delay between polls
+
+    - Right after a command arrives the next poll goes out at once (more
+      work is likely queued behind it)
+    - Each empty or failed poll doubles the delay, from POLL_INTERVAL up to
+      POLL_MAX_INTERVAL; idle agents settle at the cap
+    - Delays are jittered to the upper half of the window, so a fleet that
+      restarted together spreads out instead of polling in lockstep
+    - A server hint (next_poll_ms in the body, or Retry-After) replaces the
+      computed delay
+    """
+
+    def __init__(self, base: float = POLL_INTERVAL, cap: float = POLL_MAX_INTERVAL):
+        self.base = max(0.01, base)
+        self.cap = max(self.base, cap)
+        self.misses = 0
+
+    def first(self) -> float:
+        """Random start-up delay that de-synchronises agents started together"""
+        return random.uniform(0, self.base)
+
+    def busy(self):
+        """A command arrived or finished: poll again right away"""
+        self.misses = 0
+
+    def next(self, got_work: bool, hint: Optional[float] = None) -> float:
+        """Seconds to wait before the next poll"""
+        if got_work:
+            self.misses = 0
+            window = 0.0
+        else:
+            window = min(self.cap, self.base * 2 ** min(self.misses, 16))
+            self.misses += 1
+        if hint is not None:
+            window = min(hint, self.cap * 4)
+            return window * random.uniform(1.0, 1.1)
+        return window * random.uniform(0.5, 1.0)
 
 
 def send_result_to_server(command_id: str, result: Dict[str, Any]):
@@ -317,19 +968,143 @@ def send_result_to_server(command_id: str, result: Dict[str, Any]):
     try:
         result["command_id"] = command_id
 
-        response = requests.post(
-            f"{SERVER_URL}/results",
-            json=result,
-            timeout=10
-        )
+        response = client.request("POST", "/results", json_body=result)
 
-        if response.status_code == 200:
-            print(f"Result sent for command {command_id}")
+        if response.status_code in (200, 202):
+            log.debug("Result sent for command %s", command_id)
         else:
-            print(f"Error sending result: {response.status_code}")
+            log.warning("Error sending result for command %s: %s", command_id, response.status_code)
+
+    except requests.exceptions.RequestException as e:
+        log.warning("Failed to send result to server: %s", e)
+
+
+def send_partial_to_server(chunk: Dict[str, Any]) -> Optional[float]:
+    """Send a chunk of a running command's output (best effort, the final result has it all)
 
+    Returns:
+        Seconds to hold off further chunks when the server pushed back
+        (Retry-After on 429/503, or STREAM_FLUSH_INTERVAL after a failure), else None
+    """
+    try:
+        # No retries: a refused chunk is dropped and the streamer pauses instead
+        response = client.request("POST", "/results/partial", json_body=chunk, retries=0)
+        if response.status_code in (200, 202):
+            return None
+        log.warning("[STREAM] Chunk %s#%s rejected: %s", chunk["command_id"], chunk["seq"], response.status_code)
+        return parse_retry_after(response.headers.get("Retry-After")) or STREAM_FLUSH_INTERVAL
     except requests.exceptions.RequestException as e:
-        print(f"Failed to send result to server: {e}")
+        log.warning("[STREAM] Failed to send chunk %s#%s: %s", chunk["command_id"], chunk["seq"], e)
+        return STREAM_FLUSH_INTERVAL
+
+
+def run_command(command_data: Dict[str, Any]):
+    """Execute one command and send its result to the server (runs on a worker thread)"""
+    command_id = command_data.get("command_id")
+    command_type = command_data.get("command_type")
+    input_data = command_data.get("input_data", {})
+    timeout = command_data.get("timeout", 0)
+
+    log.info("[EXECUTE] Received command: %s (ID: %s)", command_type, command_id)
+    log.debug("[EXECUTE] Input data: %r", input_data)
+
+    try:
+        # Execute command based on type
+        if command_type == "execute":
+            result = execute_command(input_data, timeout, command_id)
+        elif command_type == "download":
+            result = download_file(input_data, timeout, command_id)
+        elif command_type == "upload":
+            result = upload_file(input_data, timeout)
+        elif command_type == "fetch_output":
+            result = fetch_output(input_data, timeout)
+        else:
+            result = {
+                "stdout": "",
+                "stderr": f"Unsupported command type: {command_type}",
+                "exit_code": 1,
+                "duration": 0,
+                "error": f"Unsupported command type: {command_type}"
+            }
+    except Exception as e:
+        log.exception("[EXECUTE] Command %s failed: %s", command_id, e)
+        result = {"stdout": "", "stderr": str(e), "exit_code": 1, "duration": 0, "error": str(e)}
+
+    # Send result back to server
+    send_result_to_server(command_id, result)
+    log.info("[EXECUTE] Finished command %s (exit code %s)", command_id, result.get("exit_code"))
+
+
+class CommandPool:
+    """
+    Worker pools per command class with separate concurrency limits
+
+    Each class runs at most its limit at once, so a burst of one class never
+    starves the other. The server cannot tell classes apart, so any command
+    it hands out may land in any class. A class past its limit queues the
+    command locally, up to backlog commands. free() is the number of idle
+    workers across all classes, capped so that no class could overflow its
+    backlog if every command of the poll landed in it. A saturated class
+    therefore keeps nobody from polling until its backlog is full as well.
+
+    Args:
+        limits: Worker class -> max commands running at once
+        backlog: Commands each class may hold waiting for a worker
+    """
+
+    def __init__(self, limits: Dict[str, int], backlog: int = 0):
+        self.limits = {name: max(1, limit) for name, limit in limits.items()}
+        self.backlog = max(0, backlog)
+        self.executors = {name: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"agent-{name}")
+                          for name, limit in self.limits.items()}
+        self.busy = {name: 0 for name in self.limits}
+        self.finished = 0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def classify(command_data: Dict[str, Any]) -> str:
+        return COMMAND_CLASSES.get(command_data.get("command_type"), "execute")
+
+    def free(self) -> int:
+        """Commands that can be accepted now: idle workers, bounded by the fullest class's backlog room"""
+        with self._cond:
+            return self._free()
+
+    def submit(self, command_data: Dict[str, Any]):
+        """Queue a command on its class's pool"""
+        name = self.classify(command_data)
+        with self._cond:
+            self.busy[name] += 1
+        self.executors[name].submit(self._run, name, command_data)
+
+    def wait_for_slot(self, timeout: float) -> bool:
+        """Block until free() is above 0 (True) or timeout passes (False)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._free() > 0, timeout)
+
+    def wait_for_finish(self, since: int, timeout: float) -> bool:
+        """Block until a command finishes after finished count `since` (True) or timeout passes (False)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished > since, timeout)
+
+    def shutdown(self):
+        """Let running and queued commands finish"""
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+
+    def _free(self) -> int:
+        idle = sum(max(0, self.limits[name] - self.busy[name]) for name in self.limits)
+        room = min(self.limits[name] + self.backlog - self.busy[name] for name in self.limits)
+        return max(0, min(idle, room))
+
+    def _run(self, name: str, command_data: Dict[str, Any]):
+        try:
+            run_command(command_data)
+        finally:
+            with self._cond:
+                self.busy[name] -= 1
+                self.finished += 1
+                self._cond.notify_all()
 
 
 def register_with_server() -> Optional[int]:
@@ -354,44 +1129,60 @@ def register_with_server() -> Optional[int]:
         if AGENT_DOMAIN:
             registration_data["domain"] = AGENT_DOMAIN
 
-        response = requests.post(
-            f"{SERVER_URL}/register",
-            json=registration_data,
-            timeout=10  # Increased timeout for ACK wait
-        )
+        registration_data["instance"] = INSTANCE_ID
+
+        response = client.request("POST", "/register", json_body=registration_data,
+                                  params={"wait": REGISTER_WAIT}, timeout=REGISTER_WAIT + 10)
+
+        # 202: registration is in progress, follow the ticket until it is decided
+        deadline = time.monotonic() + REGISTER_DEADLINE
+        while response.status_code == 202 and time.monotonic() < deadline:
+            ticket = jsoncodec.loads(response.content).get('ticket')
+            if not ticket:
+                log.warning("Registration accepted without a ticket")
+                return None
+            log.debug("Registration pending, waiting on ticket %s", ticket)
+            response = client.request("GET", f"/register/{ticket}",
+                                      params={"wait": REGISTER_WAIT}, timeout=REGISTER_WAIT + 10)
 
         if response.status_code == 200:
-            result = response.json()
+            result = jsoncodec.loads(response.content)
             agent_id = result.get('agent_id')
             if agent_id:
-                print(f"Registration successful: {result.get('message')}")
-                print(f"Assigned agent ID: {agent_id}")
+                log.info("Registration successful: %s (agent ID %s)", result.get('message'), agent_id)
                 return agent_id
             else:
-                print(f"Registration response missing agent_id: {result}")
+                log.warning("Registration response missing agent_id: %r", result)
                 return None
         else:
-            print(f"Registration failed: {response.status_code}")
+            log.warning("Registration failed: %s", response.status_code)
             try:
-                error_data = response.json()
-                print(f"Error: {error_data.get('error') or error_data.get('message')}")
+                error_data = jsoncodec.loads(response.content)
+                log.warning("Error: %s", error_data.get('error') or error_data.get('message'))
             except:
                 pass
             return None
 
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to register with server: {e}")
+    except (requests.exceptions.RequestException, jsoncodec.DecodeError) as e:
+        log.warning("Failed to register with server: %s", e)
         return None
 
 
 def main():
     """Main agent loop"""
+    logging.basicConfig(
+        level=LOG_LEVEL.upper(),
+        format="%(asctime)s.%(msecs)03d %(levelname)s %(message)s",
+        datefmt="%H:%M:%S"
+    )
+
     print("=" * 50)
     print("  TelePAT Python Agent")
     print("=" * 50)
     print()
     print(f"Server URL:     {SERVER_URL}")
-    print(f"Poll Interval:  {POLL_INTERVAL}s")
+    print(f"Poll Interval:  {POLL_INTERVAL}s, backing off to {POLL_MAX_INTERVAL}s when idle")
+    print(f"Workers:        {EXECUTE_WORKERS} execute, {TRANSFER_WORKERS} transfer")
     print(f"ID File:        {AGENT_ID_FILE}")
     if AGENT_DESCRIPTION:
         print(f"Description:    {AGENT_DESCRIPTION}")
@@ -434,46 +1225,39 @@ def main():
     print("(Press Ctrl+C to stop)")
     print()
 
+    pool = CommandPool({"execute": EXECUTE_WORKERS, "transfer": TRANSFER_WORKERS}, backlog=CLASS_BACKLOG)
+    schedule = PollSchedule()
+
     try:
+        time.sleep(schedule.first())
         while True:
-            # Poll server for commands using our agent ID
-            command_data = get_command_from_server(agent_id)
-
-            if command_data:
-                command_id = command_data.get("command_id")
-                command_type = command_data.get("command_type")
-                input_data = command_data.get("input_data", {})
-                timeout = command_data.get("timeout", 0)
-
-                print(f"[EXECUTE] Received command: {command_type} (ID: {command_id})")
-                print(f"[EXECUTE] Input data: {input_data}")
-
-                # Execute command based on type
-                if command_type == "execute":
-                    result = execute_command(input_data, timeout)
-                elif command_type == "download":
-                    result = download_file(input_data, timeout)
-                elif command_type == "upload":
-                    result = upload_file(input_data, timeout)
-                else:
-                    result = {
-                        "stdout": "",
-                        "stderr": f"Unsupported command type: {command_type}",
-                        "exit_code": 1,
-                        "duration": 0,
-                        "error": f"Unsupported command type: {command_type}"
-                    }
-
-                # Send result back to server
-                print(f"[EXECUTE] Sending result for command {command_id}")
-                send_result_to_server(command_id, result)
-                print(f"[EXECUTE] Result sent successfully")
-
-            # Wait before next poll
-            time.sleep(POLL_INTERVAL)
+            free = pool.free()
+            if free == 0:
+                # No idle worker, or a class's backlog is full: poll again once a command finishes
+                pool.wait_for_slot(POLL_MAX_INTERVAL)
+                schedule.busy()
+                continue
+
+            # Poll server for commands using our agent ID, reporting free capacity
+            finished = pool.finished
+            commands, hint = get_commands_from_server(agent_id, free)
+
+            # Run on workers; the loop keeps polling meanwhile
+            for command_data in commands:
+                pool.submit(command_data)
+
+            delay = schedule.next(bool(commands), hint)
+            if hint is not None:
+                # The server asked for this pause
+                time.sleep(delay)
+            elif pool.wait_for_finish(finished, delay):
+                # A command finished: more work is likely queued, poll now
+                schedule.busy()
 
     except KeyboardInterrupt:
-        print("\nAgent stopped by user")
+        print("\nAgent stopping, waiting for running commands to finish (Ctrl+C again to abort)...")
+        pool.shutdown()
+        print("Agent stopped by user")
 
 
 if __name__ == "__main__":
@@ -10,8 +10,12 @@ import time
 import requests
 import sqlite3
 from SlotSDK import SlotSDK
+import jsoncodec
+from compression import init_compression
 
 app = Flask(__name__)
+jsoncodec.init_app(app)
+init_compression(app)  # also covers the admin/client blueprints
 
 
 app.register_blueprint(admin_bp)
@@ -3,8 +3,12 @@ import base64
 import sqlite3
 from flask import Flask, request, jsonify
 from datetime import datetime
+import jsoncodec
+from compression import init_compression
 
 app = Flask(__name__)
+jsoncodec.init_app(app)
+init_compression(app)
 
 DB_FILE = "db.sqlite"
 
@@ -0,0 +1,43 @@
+"""
+Heartbeat metrics sampling cost
+
+Times HostSampler.sample() with the cache bypassed, i.e. the work done
+once per SlotSDK heartbeat. The target is well under 1 ms per sample.
+
+Usage:
+    python -m benchmarks.bench_hostmetrics [--samples 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hostmetrics import HostSampler  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure heartbeat metrics sampling cost")
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    sampler = HostSampler(min_interval=0)
+    timings = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        sampler.sample({"pending_requests": 0})
+        timings.append((time.perf_counter() - start) * 1e6)
+
+    timings.sort()
+    print(json.dumps(sampler.sample({"pending_requests": 0}), indent=2))
+    print(f"\nsamples: {args.samples}")
+    print(f"p50: {timings[len(timings) // 2]:.1f} us")
+    print(f"p99: {timings[int(len(timings) * 0.99)]:.1f} us")
+    print(f"max: {timings[-1]:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+JSON codec microbenchmark
+
+Encodes and decodes realistic relay envelopes (GET_COMMANDS / COMMAND /
+RESULT as built by SlotSDK and agent.py) with the standard library and
+with jsoncodec, whose backend is orjson when installed.
+
+Usage:
+    python -m benchmarks.bench_json [--seconds 0.5]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsoncodec  # noqa: E402
+
+
+def envelope(msg_type, payload):
+    return {
+        "id": str(uuid.uuid4()),
+        "type": msg_type,
+        "relay_id": "",
+        "agent_id": "py-slot",
+        "payload": payload,
+        "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
+    }
+
+
+def build_cases():
+    command = envelope("COMMAND", {
+        "command_id": str(uuid.uuid4()),
+        "command_type": "execute",
+        "agent_id": 42,
+        "input_data": {"command": "uname -a && df -h && uptime"},
+        "timeout": 30
+    })
+    log_line = "2025-11-12T10:15:32.118Z INFO worker[3] processed job id=81723 status=ok latency_ms=12\n"
+    small_result = envelope("RESULT", {
+        "command_id": str(uuid.uuid4()),
+        "stdout": "Linux host 6.1.0 x86_64 GNU/Linux\n",
+        "stderr": "",
+        "exit_code": 0,
+        "duration": 12,
+        "error": ""
+    })
+    text_result = envelope("RESULT", {
+        "command_id": str(uuid.uuid4()),
+        "stdout": log_line * 800,  # ~64 KB of log output
+        "stderr": "",
+        "exit_code": 0,
+        "duration": 340,
+        "error": ""
+    })
+    file_result = envelope("RESULT", {
+        "command_id": str(uuid.uuid4()),
+        "result_type": "file",
+        "file_name": "dump.bin",
+        "file_size": 1024 * 1024,
+        "file_mime": "application/octet-stream",
+        "file_data": base64.b64encode(os.urandom(1024 * 1024)).decode("ascii"),
+        "file_hash": "0" * 64,
+        "stdout": "File downloaded: dump.bin (1048576 bytes)",
+        "stderr": "",
+        "exit_code": 0,
+        "duration": 95,
+        "error": ""
+    })
+    return [
+        ("COMMAND", command),
+        ("RESULT small", small_result),
+        ("RESULT 64KB text", text_result),
+        ("RESULT 1MB file", file_result)
+    ]
+
+
+def bench(fn, seconds):
+    """Return mean microseconds per call, running for about `seconds`"""
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(10):
+            fn()
+        calls += 10
+        now = time.perf_counter()
+        if now >= deadline:
+            return (now - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare stdlib json with jsoncodec on relay envelopes")
+    parser.add_argument("--seconds", type=float, default=0.5, help="time budget per measurement")
+    args = parser.parse_args()
+
+    print(f"jsoncodec backend: {jsoncodec.BACKEND}\n")
+    print(f"{'envelope':<18} {'size':>9} {'encode stdlib':>14} {'encode codec':>13} {'decode stdlib':>14} {'decode codec':>13}")
+    for name, message in build_cases():
+        raw = jsoncodec.dumpb(message)
+        text = raw.decode("utf-8")
+        # What SlotSDK did before: json.dumps() to str, then websocket-client encoded it to bytes
+        enc_std = bench(lambda: json.dumps(message).encode("utf-8"), args.seconds)
+        enc_fast = bench(lambda: jsoncodec.dumpb(message), args.seconds)
+        dec_std = bench(lambda: json.loads(text), args.seconds)
+        dec_fast = bench(lambda: jsoncodec.loads(raw), args.seconds)
+        print(f"{name:<18} {len(raw):>8,}B {enc_std:>11.1f} us {enc_fast:>10.1f} us {dec_std:>11.1f} us {dec_fast:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Logging overhead benchmark
+
+Compares the old print()-based hot-path logging of SlotSDK / server.py
+with the telelog loggers that replaced it. Output goes to os.devnull so
+only the formatting and write-call cost is measured (a real terminal or
+pipe is slower still).
+
+Usage:
+    python -m benchmarks.bench_logging [--iterations 200000]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telelog  # noqa: E402
+
+
+# A realistic GET_COMMANDS response as it used to be dumped on every poll
+COMMAND = {
+    "command_id": "5f0c7e1e-3c1d-4f55-9d0e-2b8f3d1b6a10",
+    "command_type": "execute",
+    "agent_id": 42,
+    "input_data": {"command": "uname -a && df -h && uptime"},
+    "timeout": 30
+}
+
+
+def _log_timestamp():
+    return datetime.now().strftime("%H:%M:%S.%f")[:-3]
+
+
+def legacy_print(i):
+    """What SlotSDK.request_commands printed per call before telelog"""
+    print(f"[{_log_timestamp()}] [SDK] Requesting 1 commands for agent 42, timeout=5s")
+    print(f"[{_log_timestamp()}] [SDK] GET_COMMANDS sent: message_id={i}, agent_id=42, count=1")
+    print(f"[{_log_timestamp()}] [SDK] Waiting for relay response...")
+    print(f"[{_log_timestamp()}] [SDK] Got response: {COMMAND}")
+    print(f"[{_log_timestamp()}] [SDK] Command received for agent 42: {COMMAND['command_id']}")
+
+
+def logger_debug_disabled(log, i):
+    """Current hot path with the sdk logger at INFO: debug() returns early"""
+    log.debug("GET_COMMANDS sent: message_id=%s agent_id=%s count=%s timeout=%.2fs", i, 42, 1, 5.0)
+    log.debug("Command received for agent %s: %s", 42, COMMAND['command_id'])
+
+
+def logger_info_enabled(log, i):
+    """The same two events with the level enabled and formatted"""
+    log.info("GET_COMMANDS sent: message_id=%s agent_id=%s count=%s timeout=%.2fs", i, 42, 1, 5.0)
+    log.info("Command received for agent %s: %s", 42, COMMAND['command_id'])
+
+
+def logger_info_sampled(log, i):
+    """The same two events, enabled but sampled 1 in 100"""
+    log.info("GET_COMMANDS sent: message_id=%s agent_id=%s count=%s timeout=%.2fs", i, 42, 1, 5.0, extra=telelog.SAMPLE_100)
+    log.info("Command received for agent %s: %s", 42, COMMAND['command_id'], extra=telelog.SAMPLE_100)
+
+
+def run(name, fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{name:<28} {per_call_us:>9.3f} us/poll   {iterations / elapsed:>12,.0f} polls/s", file=sys.__stdout__)
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure hot-path logging overhead")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        telelog.configure(level="INFO", ring_size=0)
+        for handler in logging.getLogger(telelog.ROOT_LOGGER).handlers:
+            handler.stream = devnull
+        log = telelog.get_logger("bench")
+
+        print(f"{'case':<28} {'cost':>16}   {'throughput':>19}")
+        with contextlib.redirect_stdout(devnull):
+            baseline = run("print (legacy)", legacy_print, args.iterations)
+        disabled = run("logger, debug disabled", lambda i: logger_debug_disabled(log, i), args.iterations)
+        run("logger, info enabled", lambda i: logger_info_enabled(log, i), args.iterations)
+        run("logger, info sampled 1/100", lambda i: logger_info_sampled(log, i), args.iterations)
+        print(f"\nHot-path overhead removed at default level: {100 * (1 - disabled / baseline):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
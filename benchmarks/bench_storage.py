@@ -0,0 +1,391 @@
+"""
+SQLite storage benchmark for the Backpro endpoints
+
+Builds db.sqlite-compatible databases (the Commands/Results schema of
+admin/app.py and client/app.py plus the agents table app.py queries) at
+several sizes, then times the exact queries behind each endpoint:
+- claim:         GET  /api/client/get-command (newest pending command)
+- list_commands: GET  /api/admin/commands
+- list_results:  GET  /api/admin/results (Results LEFT JOIN Commands)
+- create:        POST /api/admin/commands
+- result_insert: POST /api/client/results (lookup, status update, insert)
+- agent_search:  GET  /api/agents?search=...
+- delete:        DELETE /api/admin/commands/<id>
+
+Result sizes follow a lognormal distribution and command statuses a
+mostly-completed mix, so page and index behaviour resembles production.
+Mutating operations work on rows they create themselves, so a database
+keeps its size across runs and is reused from --workdir.
+
+--mode http runs the same operations through app.py's Flask test client
+(the working directory is switched to the database's directory, since
+the endpoints open "db.sqlite" relative to it).
+
+Results are written as JSON (timestamp, git revision, sizes, per-operation
+timings) for comparison between runs.
+
+Usage:
+    python -m benchmarks.bench_storage [--sizes 10k,1m,10m] [--mode sql|http|both]
+                                       [--output results.json]
+
+Note: 10m builds a multi-GB database and takes several minutes.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Same DDL the apps run at import time
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Commands (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_id INTEGER DEFAULT 1,
+        command_text TEXT NOT NULL,
+        arguments TEXT,
+        created_at TEXT,
+        status TEXT DEFAULT 'pending'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        command_id INTEGER,
+        result_data TEXT,
+        created_at TEXT,
+        FOREIGN KEY (command_id) REFERENCES Commands (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_id INTEGER UNIQUE,
+        hostname TEXT,
+        os_arch TEXT,
+        version TEXT,
+        status TEXT,
+        connected INTEGER,
+        last_seen TEXT,
+        description TEXT,
+        relay_id TEXT
+    )
+    """
+]
+
+STATUSES = [("completed", 0.90), ("failed", 0.05), ("pending", 0.04), ("running", 0.01)]
+COMMAND_TEXTS = ["uname -a", "df -h", "uptime", "ps aux", "cat /etc/os-release", "ls -la /var/log",
+                 "systemctl status nginx", "journalctl -n 200", "ip addr", "whoami"]
+
+# Queries exactly as the endpoints issue them
+Q_CLAIM = """
+    SELECT id, command_text, arguments
+    FROM Commands
+    WHERE status = 'pending'
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+Q_LIST_COMMANDS = """
+    SELECT id, command_text, arguments, created_at, status
+    FROM Commands
+    ORDER BY created_at DESC
+"""
+Q_LIST_RESULTS = """
+    SELECT
+        Results.id,
+        Commands.command_text,
+        Commands.arguments,
+        Results.result_data,
+        Results.created_at,
+        Commands.status
+    FROM Results
+    LEFT JOIN Commands ON Results.command_id = Commands.id
+    ORDER BY Results.created_at DESC
+"""
+Q_AGENTS = """
+    SELECT id, agent_id, hostname, os_arch, version, status, connected, last_seen
+    FROM agents
+    WHERE 1=1 AND (hostname LIKE ? OR description LIKE ?) ORDER BY last_seen DESC
+"""
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000 * 1000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_db(path, rows, agents, result_median, result_sigma, seed):
+    """Create and fill a database with `rows` commands (and a result for each finished one)"""
+    rng = random.Random(seed)
+    # Result text is sliced from one large block instead of generated per row
+    max_size = 256 * 1024
+    block = ("".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789 \n") for _ in range(4096)) * (max_size // 4096 + 1))[:max_size]
+    mu = math.log(result_median)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    statuses = [s for s, _ in STATUSES]
+    weights = [w for _, w in STATUSES]
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+
+    def command_rows():
+        for i in range(rows):
+            created = start + timedelta(seconds=i * 3 + rng.random())
+            yield (i + 1, rng.randint(1, agents), rng.choice(COMMAND_TEXTS), "",
+                   created.isoformat(), rng.choices(statuses, weights)[0])
+
+    batch = 50000
+    generator = command_rows()
+    finished = []
+    while True:
+        chunk = [row for _, row in zip(range(batch), generator)]
+        if not chunk:
+            break
+        conn.executemany("INSERT INTO Commands (id, agent_id, command_text, arguments, created_at, status) VALUES (?, ?, ?, ?, ?, ?)", chunk)
+        results = []
+        for command_id, _, _, _, created_at, status in chunk:
+            if status in ("completed", "failed"):
+                size = min(max_size, int(rng.lognormvariate(mu, result_sigma)))
+                offset = rng.randrange(0, max_size - size + 1)
+                results.append((command_id, block[offset:offset + size], created_at))
+        conn.executemany("INSERT INTO Results (command_id, result_data, created_at) VALUES (?, ?, ?)", results)
+        finished.append(len(results))
+        conn.commit()
+
+    conn.executemany(
+        "INSERT INTO agents (agent_id, hostname, os_arch, version, status, connected, last_seen, description, relay_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(a, f"host-{a:05d}", rng.choice(["linux/amd64", "linux/arm64", "windows/amd64"]), "1.0.0",
+          rng.choice(["connected", "disconnected", "sleep"]), rng.randint(0, 1),
+          (start + timedelta(seconds=rng.randint(0, rows * 3))).isoformat(), f"agent {a}", "relay-1")
+         for a in range(1, agents + 1)]
+    )
+    conn.commit()
+    conn.close()
+    return sum(finished)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min_ms": round(timings[0] * 1000, 3),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3)
+    }
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def bench_sql(path, repeat, list_repeat, agents):
+    """Time each endpoint's queries with a fresh connection per call, as the endpoints do"""
+    rng = random.Random(1)
+    created = []
+
+    def claim():
+        conn = sqlite3.connect(path)
+        conn.execute(Q_CLAIM).fetchone()
+        conn.close()
+
+    def list_commands():
+        conn = sqlite3.connect(path)
+        conn.execute(Q_LIST_COMMANDS).fetchall()
+        conn.close()
+
+    def list_results():
+        conn = sqlite3.connect(path)
+        conn.execute(Q_LIST_RESULTS).fetchall()
+        conn.close()
+
+    def create():
+        conn = sqlite3.connect(path)
+        cursor = conn.execute("INSERT INTO Commands (command_text, arguments, created_at, status) VALUES (?, ?, ?, ?)",
+                              ("echo bench", "", datetime.now().isoformat(), "pending"))
+        conn.commit()
+        created.append(cursor.lastrowid)
+        conn.close()
+
+    def result_insert():
+        command_id = created[len(created) - 1 - result_insert.done % len(created)]
+        result_insert.done += 1
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM Commands WHERE id = ?", (command_id,))
+        cursor.fetchone()
+        cursor.execute("UPDATE Commands SET status = ? WHERE id = ?", ("completed", command_id))
+        cursor.execute("INSERT INTO Results (command_id, result_data, created_at) VALUES (?, ?, ?)",
+                       (command_id, "bench output\n" * 20, datetime.now().isoformat()))
+        conn.commit()
+        conn.close()
+    result_insert.done = 0
+
+    def agent_search():
+        conn = sqlite3.connect(path)
+        term = f"%host-{rng.randint(1, agents):05d}%"
+        conn.execute(Q_AGENTS, (term, term)).fetchall()
+        conn.close()
+
+    def delete():
+        command_id = created.pop()
+        conn = sqlite3.connect(path)
+        conn.execute("SELECT id FROM Commands WHERE id = ?", (command_id,)).fetchone()
+        conn.execute("DELETE FROM Commands WHERE id = ?", (command_id,))
+        conn.commit()
+        conn.close()
+
+    report = {
+        "claim": timed(claim, repeat),
+        "list_commands": timed(list_commands, list_repeat),
+        "list_results": timed(list_results, list_repeat),
+        "create": timed(create, repeat),
+        "result_insert": timed(result_insert, repeat),
+        "agent_search": timed(agent_search, repeat),
+        "delete": timed(delete, repeat)
+    }
+    cleanup(path)
+    return report
+
+
+def bench_http(path, repeat, list_repeat, agents):
+    """Time the same operations through app.py's Flask test client"""
+    previous_cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(path)))
+    try:
+        from app import app
+        client = app.test_client()
+        rng = random.Random(1)
+        created = []
+
+        def create():
+            response = client.post("/api/admin/commands", json={"command_text": "echo bench", "arguments": ""})
+            created.append(response.get_json()["command_id"])
+
+        def result_insert():
+            command_id = created[len(created) - 1 - result_insert.done % len(created)]
+            result_insert.done += 1
+            client.post("/api/client/results", json={"command_id": command_id, "result": "bench output\n" * 20, "status": True})
+        result_insert.done = 0
+
+        report = {
+            "claim": timed(lambda: client.get("/api/client/get-command"), repeat),
+            "list_commands": timed(lambda: client.get("/api/admin/commands"), list_repeat),
+            "list_results": timed(lambda: client.get("/api/admin/results"), list_repeat),
+            "create": timed(create, repeat),
+            "result_insert": timed(result_insert, repeat),
+            "agent_search": timed(lambda: client.get(f"/api/agents?search=host-{rng.randint(1, agents):05d}"), repeat),
+            "delete": timed(lambda: client.delete(f"/api/admin/commands/{created.pop()}"), repeat)
+        }
+    finally:
+        os.chdir(previous_cwd)
+    cleanup(path)
+    return report
+
+
+def cleanup(path):
+    """Remove rows added by the mutating benchmarks so the database can be reused"""
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM Commands WHERE command_text = 'echo bench'")
+    conn.execute("DELETE FROM Results WHERE command_id NOT IN (SELECT id FROM Commands)")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Backpro's SQLite queries at several database sizes")
+    parser.add_argument("--sizes", default="10k,1m", help="comma-separated command counts, e.g. 10k,1m,10m")
+    parser.add_argument("--mode", choices=["sql", "http", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per point query")
+    parser.add_argument("--list-repeat", type=int, default=5, help="runs per full-table list query")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--result-median", type=int, default=400, help="median result_data size in bytes")
+    parser.add_argument("--result-sigma", type=float, default=1.5, help="lognormal sigma of result sizes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join(REPO_ROOT, ".bench-data"), help="where databases are kept")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild databases even if present")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z'),
+        "git_rev": git_rev(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "workdir", "rebuild")},
+        "sizes": {}
+    }
+
+    for label in args.sizes.split(","):
+        label = label.strip().lower()
+        rows = parse_size(label)
+        directory = os.path.join(args.workdir, label)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "db.sqlite")
+
+        entry = {"commands": rows}
+        if args.rebuild and os.path.exists(path):
+            os.remove(path)
+        if not os.path.exists(path):
+            print(f"[{label}] building {rows:,} commands in {path}...", flush=True)
+            start = time.perf_counter()
+            entry["results"] = build_db(path, rows, args.agents, args.result_median, args.result_sigma, args.seed)
+            entry["build_seconds"] = round(time.perf_counter() - start, 1)
+        entry["db_bytes"] = os.path.getsize(path)
+
+        if args.mode in ("sql", "both"):
+            print(f"[{label}] raw SQL...", flush=True)
+            entry["sql"] = bench_sql(path, args.repeat, args.list_repeat, args.agents)
+        if args.mode in ("http", "both"):
+            print(f"[{label}] Flask test client...", flush=True)
+            entry["http"] = bench_http(path, args.repeat, args.list_repeat, args.agents)
+        report["sizes"][label] = entry
+
+        for mode in ("sql", "http"):
+            if mode in entry:
+                print(f"\n  {label} / {mode}")
+                print(f"  {'operation':<15}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+                for operation, stats in entry[mode].items():
+                    print(f"  {operation:<15}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['mean_ms']:>10}")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
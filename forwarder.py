@@ -0,0 +1,224 @@
+"""
+TelePAT result forwarder
+
+Decouples POST /results from the relay connection in server.py:
+- accept() queues a result in memory and returns at once, so the agent
+  gets its answer without waiting for (or depending on) the relay
+- A drain job on the scheduler's worker pool moves queued results to
+  SlotSDK in batches, keeping at most `window` results unacknowledged
+- Each result leaves the forwarder when the relay ACKs it; results the
+  SDK gives up on (or the relay rejects) are put back at the front of the
+  queue, and dropped after max_rounds such rounds
+- The queue is bounded by entry count and payload bytes; accept() returns
+  False when it is full so the endpoint can ask the agent to retry
+- accept(durable=True) is the admission path when the SDK has a spool:
+  the result is written to the spool (fsynced) before accept() returns,
+  and the spool's size is the bound. The SDK's send window paces it
+- A drain that hits a full spool puts its results back at the front of
+  the queue and backs off (doubling up to max_backoff) before retrying
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import jsoncodec
+from scheduler import Scheduler, default_scheduler
+from spool import SpoolFull
+from telelog import get_logger, SAMPLE_100
+
+
+log = get_logger("forwarder")
+
+
+class ResultForwarder:
+    """
+    Bounded in-memory result queue in front of SlotSDK.send_result()
+
+    Args:
+        get_sdk: Returns the current SlotSDK (or None while it is starting)
+        batch: Results handed to the SDK per drain pass
+        window: Max results sent but not yet acknowledged by the relay
+        max_queued: Max results waiting in the queue
+        max_bytes: Max total encoded size of queued results
+        retry_interval: Seconds between drain passes while results are waiting
+        max_rounds: Times a result may come back undelivered before it is dropped
+        max_backoff: Longest pause between drains while the spool is full
+        scheduler: Runs the drain job (default: default_scheduler())
+    """
+
+    def __init__(self, get_sdk: Callable[[], Any], batch: int = 50, window: int = 200, max_queued: int = 10000,
+                 max_bytes: int = 256 * 1024 * 1024, retry_interval: float = 1.0, max_rounds: int = 3,
+                 max_backoff: float = 30.0, scheduler: Optional[Scheduler] = None):
+        self.get_sdk = get_sdk
+        self.batch = batch
+        self.window = window
+        self.max_queued = max_queued
+        self.max_bytes = max_bytes
+        self.retry_interval = retry_interval
+        self.max_rounds = max_rounds
+        self.max_backoff = max_backoff
+        self.scheduler = scheduler or default_scheduler()
+
+        self._lock = threading.Lock()
+        self.queue = deque()  # [result, size, rounds]
+        self.queued_bytes = 0
+        self.inflight: Dict[int, list] = {}  # token -> [result, size, rounds] sent, not yet acknowledged
+        self.spooled = 0  # results accepted into the SDK's spool, not yet acknowledged
+        self._tokens = itertools.count()
+        self.stats = {"accepted": 0, "rejected": 0, "forwarded": 0, "acked": 0, "requeued": 0, "dropped": 0,
+                      "spool_full": 0}
+        self._drain_pending = False
+        self._timer = None
+        self._backoff = 0.0
+        self._resume_at = 0.0  # monotonic time before which drains wait for the spool
+
+    def accept(self, result: Dict[str, Any], durable: bool = False) -> bool:
+        """
+        Queue a result for forwarding
+
+        Args:
+            result: Result payload (with command_id)
+            durable: Write it to the SDK's spool before returning instead of
+                queueing it in memory (the SDK must have a spool)
+
+        Returns:
+            True if queued, False if the queue (or the spool) is full
+        """
+        if durable:
+            return self._accept_durable(result)
+        size = len(jsoncodec.dumpb(result))
+        with self._lock:
+            if len(self.queue) >= self.max_queued or self.queued_bytes + size > self.max_bytes:
+                self.stats["rejected"] += 1
+                return False
+            self.queue.append([result, size, 0])
+            self.queued_bytes += size
+            self.stats["accepted"] += 1
+        self._schedule_drain()
+        return True
+
+    def _accept_durable(self, result: Dict[str, Any]) -> bool:
+        """Hand a result to the SDK's spool; the spool is the queue, and SpoolFull means full"""
+        sdk = self.get_sdk()
+        with self._lock:
+            self.spooled += 1
+        try:
+            sdk.send_result(result["command_id"], result, on_ack=self._on_spooled_ack, durable=True)
+        except SpoolFull:
+            with self._lock:
+                self.spooled -= 1
+                self.stats["rejected"] += 1
+            return False
+        with self._lock:
+            self.stats["accepted"] += 1
+            self.stats["forwarded"] += 1
+        return True
+
+    def _on_spooled_ack(self, message_id: str, delivered: bool):
+        """SDK callback for a spooled result (the SDK never gives those up, so undelivered means rejected)"""
+        with self._lock:
+            self.spooled -= 1
+            self.stats["acked" if delivered else "dropped"] += 1
+        if not delivered:
+            log.error("Relay rejected spooled result message %s, dropped", message_id)
+
+    def backlog(self) -> int:
+        """Results queued or waiting for an ACK"""
+        with self._lock:
+            return len(self.queue) + len(self.inflight) + self.spooled
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and backlog sizes for the stats endpoint"""
+        with self._lock:
+            return {
+                **self.stats,
+                "queued": len(self.queue),
+                "queued_bytes": self.queued_bytes,
+                "inflight": len(self.inflight),
+                "spooled": self.spooled
+            }
+
+    def _schedule_drain(self):
+        with self._lock:
+            if self._drain_pending:
+                return
+            self._drain_pending = True
+        self.scheduler.call_later(0, self._drain, blocking=True)
+        if self._timer is None:
+            # Safety net: picks results up again after the relay comes back
+            self._timer = self.scheduler.every(self.retry_interval, self._schedule_drain)
+
+    def _drain(self):
+        """Hand queued results to the SDK while it is connected and the ACK window allows"""
+        with self._lock:
+            self._drain_pending = False
+        sdk = self.get_sdk()
+        if not sdk or not sdk.connected or time.monotonic() < self._resume_at:
+            return
+
+        while True:
+            with self._lock:
+                room = min(self.batch, self.window - len(self.inflight), len(self.queue))
+                if room <= 0:
+                    return
+                items = [self.queue.popleft() for _ in range(room)]
+                self.queued_bytes -= sum(entry[1] for entry in items)
+
+            for index, entry in enumerate(items):
+                token = next(self._tokens)
+                with self._lock:
+                    # Registered before sending: the ACK can arrive before send_result() returns
+                    self.inflight[token] = entry
+                try:
+                    sdk.send_result(entry[0]["command_id"], entry[0], on_ack=lambda _, delivered, token=token: self._on_ack(token, delivered))
+                except SpoolFull:
+                    self._spool_full(token, items[index:])
+                    return
+                with self._lock:
+                    self.stats["forwarded"] += 1
+            with self._lock:
+                self._backoff = 0.0
+            log.debug("Forwarded %d result(s) to the relay", len(items))
+
+    def _spool_full(self, token: int, unsent: list):
+        """Put the results a full spool refused back at the front of the queue and pause draining"""
+        with self._lock:
+            self.inflight.pop(token, None)
+            self.queue.extendleft(reversed(unsent))
+            self.queued_bytes += sum(entry[1] for entry in unsent)
+            self.stats["spool_full"] += 1
+            self._backoff = min(self.max_backoff, max(self.retry_interval, self._backoff * 2))
+            self._resume_at = time.monotonic() + self._backoff
+        log.warning("Spool full, %d result(s) requeued, retrying in %.0fs", len(unsent), self._backoff, extra=SAMPLE_100)
+
+    def _on_ack(self, token: int, delivered: bool):
+        """SDK callback once a RESULT is acknowledged or given up on"""
+        with self._lock:
+            entry = self.inflight.pop(token, None)
+            if entry is None:
+                return
+            if delivered:
+                self.stats["acked"] += 1
+                waiting = bool(self.queue)
+            else:
+                entry[2] += 1
+                if entry[2] >= self.max_rounds:
+                    self.stats["dropped"] += 1
+                else:
+                    # Back to the front of the queue for another round
+                    self.queue.appendleft(entry)
+                    self.queued_bytes += entry[1]
+                    self.stats["requeued"] += 1
+                waiting = True
+
+        if not delivered:
+            if entry[2] >= self.max_rounds:
+                log.error("Result %s undelivered after %d rounds, dropped", entry[0].get("command_id"), entry[2])
+            else:
+                log.warning("Result %s not acknowledged, requeued", entry[0].get("command_id"), extra=SAMPLE_100)
+        if waiting:
+            # An ACK frees a window slot (or a result was requeued): keep draining
+            self._schedule_drain()
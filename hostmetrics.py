@@ -0,0 +1,153 @@
+"""
+TelePAT host metrics sampler
+
+Cheap host and process statistics for SlotSDK heartbeats, read straight
+from /proc and statvfs:
+- CPU usage is the delta between two /proc/stat readings, so sampling
+  never sleeps; the first sample reports the average since boot
+- Memory, load average and uptime come from /proc/meminfo, /proc/loadavg
+  and /proc/uptime
+- Disk free space is cached for disk_ttl seconds since it changes slowly
+- Process stats: RSS from /proc/self/statm and the thread count
+
+On systems without /proc the values that cannot be read are reported as 0.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class HostSampler:
+    """
+    Sample host and process metrics at low cost
+
+    sample() returns the cached result when called again within
+    min_interval seconds, so several callers (heartbeat, stats endpoints)
+    can share one reading.
+    """
+
+    def __init__(self, disk_path: str = "/", min_interval: float = 1.0, disk_ttl: float = 30.0):
+        self.disk_path = disk_path
+        self.min_interval = min_interval
+        self.disk_ttl = disk_ttl
+        self.started_at = time.monotonic()
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+        self._lock = threading.Lock()
+        self._cpu_prev = (0, 0)  # (busy, total) jiffies of the previous reading
+        self._disk_free_gb = 0.0
+        self._disk_checked = 0.0
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+
+    def cpu_percent(self) -> float:
+        """CPU usage since the previous call, from /proc/stat"""
+        data = _read("/proc/stat")
+        if not data:
+            return 0.0
+        fields = data[:data.index(b"\n")].split()[1:]
+        values = [int(v) for v in fields]
+        # user nice system idle iowait irq softirq steal (guest time is already in user)
+        total = sum(values[:8])
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        busy = total - idle
+
+        prev_busy, prev_total = self._cpu_prev
+        self._cpu_prev = (busy, total)
+        if total <= prev_total:
+            return 0.0
+        return round(100.0 * (busy - prev_busy) / (total - prev_total), 1)
+
+    def memory(self) -> Dict[str, int]:
+        """Total, available and used memory in MB, from /proc/meminfo"""
+        data = _read("/proc/meminfo")
+        if not data:
+            return {"total_mb": 0, "available_mb": 0, "used_mb": 0}
+        info = {}
+        for line in data.split(b"\n"):
+            if line.startswith((b"MemTotal:", b"MemAvailable:")):
+                key, value = line.split(b":", 1)
+                info[key] = int(value.split()[0])  # kB
+                if len(info) == 2:
+                    break
+        total = info.get(b"MemTotal", 0) // 1024
+        available = info.get(b"MemAvailable", 0) // 1024
+        return {"total_mb": total, "available_mb": available, "used_mb": total - available}
+
+    def load_avg(self) -> list:
+        """1, 5 and 15 minute load averages"""
+        data = _read("/proc/loadavg")
+        if data:
+            return [float(v) for v in data.split()[:3]]
+        if hasattr(os, "getloadavg"):
+            return [round(v, 2) for v in os.getloadavg()]
+        return [0.0, 0.0, 0.0]
+
+    def uptime_seconds(self) -> int:
+        """Host uptime, from /proc/uptime"""
+        data = _read("/proc/uptime")
+        return int(float(data.split()[0])) if data else 0
+
+    def disk_free_gb(self) -> float:
+        """Free space on disk_path for unprivileged users, refreshed every disk_ttl seconds"""
+        now = time.monotonic()
+        if now - self._disk_checked >= self.disk_ttl:
+            try:
+                st = os.statvfs(self.disk_path)
+                self._disk_free_gb = round(st.f_bavail * st.f_frsize / 1024 ** 3, 2)
+            except (OSError, AttributeError):
+                self._disk_free_gb = 0.0
+            self._disk_checked = now
+        return self._disk_free_gb
+
+    def process(self) -> Dict[str, Any]:
+        """RSS, thread count and uptime of this process"""
+        data = _read("/proc/self/statm")
+        rss_mb = round(int(data.split()[1]) * self.page_size / 1024 ** 2, 1) if data else 0
+        return {
+            "rss_mb": rss_mb,
+            "threads": threading.active_count(),
+            "uptime_seconds": int(time.monotonic() - self.started_at)
+        }
+
+    def sample(self, process_extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Take (or reuse) a sample
+
+        Args:
+            process_extra: Additional process-level fields (e.g. pending request
+                counts) merged into the "process" section; never cached
+
+        Returns:
+            Dict with uptime_seconds, cpu_percent, memory_mb, memory_total_mb,
+            disk_free_gb, load_avg and process
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._cached is None or now - self._cached_at >= self.min_interval:
+                memory = self.memory()
+                self._cached = {
+                    "uptime_seconds": self.uptime_seconds(),
+                    "cpu_percent": self.cpu_percent(),
+                    "memory_mb": memory["used_mb"],
+                    "memory_total_mb": memory["total_mb"],
+                    "disk_free_gb": self.disk_free_gb(),
+                    "load_avg": self.load_avg(),
+                    "process": self.process()
+                }
+                self._cached_at = now
+
+            result = dict(self._cached)
+            if process_extra:
+                result["process"] = {**self._cached["process"], **process_extra}
+            return result
@@ -0,0 +1,113 @@
+"""
+TelePAT JSON codec
+
+One place for JSON encoding/decoding on the hot paths (SlotSDK messages,
+Flask responses, agent/bridge HTTP bodies):
+- Uses orjson when it is installed, the standard library otherwise
+- dumpb() returns UTF-8 bytes directly, avoiding a str -> bytes copy
+- FastJSONProvider plugs the codec into Flask (jsonify, request.get_json)
+
+Values orjson cannot encode (e.g. integers above 64 bits) fall back to the
+standard library transparently.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from flask.json.provider import JSONProvider
+except ImportError:
+    JSONProvider = None
+
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _default(obj: Any) -> Any:
+    """Encode the extra types Flask's default provider also accepts"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", errors="replace")
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj: Any, indent: bool = False) -> bytes:
+        """Serialize obj to UTF-8 encoded JSON bytes"""
+        try:
+            return orjson.dumps(obj, default=_default, option=_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+        except orjson.JSONEncodeError:
+            return json.dumps(obj, default=_default, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """Deserialize JSON from str or UTF-8 bytes"""
+        return orjson.loads(data)
+
+    DecodeError = orjson.JSONDecodeError
+else:
+    def dumpb(obj: Any, indent: bool = False) -> bytes:
+        """Serialize obj to UTF-8 encoded JSON bytes"""
+        if indent:
+            return json.dumps(obj, default=_default, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """Deserialize JSON from str or UTF-8 bytes"""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    DecodeError = json.JSONDecodeError
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize obj to a JSON str"""
+    return dumpb(obj, indent=indent).decode("utf-8")
+
+
+if JSONProvider is not None:
+    class FastJSONProvider(JSONProvider):
+        """
+        Flask JSON provider backed by this codec
+
+        Install with init_app(app). jsonify() responses are built from bytes
+        without an intermediate str, and request.get_json() decodes the raw
+        body directly.
+        """
+
+        mimetype = "application/json"
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            return dumps(obj, indent=bool(kwargs.get("indent")))
+
+        def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+            return loads(s)
+
+        def response(self, *args: Any, **kwargs: Any):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumpb(obj, indent=self._app.debug), mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Make a Flask app (and all its blueprints) use FastJSONProvider"""
+    app.json = FastJSONProvider(app)
+    return app
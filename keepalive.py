@@ -0,0 +1,49 @@
+"""
+TelePAT keep-alive HTTP serving
+
+The werkzeug server behind app.run() closes the connection after every
+response (werkzeug 3 sends Connection: close unconditionally), so each
+agent poll pays a fresh TCP handshake. serve() runs a Flask app on waitress
+when it is installed (pip install waitress):
+- HTTP/1.1 keep-alive: agents reuse their pooled connections across polls
+- Idle connections are parked in waitress's event loop and cost no thread;
+  HTTP_THREADS bounds the requests handled (or long-polling) at once
+- Connections idle for HTTP_KEEPALIVE_TIMEOUT seconds are closed, and at
+  most HTTP_CONNECTION_LIMIT are accepted
+Without waitress it falls back to app.run() with threads per request.
+"""
+
+import os
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+from telelog import get_logger
+
+
+log = get_logger("keepalive")
+
+HTTP_THREADS = int(os.getenv("HTTP_THREADS", "128"))  # worker threads (long-polls hold one each)
+KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "120"))  # seconds an idle connection is kept
+CONNECTION_LIMIT = int(os.getenv("HTTP_CONNECTION_LIMIT", "10000"))  # open connections accepted at once
+
+
+def serve(app, host: str, port: int, threads: int = HTTP_THREADS):
+    """
+    Serve a Flask app with keep-alive connections (blocks)
+
+    Args:
+        app: Flask application
+        host: Address to bind
+        port: Port to bind
+        threads: Requests handled at once
+    """
+    if waitress is None:
+        log.warning("waitress not installed, serving with werkzeug (no keep-alive)")
+        app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+        return
+    log.info("Serving on %s:%s with waitress (%d threads, keep-alive %ss)", host, port, threads, KEEPALIVE_TIMEOUT)
+    waitress.serve(app, host=host, port=port, threads=threads, channel_timeout=KEEPALIVE_TIMEOUT,
+                   connection_limit=CONNECTION_LIMIT, ident="telepat")
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+TelePAT load generator
+
+Simulates N agents against a slot server (server.py) or Backpro (app.py)
+and reports throughput, latency percentiles and error rates per endpoint.
+- One asyncio task per agent, each with its own keep-alive HTTP/1.1
+  connection (a minimal client, so thousands of agents fit in one process)
+- Agents follow the agent.py protocol: register, poll, "execute", post the
+  result, sleep the poll interval (with jitter)
+- Command mix and output sizes (lognormal around a median) are configurable
+- --mock-stack starts everything in-process: a MockRelay, a SlotSDK and
+  server.app (or app.py in a temporary directory for --target backpro)
+
+Usage:
+    python loadgen.py --mock-stack --agents 200 --duration 30
+    python loadgen.py --url http://127.0.0.1:44399 --agents 50 --poll-interval 2
+    python loadgen.py --target backpro --url http://127.0.0.1:5000 --seed-rate 50
+    python loadgen.py --mock-stack --json results.json
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import jsoncodec
+
+
+class HttpError(Exception):
+    """Transport-level failure (connection refused/reset, malformed response)"""
+
+
+class HttpClient:
+    """
+    Minimal asyncio HTTP/1.1 client with one keep-alive connection
+
+    Reconnects transparently when the server closes the connection.
+    Supports Content-Length and chunked response bodies.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        """Send one request and return (status, body); retries once on a stale keep-alive connection"""
+        for attempt in (0, 1):
+            fresh = self.writer is None
+            try:
+                if fresh:
+                    await self._connect()
+                return await asyncio.wait_for(self._roundtrip(method, path, body), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, HttpError) as e:
+                await self.close()
+                if fresh or attempt:
+                    raise HttpError(str(e) or type(e).__name__)
+            except asyncio.TimeoutError:
+                await self.close()
+                raise HttpError("timeout")
+        raise HttpError("unreachable")
+
+    async def _roundtrip(self, method: str, path: str, body: Optional[bytes]) -> Tuple[int, bytes]:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nConnection: keep-alive\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        self.writer.write(head.encode("ascii") + b"\r\n" + (body or b""))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HttpError("connection closed")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2:
+            raise HttpError(f"bad status line {status_line!r}")
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close" or parts[0] == b"HTTP/1.0":
+            await self.close()
+        return status, data
+
+
+class Stats:
+    """Per-endpoint latency samples and status counts"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.events: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, status: str):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            statuses = dict(self.statuses[endpoint])
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / elapsed, 1) if elapsed else 0,
+                "error_rate": round(errors / len(samples), 4),
+                "statuses": statuses,
+                "p50_ms": percentile_ms(samples, 50),
+                "p95_ms": percentile_ms(samples, 95),
+                "p99_ms": percentile_ms(samples, 99),
+                "max_ms": round(samples[-1] * 1000, 2)
+            }
+        return {"elapsed_seconds": round(elapsed, 2), "events": dict(self.events), "endpoints": endpoints}
+
+
+def percentile_ms(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of pre-sorted samples, in milliseconds"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return round(sorted_samples[rank] * 1000, 2)
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse "execute=8,download=1,upload=1" into (command_type, weight) pairs"""
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+class Simulation:
+    """Shared configuration and state for all simulated agents"""
+
+    def __init__(self, args: argparse.Namespace, host: str, port: int):
+        self.args = args
+        self.host = host
+        self.port = port
+        self.random = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.stats = Stats()
+        self.deadline = 0.0
+
+    def output_size(self) -> int:
+        if self.args.output_sigma <= 0:
+            return self.args.output_bytes
+        mu = math.log(max(1, self.args.output_bytes))
+        return min(self.args.output_max, int(self.random.lognormvariate(mu, self.args.output_sigma)))
+
+    def pick_type(self) -> str:
+        return self.random.choices([name for name, _ in self.mix], [weight for _, weight in self.mix])[0]
+
+    def fake_result(self, command_type: str) -> Dict[str, Any]:
+        """A result shaped like agent.py's, with a sampled output size"""
+        size = self.output_size()
+        result = {
+            "stdout": "x" * size,
+            "stderr": "",
+            "exit_code": 0,
+            "duration": int(self.args.exec_ms),
+            "error": ""
+        }
+        if command_type == "download":
+            result["stdout"] = ""
+            result["file_data"] = "A" * (size * 4 // 3)
+            result["file_size"] = size
+        return result
+
+    async def call(self, client: HttpClient, endpoint: str, method: str, path: str,
+                   body: Optional[Dict[str, Any]] = None) -> Tuple[Optional[int], Any]:
+        data = jsoncodec.dumpb(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            status, raw = await client.request(method, path, data)
+        except HttpError as e:
+            self.stats.record(endpoint, time.perf_counter() - start, f"error:{e}"[:40])
+            return None, None
+        self.stats.record(endpoint, time.perf_counter() - start, str(status))
+        try:
+            return status, jsoncodec.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+    async def sleep_poll(self):
+        interval = self.args.poll_interval
+        await asyncio.sleep(interval * self.random.uniform(1 - self.args.poll_jitter, 1 + self.args.poll_jitter))
+
+    async def server_agent(self, index: int):
+        """One agent following agent.py against server.py"""
+        client = HttpClient(self.host, self.port, self.args.request_timeout)
+        agent_id = None
+        while agent_id is None and time.monotonic() < self.deadline:
+            status, data = await self.call(client, "/register", "POST", "/register?wait=5", {
+                "hostname": f"loadgen-{index}", "os": "linux", "arch": "x86_64", "version": "1.0.0",
+                "description": "loadgen"
+            })
+            while status == 202 and data and data.get("ticket") and time.monotonic() < self.deadline:
+                status, data = await self.call(client, "/register", "GET", f"/register/{data['ticket']}?wait=5")
+            if status == 200 and data:
+                agent_id = data.get("agent_id")
+            else:
+                await asyncio.sleep(1)
+        if agent_id is None:
+            await client.close()
+            return
+        self.stats.events["registered"] += 1
+
+        while time.monotonic() < self.deadline:
+            status, command = await self.call(client, "/commands", "GET", f"/commands?agent_id={agent_id}")
+            if status == 200 and command and command.get("command_id"):
+                self.stats.events["commands"] += 1
+                if self.args.exec_ms:
+                    await asyncio.sleep(self.args.exec_ms / 1000)
+                result = self.fake_result(command.get("command_type", "execute"))
+                result["command_id"] = command["command_id"]
+                status, _ = await self.call(client, "/results", "POST", "/results", result)
+                if status and status < 300:
+                    self.stats.events["results"] += 1
+            await self.sleep_poll()
+        await client.close()
+
+    async def backpro_agent(self, index: int):
+        """One client polling Backpro's /api/client/* endpoints"""
+        client = HttpClient(self.host, self.port, self.args.request_timeout)
+        while time.monotonic() < self.deadline:
+            status, data = await self.call(client, "/api/client/get-command", "GET", "/api/client/get-command")
+            if status == 200 and data and data.get("status") == "success":
+                self.stats.events["commands"] += 1
+                if self.args.exec_ms:
+                    await asyncio.sleep(self.args.exec_ms / 1000)
+                result = self.fake_result(self.pick_type())
+                status, _ = await self.call(client, "/api/client/results", "POST", "/api/client/results", {
+                    "command_id": data["command_id"],
+                    "result": result["stdout"] or result.get("file_data", ""),
+                    "status": True
+                })
+                if status and status < 300:
+                    self.stats.events["results"] += 1
+            await self.sleep_poll()
+        await client.close()
+
+    async def backpro_seeder(self, rate: float, total: int = 0):
+        """Create commands through /api/admin/commands, at rate per second (or total at once)"""
+        client = HttpClient(self.host, self.port, self.args.request_timeout)
+        count = 0
+        while (total and count < total) or (not total and time.monotonic() < self.deadline):
+            await self.call(client, "/api/admin/commands", "POST", "/api/admin/commands", {
+                "command_text": self.args.command, "arguments": ""
+            })
+            count += 1
+            if not total:
+                await asyncio.sleep(1 / rate)
+        await client.close()
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        if args.target == "backpro" and args.preload:
+            self.deadline = time.monotonic() + 3600
+            await self.backpro_seeder(0, total=args.preload * args.agents)
+            self.stats = Stats()
+
+        started = time.monotonic()
+        self.deadline = started + args.duration
+        agent = self.server_agent if args.target == "server" else self.backpro_agent
+        tasks = []
+        for index in range(args.agents):
+            tasks.append(asyncio.create_task(agent(index)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.agents)
+        if args.target == "backpro" and args.seed_rate:
+            tasks.append(asyncio.create_task(self.backpro_seeder(args.seed_rate)))
+        await asyncio.gather(*tasks)
+        return self.stats.report(time.monotonic() - started)
+
+
+def start_mock_stack(args: argparse.Namespace, sim_random: random.Random) -> Tuple[str, int, Any]:
+    """
+    Start the stack under test in this process
+
+    Returns:
+        (host, port, stop function)
+    """
+    from werkzeug.serving import make_server
+
+    # Per-request access logs would dominate the run
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    stops = []
+    if args.target == "server":
+        from mock_relay import MockRelay
+        from SlotSDK import SlotSDK
+        import server
+
+        relay = MockRelay(latency=args.relay_latency_ms / 1000, jitter=args.relay_jitter_ms / 1000,
+                          loss=args.relay_loss, seed=args.seed).start()
+        mix = parse_mix(args.mix)
+        for agent_id in range(1, args.agents + 1):
+            for _ in range(args.preload):
+                command_type = sim_random.choices([n for n, _ in mix], [w for _, w in mix])[0]
+                relay.enqueue(agent_id, {"command_type": command_type, "input_data": {"command": args.command}})
+
+        server.sdk = SlotSDK(relay.url, f"loadgen-{uuid.uuid4().hex[:8]}", server.handle_relay_command)
+        threading.Thread(target=server.sdk.run, name="loadgen-sdk", daemon=True).start()
+        for _ in range(200):
+            if server.sdk.on_dedicated_port:
+                break
+            time.sleep(0.05)
+        app = server.app
+        stops += [server.sdk.stop, relay.stop]
+    else:
+        # Backpro creates db.sqlite in the working directory at import time
+        os.chdir(tempfile.mkdtemp(prefix="loadgen-"))
+        from app import app
+
+    http = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=http.serve_forever, name="loadgen-http", daemon=True).start()
+    stops.insert(0, http.shutdown)
+
+    def stop():
+        for fn in stops:
+            fn()
+
+    return "127.0.0.1", http.server_port, stop
+
+
+def print_report(report: Dict[str, Any]):
+    print()
+    print(f"Elapsed: {report['elapsed_seconds']}s  Events: {report['events']}")
+    print(f"{'endpoint':<26}{'reqs':>8}{'rps':>9}{'err%':>8}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<26}{row['requests']:>8}{row['rps']:>9}{row['error_rate'] * 100:>8.2f}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+        errors = {s: c for s, c in row["statuses"].items() if not s.startswith("2")}
+        if errors:
+            print(f"{'':<26}non-2xx: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TelePAT load generator")
+    parser.add_argument("--target", choices=["server", "backpro"], default="server")
+    parser.add_argument("--url", default="http://127.0.0.1:44399", help="base URL (ignored with --mock-stack)")
+    parser.add_argument("--mock-stack", action="store_true", help="run the system under test in-process")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which agents start")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds between polls")
+    parser.add_argument("--poll-jitter", type=float, default=0.2, help="+/- fraction of the poll interval")
+    parser.add_argument("--mix", default="execute=8,download=1,upload=1", help="command type weights")
+    parser.add_argument("--command", default="echo hello")
+    parser.add_argument("--exec-ms", type=float, default=10.0, help="simulated execution time")
+    parser.add_argument("--output-bytes", type=int, default=512, help="median result output size")
+    parser.add_argument("--output-sigma", type=float, default=1.0, help="lognormal sigma, 0 = fixed size")
+    parser.add_argument("--output-max", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--preload", type=int, default=100, help="commands queued per agent before the run")
+    parser.add_argument("--seed-rate", type=float, default=0.0, help="backpro: commands created per second")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--relay-latency-ms", type=float, default=1.0, help="mock stack relay latency")
+    parser.add_argument("--relay-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--relay-loss", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report as JSON to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    if args.json and args.json != "-":
+        args.json = os.path.abspath(args.json)
+
+    sim_random = random.Random(args.seed)
+    stop = None
+    if args.mock_stack:
+        host, port, stop = start_mock_stack(args, sim_random)
+    else:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+
+    sim = Simulation(args, host, port)
+    try:
+        report = asyncio.run(sim.run())
+    except KeyboardInterrupt:
+        return
+    finally:
+        if stop:
+            stop()
+
+    report["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+    if args.json == "-":
+        print(jsoncodec.dumps(report, indent=True))
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, "wb") as f:
+                f.write(jsoncodec.dumpb(report, indent=True))
+            print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
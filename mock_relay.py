@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+TelePAT mock relay
+
+A local stand-in for the relay that SlotSDK, server.py and the bridges talk
+to, for offline testing and benchmarking on one machine. It implements the
+slot side of the protocol:
+- SLOT_REGISTER on the registration port, answered with an ACK carrying a
+  dedicated port (one listener per slot_id, kept across reconnects)
+- AGENT_REGISTER -> ACK with an auto-increment agent_id
+- GET_COMMANDS -> COMMAND reply (same message ID) from per-agent queues;
+  {"no_command": true} when empty, {"commands": [...]} when count > 1
+- RESULT and COMMAND_STATUS_UPDATE -> recorded, ACKed by original_message_id;
+  a "pending" status update puts a dispatched command back in its queue
+- SLOT_HEARTBEAT -> recorded
+- WebSocket ping -> pong
+
+Latency, jitter and message loss are configurable and seeded, so runs are
+reproducible. Use it in-process:
+
+    relay = MockRelay(latency=0.002, seed=1).start()
+    relay.enqueue(1, {"command_type": "execute", "input_data": {"command": "id"}})
+    sdk = SlotSDK(relay.url, "test-slot", handler)
+
+or from the command line:
+
+    python mock_relay.py --port 8081 --latency-ms 2 --agents 10 --generate 100
+"""
+
+import argparse
+import base64
+import hashlib
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional
+
+import jsoncodec
+from scheduler import Scheduler
+from telelog import get_logger
+
+
+log = get_logger("relay")
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class ConnectionClosed(Exception):
+    """The peer closed the WebSocket (or the TCP connection)"""
+
+
+class WebSocketConnection:
+    """Minimal server side of RFC 6455: handshake, framing, ping/pong, close"""
+
+    def __init__(self, sock: socket.socket, addr):
+        self.sock = sock
+        self.addr = addr
+        self.path = ""
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._buffer = b""
+
+    def handshake(self):
+        """Read the HTTP upgrade request and answer with 101 Switching Protocols"""
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionClosed("closed during handshake")
+            data += chunk
+            if len(data) > 65536:
+                raise ConnectionClosed("handshake too large")
+        head, self._buffer = data.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        self.path = lines[0].split(" ")[1] if len(lines[0].split(" ")) > 1 else "/"
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self.sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            raise ConnectionClosed("not a WebSocket request")
+
+        accept = base64.b64encode(hashlib.sha1(key.encode("ascii") + WS_GUID).digest()).decode("ascii")
+        self.sock.sendall(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("ascii")
+        )
+
+    def _read_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = self.sock.recv(max(65536, size - len(self._buffer)))
+            if not chunk:
+                raise ConnectionClosed("connection reset")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_frame(self):
+        b1, b2 = self._read_exact(2)
+        fin = bool(b1 & 0x80)
+        opcode = b1 & 0x0F
+        masked = bool(b2 & 0x80)
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read_exact(8))[0]
+        mask = self._read_exact(4) if masked else None
+        payload = self._read_exact(length)
+        if mask:
+            # XOR with the repeating 4-byte mask via one big-int operation
+            repeated = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+        return fin, opcode, payload
+
+    def recv(self):
+        """
+        Return the next (opcode, payload) message
+
+        Control frames are returned as they arrive; fragmented data frames
+        are reassembled.
+        """
+        fragments = []
+        first_opcode = None
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode >= 0x8:
+                return opcode, payload
+            if opcode != OP_CONT:
+                first_opcode = opcode
+            fragments.append(payload)
+            if fin:
+                return first_opcode, b"".join(fragments)
+
+    def send(self, opcode: int, payload: bytes = b""):
+        """Send one unmasked frame"""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            if self.closed:
+                raise ConnectionClosed("already closed")
+            self.sock.sendall(header + payload)
+
+    def close(self, code: int = 1000):
+        """Send a close frame (best effort) and close the socket"""
+        if self.closed:
+            return
+        try:
+            self.send(OP_CLOSE, struct.pack("!H", code))
+        except (OSError, ConnectionClosed):
+            pass
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Listener:
+    """A TCP listener accepting WebSocket connections on its own thread"""
+
+    def __init__(self, relay: "MockRelay", host: str, port: int, slot_id: Optional[str] = None):
+        self.relay = relay
+        self.slot_id = slot_id
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.connections: List[WebSocketConnection] = []
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, name=f"relay-listener-{self.port}", daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, addr = self.sock.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = WebSocketConnection(client, addr)
+            self.connections.append(conn)
+            threading.Thread(target=self.relay._serve, args=(self, conn), name=f"relay-conn-{addr[1]}", daemon=True).start()
+
+    def drop_connections(self):
+        """Close every connection accepted by this listener (the listener keeps running)"""
+        for conn in list(self.connections):
+            conn.close(1001)
+        self.connections.clear()
+
+    def close(self):
+        self.running = False
+        self.drop_connections()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class MockRelay:
+    """
+    In-process relay stand-in
+
+    Args:
+        host: Interface to listen on (default: 127.0.0.1)
+        port: Registration port, 0 picks a free one (default: 0)
+        latency: Seconds added before every reply, pongs included (default: 0)
+        jitter: Extra uniform random delay in seconds on top of latency (default: 0)
+        loss: Probability that an inbound message is silently dropped (default: 0)
+        seed: Random seed for jitter and loss (default: None)
+        commands: Initial queues, {agent_id: [command, ...]}
+        ack_results: ACK RESULT and COMMAND_STATUS_UPDATE messages (default: True)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, seed: Optional[int] = None, commands: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+                 ack_results: bool = True):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.ack_results = ack_results
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.queues: Dict[int, deque] = defaultdict(deque)
+        self.dispatched: Dict[str, Dict[str, Any]] = {}  # command_id -> command handed out, no result yet
+        self.next_agent_id = 1
+        self.agents: Dict[int, Dict[str, Any]] = {}
+        self.results: List[Dict[str, Any]] = []
+        self.status_updates: List[Dict[str, Any]] = []
+        self.heartbeats: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+
+        self.registration: Optional[Listener] = None
+        self.dedicated: Dict[str, Listener] = {}
+        self.scheduler = Scheduler(name="relay-delay")
+
+        for agent_id, agent_commands in (commands or {}).items():
+            for command in agent_commands:
+                self.enqueue(agent_id, command)
+
+    @property
+    def url(self) -> str:
+        """Registration URL to hand to SlotSDK"""
+        return f"ws://{self.host}:{self.registration.port}/ws"
+
+    def start(self) -> "MockRelay":
+        """Open the registration port"""
+        self.registration = Listener(self, self.host, self.port)
+        self.port = self.registration.port
+        self.scheduler.start()
+        log.info("Mock relay listening on %s", self.url)
+        return self
+
+    def stop(self):
+        """Close all listeners and connections"""
+        if self.registration:
+            self.registration.close()
+        for listener in self.dedicated.values():
+            listener.close()
+        self.dedicated.clear()
+        self.scheduler.stop()
+
+    def enqueue(self, agent_id: int, command: Dict[str, Any]) -> str:
+        """Queue a command for an agent; missing fields get defaults. Returns the command_id"""
+        command = dict(command)
+        command.setdefault("command_id", str(uuid.uuid4()))
+        command.setdefault("command_type", "execute")
+        command.setdefault("input_data", {})
+        command.setdefault("timeout", 0)
+        command["agent_id"] = int(agent_id)
+        with self._lock:
+            self.queues[int(agent_id)].append(command)
+        return command["command_id"]
+
+    def queued(self, agent_id: Optional[int] = None) -> int:
+        """Number of commands still queued (for one agent or all)"""
+        with self._lock:
+            if agent_id is not None:
+                return len(self.queues.get(int(agent_id), ()))
+            return sum(len(q) for q in self.queues.values())
+
+    def drop_connections(self):
+        """Simulate a relay blip: close all client connections, keep dedicated ports listening"""
+        if self.registration:
+            self.registration.drop_connections()
+        for listener in self.dedicated.values():
+            listener.drop_connections()
+
+    def close_dedicated(self, slot_id: str):
+        """Simulate losing a slot's dedicated port, forcing the slot to re-register"""
+        listener = self.dedicated.pop(slot_id, None)
+        if listener:
+            listener.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and queue sizes"""
+        return {
+            "messages": dict(self.counters),
+            "agents": len(self.agents),
+            "queued": self.queued(),
+            "results": len(self.results),
+            "dispatched": len(self.dispatched),
+            "status_updates": len(self.status_updates),
+            "heartbeats": len(self.heartbeats),
+            "dedicated_ports": {slot: listener.port for slot, listener in self.dedicated.items()}
+        }
+
+    def _delay(self) -> float:
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        return delay
+
+    def _reply(self, conn: WebSocketConnection, opcode: int, payload: bytes):
+        def send():
+            try:
+                conn.send(opcode, payload)
+            except (OSError, ConnectionClosed):
+                pass
+
+        delay = self._delay()
+        if delay > 0:
+            self.scheduler.call_later(delay, send)
+        else:
+            send()
+
+    def _send_message(self, conn: WebSocketConnection, msg_type: str, message_id: str, payload: Dict[str, Any], agent_id: str = ""):
+        message = {
+            "id": message_id,
+            "type": msg_type,
+            "relay_id": "mock-relay",
+            "agent_id": agent_id,
+            "payload": payload,
+            "timestamp": datetime.now(UTC).isoformat().replace('+00:00', 'Z')
+        }
+        self._reply(conn, OP_TEXT, jsoncodec.dumpb(message))
+
+    def _ack(self, conn: WebSocketConnection, original_id: str, **fields):
+        payload = {"success": True, "original_message_id": original_id}
+        payload.update(fields)
+        self._send_message(conn, "ACK", str(uuid.uuid4()), payload)
+
+    def _serve(self, listener: Listener, conn: WebSocketConnection):
+        try:
+            conn.handshake()
+            while True:
+                opcode, data = conn.recv()
+                if opcode == OP_CLOSE:
+                    break
+                if opcode == OP_PING:
+                    self._reply(conn, OP_PONG, data)
+                    continue
+                if opcode not in (OP_TEXT, OP_BINARY):
+                    continue
+                if self.loss and self.random.random() < self.loss:
+                    self.counters["dropped"] += 1
+                    continue
+                try:
+                    message = jsoncodec.loads(data)
+                except ValueError:
+                    self.counters["invalid"] += 1
+                    continue
+                self._handle(listener, conn, message)
+        except (ConnectionClosed, OSError):
+            pass
+        finally:
+            conn.close()
+            if conn in listener.connections:
+                listener.connections.remove(conn)
+
+    def _handle(self, listener: Listener, conn: WebSocketConnection, message: Dict[str, Any]):
+        msg_type = message.get("type")
+        message_id = message.get("id", "")
+        payload = message.get("payload") or {}
+        self.counters[msg_type] += 1
+
+        if msg_type == "SLOT_REGISTER":
+            slot_id = message.get("agent_id") or payload.get("agent_id") or "slot"
+            with self._lock:
+                dedicated = self.dedicated.get(slot_id)
+                if dedicated is None:
+                    dedicated = Listener(self, self.host, 0, slot_id=slot_id)
+                    self.dedicated[slot_id] = dedicated
+            log.info("Slot %s registered, dedicated port %s", slot_id, dedicated.port)
+            self._ack(conn, message_id, assigned_port=dedicated.port)
+
+        elif msg_type == "SLOT_HEARTBEAT":
+            self.heartbeats.append(payload)
+
+        elif msg_type == "AGENT_REGISTER":
+            with self._lock:
+                agent_id = self.next_agent_id
+                self.next_agent_id += 1
+                self.agents[agent_id] = dict(payload)
+            self._ack(conn, message_id, agent_id=agent_id)
+
+        elif msg_type == "GET_COMMANDS":
+            agent_id = int(payload.get("agent_id") or message.get("agent_id") or 0)
+            count = max(1, int(payload.get("count", 1)))
+            with self._lock:
+                queue = self.queues.get(agent_id)
+                batch = [queue.popleft() for _ in range(min(count, len(queue)))] if queue else []
+                for command in batch:
+                    self.dispatched[command["command_id"]] = command
+            if not batch:
+                reply = {"no_command": True}
+            elif count == 1:
+                reply = batch[0]
+            else:
+                reply = {"commands": batch}
+            self._send_message(conn, "COMMAND", message_id, reply, agent_id=str(agent_id))
+
+        elif msg_type == "RESULT":
+            self.results.append(payload)
+            with self._lock:
+                self.dispatched.pop(payload.get("command_id"), None)
+            if self.ack_results:
+                self._ack(conn, message_id, command_id=payload.get("command_id"))
+
+        elif msg_type == "COMMAND_STATUS_UPDATE":
+            self.status_updates.append(payload)
+            if payload.get("status") == "pending":
+                with self._lock:
+                    command = self.dispatched.pop(payload.get("command_id"), None)
+                    if command:
+                        self.queues[command["agent_id"]].appendleft(command)
+            if self.ack_results:
+                self._ack(conn, message_id, command_id=payload.get("command_id"))
+
+        else:
+            log.warning("Unknown message type from %s: %s", listener.slot_id or "registration port", msg_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TelePAT relay stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081, help="registration port")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every reply")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random delay per reply")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of dropping an inbound message")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--commands", help="JSON file: {agent_id: [command, ...]}")
+    parser.add_argument("--agents", type=int, default=0, help="pre-register queues for agents 1..N")
+    parser.add_argument("--generate", type=int, default=0, help="queue N execute commands per agent")
+    parser.add_argument("--command", default="echo hello", help="shell command used by --generate")
+    parser.add_argument("--no-result-acks", action="store_true", help="do not ACK RESULT messages")
+    args = parser.parse_args()
+
+    commands = {}
+    if args.commands:
+        with open(args.commands, "rb") as f:
+            commands = {int(k): v for k, v in jsoncodec.loads(f.read()).items()}
+
+    relay = MockRelay(
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        loss=args.loss,
+        seed=args.seed,
+        commands=commands,
+        ack_results=not args.no_result_acks
+    )
+    for agent_id in range(1, args.agents + 1):
+        for _ in range(args.generate):
+            relay.enqueue(agent_id, {"command_type": "execute", "input_data": {"command": args.command}})
+    relay.next_agent_id = max(relay.next_agent_id, args.agents + 1)
+    relay.start()
+
+    try:
+        while True:
+            time.sleep(10)
+            log.info("stats: %s", jsoncodec.dumps(relay.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        relay.stop()
+        print(jsoncodec.dumps(relay.stats(), indent=True))
+
+
+if __name__ == "__main__":
+    main()
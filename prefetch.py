@@ -0,0 +1,371 @@
+"""
+TelePAT command prefetcher
+
+Per-agent command queues for server.py, so an agent poll is answered from
+memory instead of a synchronous relay round trip:
+- Commands are fetched from the relay in batches with non-blocking
+  GET_COMMANDS requests; no thread waits on the relay
+- A periodic tick refills the queues of agents that polled recently
+  (within active_window) whenever they drop below the low-water mark;
+  after empty relay answers an agent's background refills back off
+  exponentially (up to MAX_EMPTY_BACKOFF), so idle agents cost no
+  relay traffic beyond their own polls
+- A poll that finds an empty queue returns "no command" immediately if
+  the agent's queue was refilled within refill_interval; only a cold
+  agent (first poll, or idle for longer) waits for the relay
+- Commands not claimed within ttl seconds, and the queues of agents that
+  stopped polling, are handed back to the relay with a "pending" status
+  update so they can be dispatched again; the same happens on shutdown
+- Concurrent polls for the same agent share one in-flight relay request;
+  the batch lands in the queue and each waiter pops its own command, so
+  no command is handed out twice
+- The number of polls blocked on the relay is capped; past the cap poll()
+  raises Overloaded at once instead of tying up another server thread
+- Agents that report free worker slots get their queue filled up to that
+  many commands (if more than batch), so parallel agents stay busy
+- poll_many() hands out up to that many commands in one poll, so an agent
+  drains a backlog in one round trip instead of one poll per command
+
+Prefetching relies on two relay behaviours: a GET_COMMANDS with count > 1
+may be answered with {"commands": [...]}, and a command handed back with
+a "pending" COMMAND_STATUS_UPDATE is queued again for dispatch. Where the
+relay does not re-queue, commands held for an agent that stops polling are
+lost. With background_refill off the prefetcher only asks for what the
+poll at hand can take, so it holds no commands between polls.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scheduler import Scheduler, default_scheduler
+from telelog import get_logger, SAMPLE_100
+
+
+log = get_logger("prefetch")
+
+MAX_EMPTY_BACKOFF = 30.0  # longest gap between background refills of an agent with no commands
+
+
+class Overloaded(Exception):
+    """Too many polls are already waiting for the relay"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"too many concurrent relay waits, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CommandPrefetcher:
+    """
+    Batch-prefetching command queues in front of SlotSDK
+
+    Args:
+        get_sdk: Returns the current SlotSDK (or None while it is starting)
+        batch: Commands requested per relay round trip
+        ttl: Seconds a prefetched command may wait before it is handed back
+        refill_interval: Seconds between refill passes
+        active_window: Agents that have not polled for this long are no
+            longer prefetched for
+        cold_timeout: Max seconds a poll waits for the relay when the
+            agent's queue is cold (default: the SDK's request timeout)
+        empty_ttl: How long an empty relay answer is trusted before a poll
+            asks again (default: refill_interval)
+        background_refill: Top up active agents' queues on each pass; when
+            off, the relay is only asked on demand (default: True)
+        max_waiters: Max polls blocked on the relay at once (default: 64)
+        max_capacity: Upper bound for an agent's reported free slots (default: 32)
+        scheduler: Timer thread for the refill passes (default: default_scheduler())
+    """
+
+    def __init__(self, get_sdk: Callable[[], Any], batch: int = 4, ttl: float = 30.0, refill_interval: float = 1.0,
+                 active_window: float = 30.0, cold_timeout: Optional[float] = None, empty_ttl: Optional[float] = None,
+                 background_refill: bool = True, max_waiters: int = 64, max_capacity: int = 32,
+                 scheduler: Optional[Scheduler] = None):
+        self.get_sdk = get_sdk
+        self.batch = batch
+        self.low_water = max(1, batch // 2)
+        self.ttl = ttl
+        self.refill_interval = refill_interval
+        self.active_window = active_window
+        self.cold_timeout = cold_timeout
+        self.empty_ttl = refill_interval if empty_ttl is None else empty_ttl
+        self.background_refill = background_refill
+        self.max_waiters = max_waiters
+        self.max_capacity = max_capacity
+        self._waiters = threading.BoundedSemaphore(max_waiters)
+        self.scheduler = scheduler or default_scheduler()
+
+        self._lock = threading.Lock()
+        self.queues: Dict[int, deque] = {}  # agent_id -> deque of (fetched_at, command)
+        self.last_poll: Dict[int, float] = {}
+        self.last_refill: Dict[int, float] = {}  # agent_id -> when the last batch arrived
+        self.capacity: Dict[int, int] = {}  # agent_id -> free worker slots reported on the last poll
+        self.empty: Dict[int, int] = {}  # agent_id -> consecutive empty batches
+        self.refilling: Dict[int, threading.Event] = {}  # agent_id -> set when the in-flight batch lands
+        self._unsent: List[Tuple[Any, int, int, threading.Event]] = []  # refills recorded under the lock, sent after it
+        self.stats = {"hits": 0, "misses": 0, "cold": 0, "coalesced": 0, "rejected": 0, "expired": 0, "handed_back": 0}
+        self._timer = None
+
+    def start(self):
+        """Start the periodic refill pass (idempotent)"""
+        if self._timer is None:
+            # Blocking job: hand-backs end in spool appends that may wait for space
+            self._timer = self.scheduler.every(self.refill_interval, self._tick, blocking=True)
+
+    def poll(self, agent_id: int, capacity: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Take the next command for an agent
+
+        Args:
+            agent_id: Polling agent
+            capacity: Free worker slots the agent reported (sizes its queue)
+
+        Returns:
+            Command payload, or None if there is none (or the relay is unreachable)
+
+        Raises:
+            Overloaded: max_waiters polls are already blocked on the relay
+        """
+        commands = self.poll_many(agent_id, 1, capacity)
+        return commands[0] if commands else None
+
+    def poll_many(self, agent_id: int, limit: int, capacity: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Take up to limit commands for an agent
+
+        Args:
+            agent_id: Polling agent
+            limit: Max commands to hand out (capped at max_capacity)
+            capacity: Free worker slots the agent reported (sizes its queue;
+                defaults to limit)
+
+        Returns:
+            Command payloads, oldest first; empty if there are none (or the relay is unreachable)
+
+        Raises:
+            Overloaded: max_waiters polls are already blocked on the relay
+        """
+        self.start()
+        limit = max(1, min(limit, self.max_capacity))
+        if (capacity is None and limit > 1) or not self.background_refill:
+            # On demand, ask the relay for exactly what this poll can take
+            capacity = limit
+        now = time.monotonic()
+        with self._lock:
+            self.last_poll[agent_id] = now
+            if capacity is not None:
+                self.capacity[agent_id] = max(0, min(capacity, self.max_capacity))
+            commands = self._pop_many(agent_id, limit, now)
+            if commands:
+                self.stats["hits"] += 1
+                if self.background_refill and len(self.queues[agent_id]) < self._low_water(agent_id):
+                    self._refill(agent_id)
+            else:
+                # A recent relay answer is trusted, unless a refill is already on its way (then join it)
+                warm = now - self.last_refill.get(agent_id, float("-inf")) < self.empty_ttl
+                if warm and agent_id not in self.refilling:
+                    self.stats["misses"] += 1
+                    return []
+        if commands:
+            self._send_refills()
+            return commands
+
+        with self._lock:
+            commands = self._pop_many(agent_id, limit, time.monotonic())
+            if commands:
+                # Filled while the lock was released
+                self.stats["hits"] += 1
+                return commands
+
+            sdk = self.get_sdk()
+            timeout = self.cold_timeout if self.cold_timeout is not None else (sdk.request_timeout(5) if sdk else 0)
+            if not self._waiters.acquire(blocking=False):
+                self.stats["rejected"] += 1
+                raise Overloaded(max(1, math.ceil(min(timeout, self.refill_interval * 2))))
+            if agent_id in self.refilling:
+                self.stats["coalesced"] += 1
+            else:
+                self.stats["cold"] += 1
+            event = self._refill(agent_id)
+
+        # Cold queue: wait for the batch that is in flight (shared with other pollers of this agent)
+        try:
+            self._send_refills()
+            if event is None or not event.wait(timeout):
+                return []
+        finally:
+            self._waiters.release()
+        with self._lock:
+            commands = self._pop_many(agent_id, limit, time.monotonic())
+            if (commands and self.background_refill
+                    and len(self.queues.get(agent_id, ())) < self._low_water(agent_id)):
+                self._refill(agent_id)
+        self._send_refills()
+        return commands
+
+    def queued(self, agent_id: Optional[int] = None) -> int:
+        """Number of prefetched commands (for one agent or all)"""
+        with self._lock:
+            if agent_id is not None:
+                return len(self.queues.get(agent_id, ()))
+            return sum(len(q) for q in self.queues.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and queue sizes for the stats endpoint"""
+        with self._lock:
+            return {
+                **self.stats,
+                "agents": len(self.queues),
+                "queued": sum(len(q) for q in self.queues.values()),
+                "refilling": len(self.refilling),
+                "max_waiters": self.max_waiters
+            }
+
+    def shutdown(self):
+        """Stop refilling and hand every prefetched command back to the relay"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            leftovers = [command for queue in self.queues.values() for _, command in queue]
+            self.queues.clear()
+        self._hand_back(leftovers)
+
+    def _target(self, agent_id: int) -> int:
+        """Queue size to keep for an agent: batch, or more if it has more free workers (lock held)"""
+        return max(self.batch, self.capacity.get(agent_id, 0))
+
+    def _backing_off(self, agent_id: int, now: float) -> bool:
+        """Whether the agent's last batches were empty too recently for a background refill (lock held)"""
+        empty = self.empty.get(agent_id, 0)
+        if not empty:
+            return False
+        backoff = min(MAX_EMPTY_BACKOFF, self.refill_interval * 2 ** min(empty, 16))
+        return now - self.last_refill.get(agent_id, float("-inf")) < backoff
+
+    def _low_water(self, agent_id: int) -> int:
+        return max(self.low_water, self._target(agent_id) // 2)
+
+    def _pop_many(self, agent_id: int, limit: int, now: float) -> List[Dict[str, Any]]:
+        """Pop up to limit of the oldest unexpired commands (lock held)"""
+        queue = self.queues.get(agent_id)
+        commands, expired = [], []
+        while queue and len(commands) < limit:
+            fetched_at, command = queue.popleft()
+            if now - fetched_at < self.ttl:
+                commands.append(command)
+            else:
+                expired.append(command)
+        if expired:
+            # Expired while queued: hand them back to the relay off the caller's thread
+            self.stats["expired"] += len(expired)
+            self.scheduler.call_later(0, self._hand_back, expired, blocking=True)
+        return commands
+
+    def _refill(self, agent_id: int) -> Optional[threading.Event]:
+        """
+        Record a batch request for an agent unless one is in flight (lock held)
+
+        The request itself is sent by _send_refills() once the lock is
+        released, so no poll waits behind a socket send.
+        """
+        event = self.refilling.get(agent_id)
+        if event is not None:
+            return event
+        sdk = self.get_sdk()
+        if not sdk or not sdk.connected:
+            return None
+
+        event = threading.Event()
+        self.refilling[agent_id] = event
+        want = max(1, self._target(agent_id) - len(self.queues.get(agent_id, ())))
+        self._unsent.append((sdk, agent_id, want, event))
+        return event
+
+    def _send_refills(self):
+        """Send the batch requests recorded by _refill() (lock not held)"""
+        with self._lock:
+            unsent, self._unsent = self._unsent, []
+        for sdk, agent_id, want, event in unsent:
+            try:
+                sdk.request_commands_async(agent_id, want,
+                                           lambda commands, a=agent_id, e=event: self._on_batch(a, e, commands))
+            except Exception as e:
+                log.warning("Prefetch request for agent %s failed: %s", agent_id, e, extra=SAMPLE_100)
+                self._on_batch(agent_id, event, None)
+
+    def _on_batch(self, agent_id: int, event: threading.Event, commands: Optional[List[Dict[str, Any]]]):
+        """SDK callback with a batch (None on timeout)"""
+        now = time.monotonic()
+        with self._lock:
+            if self.refilling.get(agent_id) is event:
+                del self.refilling[agent_id]
+            if commands is not None:
+                self.last_refill[agent_id] = now
+                if commands:
+                    self.empty.pop(agent_id, None)
+                else:
+                    self.empty[agent_id] = self.empty.get(agent_id, 0) + 1
+            if commands:
+                queue = self.queues.setdefault(agent_id, deque())
+                queue.extend((now, command) for command in commands)
+                log.debug("Prefetched %d command(s) for agent %s", len(commands), agent_id)
+        if commands is None:
+            log.warning("Prefetch for agent %s timed out", agent_id, extra=SAMPLE_100)
+        event.set()
+
+    def _tick(self):
+        """Periodic pass: expire stale commands, drop idle agents, top up active ones"""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for agent_id in list(self.last_poll):
+                queue = self.queues.get(agent_id)
+                if now - self.last_poll[agent_id] > self.active_window:
+                    # Agent went quiet: release everything held for it
+                    if queue:
+                        stale.extend(command for _, command in queue)
+                    self.queues.pop(agent_id, None)
+                    self.last_poll.pop(agent_id, None)
+                    self.last_refill.pop(agent_id, None)
+                    self.capacity.pop(agent_id, None)
+                    self.empty.pop(agent_id, None)
+                    continue
+
+                while queue and now - queue[0][0] >= self.ttl:
+                    stale.append(queue.popleft()[1])
+                    self.stats["expired"] += 1
+                if (self.background_refill and len(queue or ()) < self._low_water(agent_id)
+                        and not self._backing_off(agent_id, now)):
+                    self._refill(agent_id)
+
+        self._send_refills()
+        if stale:
+            self._hand_back(stale)
+
+    def _hand_back(self, commands: List[Dict[str, Any]]):
+        """
+        Return unclaimed commands to the relay so they can be dispatched again
+
+        May block (spool appends wait for space), so it runs as a blocking
+        scheduler job or on the caller's thread, never on the timer thread.
+        """
+        if not commands:
+            return
+        sdk = self.get_sdk()
+        handed = 0
+        for command in commands:
+            command_id = command.get("command_id")
+            if not sdk or not command_id:
+                continue
+            try:
+                sdk.send_status_update(command_id, "pending")
+                handed += 1
+            except Exception as e:
+                # Keep handing back the rest; this one stays dispatched as far as the relay knows
+                log.warning("Could not hand command %s back: %s", command_id, e, extra=SAMPLE_100)
+        with self._lock:
+            self.stats["handed_back"] += handed
+        log.info("Handed %d of %d unclaimed command(s) back to the relay", handed, len(commands))
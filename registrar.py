@@ -0,0 +1,179 @@
+"""
+TelePAT registration desk
+
+Turns agent registration in server.py into a ticket flow, so no request
+thread waits for the relay/core round trip:
+- submit() sends AGENT_REGISTER with SlotSDK.register_agent_async() and
+  returns a ticket at once; the ACK completes the ticket in the background
+- Registrations are fingerprinted by their fields (hostname, description,
+  os, arch, domain, version and the agent's optional instance nonce).
+  A registration whose fingerprint matches a ticket that is still pending,
+  or finished successfully within ttl, joins that ticket instead of sending
+  another AGENT_REGISTER, so agent retries cannot create duplicate agents
+- wait() lets a poll block until the ticket is decided (long-poll)
+- Finished tickets are forgotten after ttl seconds
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from scheduler import Scheduler, default_scheduler
+from telelog import get_logger
+
+
+log = get_logger("registrar")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
+FINGERPRINT_FIELDS = ("hostname", "description", "os", "arch", "domain", "version", "instance")
+
+
+class Ticket:
+    """One registration, shared by every request with the same fingerprint"""
+
+    __slots__ = ("ticket", "fingerprint", "status", "agent_id", "error", "created", "finished", "event")
+
+    def __init__(self, fingerprint: str):
+        self.ticket = uuid.uuid4().hex
+        self.fingerprint = fingerprint
+        self.status = PENDING
+        self.agent_id: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created = time.monotonic()
+        self.finished: Optional[float] = None
+        self.event = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"ticket": self.ticket, "status": self.status}
+        if self.agent_id is not None:
+            data["agent_id"] = self.agent_id
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Registrar:
+    """
+    Asynchronous, coalescing agent registration in front of SlotSDK
+
+    Args:
+        get_sdk: Returns the current SlotSDK (or None while it is starting)
+        ttl: Seconds a finished ticket (and its fingerprint) is remembered
+        timeout: Seconds to wait for the relay's ACK (default: the SDK's request timeout)
+        scheduler: Runs the cleanup pass (default: default_scheduler())
+    """
+
+    def __init__(self, get_sdk: Callable[[], Any], ttl: float = 300.0, timeout: Optional[float] = None,
+                 scheduler: Optional[Scheduler] = None):
+        self.get_sdk = get_sdk
+        self.ttl = ttl
+        self.timeout = timeout
+        self.scheduler = scheduler or default_scheduler()
+
+        self._lock = threading.Lock()
+        self.tickets: Dict[str, Ticket] = {}
+        self.by_fingerprint: Dict[str, Ticket] = {}
+        self.stats = {"submitted": 0, "coalesced": 0, "done": 0, "failed": 0, "timeout": 0}
+        self._timer = None
+
+    @staticmethod
+    def fingerprint(data: Dict[str, Any]) -> str:
+        """Stable hash of the identifying registration fields"""
+        key = "\x1f".join(str(data.get(field) or "") for field in FINGERPRINT_FIELDS)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def submit(self, data: Dict[str, Any]) -> Optional[Ticket]:
+        """
+        Start (or join) a registration
+
+        Args:
+            data: Registration fields as posted by the agent
+
+        Returns:
+            The ticket, or None if the relay is not connected
+        """
+        fingerprint = self.fingerprint(data)
+        with self._lock:
+            ticket = self.by_fingerprint.get(fingerprint)
+            if ticket is not None and ticket.status in (PENDING, DONE):
+                self.stats["coalesced"] += 1
+                return ticket
+
+            sdk = self.get_sdk()
+            if not sdk or not sdk.connected:
+                return None
+
+            ticket = Ticket(fingerprint)
+            self.tickets[ticket.ticket] = ticket
+            self.by_fingerprint[fingerprint] = ticket
+            self.stats["submitted"] += 1
+            if self._timer is None:
+                self._timer = self.scheduler.every(min(60.0, self.ttl), self._cleanup)
+
+        sdk.register_agent_async(
+            lambda result: self._complete(ticket, result),
+            description=data.get("description"),
+            hostname=data.get("hostname"),
+            os_name=data.get("os"),
+            arch=data.get("arch"),
+            domain=data.get("domain"),
+            version=data.get("version", "1.0.0"),
+            timeout=self.timeout
+        )
+        return ticket
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        """Look up a ticket (None if unknown or expired)"""
+        with self._lock:
+            return self.tickets.get(ticket_id)
+
+    def wait(self, ticket: Ticket, timeout: float) -> Ticket:
+        """Block up to timeout seconds for a pending ticket to be decided"""
+        if timeout > 0:
+            ticket.event.wait(timeout)
+        return ticket
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and ticket counts for the stats endpoint"""
+        with self._lock:
+            return {
+                **self.stats,
+                "tickets": len(self.tickets),
+                "pending": sum(1 for t in self.tickets.values() if t.status == PENDING)
+            }
+
+    def _complete(self, ticket: Ticket, result: Any):
+        """SDK callback: agent_id (int), {"error": ...} or None on timeout"""
+        with self._lock:
+            if isinstance(result, int):
+                ticket.status, ticket.agent_id = DONE, result
+            elif isinstance(result, dict) and "error" in result:
+                ticket.status, ticket.error = FAILED, str(result["error"])
+            else:
+                ticket.status, ticket.error = TIMEOUT, "Registration timeout - core did not respond"
+            ticket.finished = time.monotonic()
+            self.stats[ticket.status] += 1
+            if ticket.status != DONE and self.by_fingerprint.get(ticket.fingerprint) is ticket:
+                # Let the next attempt start a fresh registration
+                del self.by_fingerprint[ticket.fingerprint]
+        ticket.event.set()
+        if ticket.status == DONE:
+            log.info("Registration %s done: agent_id=%s", ticket.ticket, ticket.agent_id)
+        else:
+            log.warning("Registration %s %s: %s", ticket.ticket, ticket.status, ticket.error)
+
+    def _cleanup(self):
+        """Periodic pass: forget tickets finished more than ttl seconds ago"""
+        now = time.monotonic()
+        with self._lock:
+            for ticket_id, ticket in list(self.tickets.items()):
+                if ticket.finished is not None and now - ticket.finished > self.ttl:
+                    del self.tickets[ticket_id]
+                    if self.by_fingerprint.get(ticket.fingerprint) is ticket:
+                        del self.by_fingerprint[ticket.fingerprint]
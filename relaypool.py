@@ -0,0 +1,295 @@
+"""
+TelePAT relay connection pool
+
+Spreads server.py's relay traffic over several SlotSDK connections, to one
+relay or several:
+- Each connection is a full SlotSDK with its own slot ID, receive thread,
+  outbox, ACK tracking and (optionally) spool directory
+- Agents are mapped to connections with a consistent-hash ring on agent_id
+  (vnodes virtual nodes per connection), so an agent's command requests
+  stay on one connection and adding a connection only moves ~1/K agents
+- Agent registrations are placed on the ring by hostname (or
+  description); the connection that registered an agent keeps its
+  command requests while it is connected, so the relay sees an agent's
+  registration and polls on the same connection. The agent -> connection
+  map is saved to agent_map, so it survives a restart, and agents that
+  have not polled for agent_ttl seconds are dropped from it
+- Results and status updates are placed on the ring by command_id
+- When the owning connection is down, the next connected one clockwise
+  on the ring takes over; traffic returns once it reconnects
+- The pool exposes the SlotSDK methods server.py uses, so it can stand in
+  for a single SlotSDK wherever a get_sdk() callable is expected
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from SlotSDK import SlotSDK
+from spool import Spool
+from telelog import get_logger
+
+
+log = get_logger("relaypool")
+
+
+def ring_hash(key: str) -> int:
+    """64-bit position on the hash ring"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class RelayPool:
+    """
+    K SlotSDK connections behind one SlotSDK-like interface
+
+    Args:
+        relay_urls: Relay registration URLs; connections are assigned to them round-robin
+        slot_id: Base slot ID. A single connection keeps it as is; with more
+            connections, connection i registers as "<slot_id>-<i>"
+        command_handler: Handler for unsolicited COMMAND messages (shared)
+        connections: Number of connections (default: one per URL)
+        vnodes: Virtual nodes per connection on the hash ring
+        spool_dir: Spool directory; with more than one connection each gets
+            its own subdirectory "<spool_dir>/<slot id>"
+        agent_map: JSON file keeping which connection registered each agent
+            (default: None, in memory only)
+        agent_ttl: Seconds an agent may go without polling before it is
+            dropped from the map (default: 7 days)
+        **sdk_kwargs: Passed to every SlotSDK
+    """
+
+    def __init__(self, relay_urls: List[str], slot_id: str, command_handler: Callable[[Dict[str, Any]], None],
+                 connections: Optional[int] = None, vnodes: int = 64, spool_dir: Optional[str] = None,
+                 agent_map: Optional[str] = None, agent_ttl: float = 7 * 86400.0, **sdk_kwargs):
+        if not relay_urls:
+            raise ValueError("at least one relay URL is required")
+        count = max(1, connections or len(relay_urls))
+
+        self.members: List[SlotSDK] = []
+        for i in range(count):
+            member_slot = slot_id if count == 1 else f"{slot_id}-{i}"
+            member_spool = spool_dir if count == 1 or not spool_dir else os.path.join(spool_dir, member_slot)
+            self.members.append(SlotSDK(relay_urls[i % len(relay_urls)], member_slot, command_handler,
+                                        spool_dir=member_spool, **sdk_kwargs))
+
+        points = sorted((ring_hash(f"{member.slot_id}#{v}"), i)
+                        for i, member in enumerate(self.members) for v in range(vnodes))
+        self._ring_keys = [point for point, _ in points]
+        self._ring_owners = [owner for _, owner in points]
+        self._round_robin = itertools.count()
+        self.agent_map = agent_map if count > 1 else None
+        self.agent_ttl = agent_ttl
+        self._by_slot = {member.slot_id: member for member in self.members}
+        self._agents_lock = threading.Lock()
+        self._registered_on: Dict[int, List[Any]] = {}  # agent_id -> [slot ID it registered through, last poll (epoch)]
+        self._agents_dirty = False
+        self._agents_timer = None
+        if self.agent_map:
+            self._load_agents()
+        self._threads: List[threading.Thread] = []
+        self._stopped = threading.Event()
+        self.failovers = 0
+
+    @property
+    def primary(self) -> SlotSDK:
+        return self.members[0]
+
+    @property
+    def connected(self) -> bool:
+        """True while at least one connection is up"""
+        return any(member.connected for member in self.members)
+
+    @property
+    def spool(self) -> Optional[Spool]:
+        """Spool of the first connection; connections are configured alike, so this tells whether spooling is on"""
+        return self.primary.spool
+
+    def owner(self, key: Any) -> SlotSDK:
+        """Connection that owns a key on the ring, ignoring connection state"""
+        index = bisect.bisect(self._ring_keys, ring_hash(str(key))) % len(self._ring_keys)
+        return self.members[self._ring_owners[index]]
+
+    def for_key(self, key: Any) -> SlotSDK:
+        """
+        Connection for a key: its owner on the ring, or the next connected one clockwise
+
+        Falls back to the owner when nothing is connected, so sends land in its outbox.
+        """
+        if len(self.members) == 1:
+            return self.primary
+        start = bisect.bisect(self._ring_keys, ring_hash(str(key)))
+        owner = self.members[self._ring_owners[start % len(self._ring_keys)]]
+        if owner.connected:
+            return owner
+        seen = {id(owner)}
+        for offset in range(1, len(self._ring_keys)):
+            member = self.members[self._ring_owners[(start + offset) % len(self._ring_keys)]]
+            if id(member) in seen:
+                continue
+            if member.connected:
+                self.failovers += 1
+                return member
+            seen.add(id(member))
+            if len(seen) == len(self.members):
+                break
+        return owner
+
+    def for_agent(self, agent_id: int) -> SlotSDK:
+        """Connection for an agent's command requests: the one it registered on while connected, else for_key()"""
+        entry = self._registered_on.get(agent_id)
+        if entry is not None:
+            entry[1] = time.time()
+            self._agents_dirty = True
+            member = self._by_slot.get(entry[0])
+            if member is not None and member.connected:
+                return member
+        return self.for_key(agent_id)
+
+    def request_timeout(self, default: float) -> float:
+        """Largest request timeout among the connected connections"""
+        timeouts = [member.request_timeout(default) for member in self.members if member.connected]
+        return max(timeouts) if timeouts else self.primary.request_timeout(default)
+
+    def request_commands_async(self, agent_id: int, count: int, callback: Callable[[Optional[List[Dict[str, Any]]]], None],
+                               timeout: Optional[float] = None) -> str:
+        return self.for_agent(agent_id).request_commands_async(agent_id, count, callback, timeout)
+
+    def request_command_batch(self, agent_id: int, count: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self.for_agent(agent_id).request_command_batch(agent_id, count, timeout)
+
+    def request_commands(self, agent_id: int, count: int = 1, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return self.for_agent(agent_id).request_commands(agent_id, count, timeout)
+
+    def send_result(self, command_id: str, result: Dict[str, Any],
+                    on_ack: Optional[Callable[[str, bool], None]] = None, durable: bool = False) -> str:
+        return self.for_key(command_id).send_result(command_id, result, on_ack, durable)
+
+    def send_status_update(self, command_id: str, status: str,
+                           on_ack: Optional[Callable[[str, bool], None]] = None,
+                           output: Optional[Dict[str, Any]] = None) -> str:
+        return self.for_key(command_id).send_status_update(command_id, status, on_ack, output)
+
+    def _for_registration(self, hostname: Optional[str], description: Optional[str]) -> SlotSDK:
+        """Connection for an agent registration (the agent has no ID yet, so it is placed by hostname)"""
+        key = hostname or description or next(self._round_robin)
+        return self.for_key(f"register:{key}")
+
+    def _remember(self, member: SlotSDK, result: Any):
+        """Pin a newly registered agent's command requests to the connection that registered it"""
+        if isinstance(result, int) and not isinstance(result, bool):
+            with self._agents_lock:
+                self._registered_on[result] = [member.slot_id, time.time()]
+                self._agents_dirty = True
+            if self.agent_map:
+                # Saved off the receive thread
+                self.primary.scheduler.call_later(0, self._save_agents, blocking=True)
+
+    def register_agent_async(self, callback: Callable[[Any], None], description: str = None, hostname: str = None,
+                             os_name: str = None, arch: str = None, domain: str = None, version: str = "1.0.0",
+                             timeout: Optional[float] = None) -> str:
+        member = self._for_registration(hostname, description)
+
+        def registered(result: Any):
+            self._remember(member, result)
+            callback(result)
+
+        return member.register_agent_async(registered, description=description, hostname=hostname, os_name=os_name,
+                                           arch=arch, domain=domain, version=version, timeout=timeout)
+
+    def send_agent_registration(self, description: str = None, hostname: str = None, os_name: str = None,
+                                arch: str = None, domain: str = None, version: str = "1.0.0",
+                                timeout: Optional[float] = None):
+        member = self._for_registration(hostname, description)
+        result = member.send_agent_registration(description=description, hostname=hostname, os_name=os_name,
+                                                arch=arch, domain=domain, version=version, timeout=timeout)
+        self._remember(member, result)
+        return result
+
+    def _load_agents(self):
+        """Read the agent -> connection map saved by a previous run (connections no longer in the pool are dropped)"""
+        try:
+            with open(self.agent_map, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Could not read agent map %s: %s", self.agent_map, e)
+            return
+        for agent_id, (member_slot, seen) in saved.items():
+            if member_slot in self._by_slot:
+                self._registered_on[int(agent_id)] = [member_slot, float(seen)]
+        log.info("Loaded %d agent(s) from %s", len(self._registered_on), self.agent_map)
+
+    def _save_agents(self):
+        """Drop agents that stopped polling and write the map if it changed (blocking job)"""
+        cutoff = time.time() - self.agent_ttl
+        with self._agents_lock:
+            gone = [agent_id for agent_id, (_, seen) in self._registered_on.items() if seen < cutoff]
+            for agent_id in gone:
+                del self._registered_on[agent_id]
+            if not (self._agents_dirty or gone):
+                return
+            self._agents_dirty = False
+            snapshot = {str(agent_id): list(entry) for agent_id, entry in self._registered_on.items()}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.agent_map)), exist_ok=True)
+            temp = f"{self.agent_map}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(temp, self.agent_map)
+        except OSError as e:
+            log.warning("Could not save agent map %s: %s", self.agent_map, e)
+            with self._agents_lock:
+                self._agents_dirty = True
+
+    def unacked(self) -> int:
+        return sum(member.unacked() for member in self.members)
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Stats of the single connection, or per-connection stats plus totals for a pool"""
+        if len(self.members) == 1:
+            return self.primary.connection_stats()
+        connections = []
+        for member in self.members:
+            stats = member.connection_stats()
+            stats["slot_id"] = member.slot_id
+            stats["relay_url"] = member.registration_url
+            connections.append(stats)
+        return {
+            "connected": sum(1 for stats in connections if stats["connected"]),
+            "pool_size": len(self.members),
+            "failovers": self.failovers,
+            "request_timeout": round(self.request_timeout(5), 3),
+            "outbox": sum(stats["outbox"] for stats in connections),
+            "unacked": sum(stats["unacked"] for stats in connections),
+            "connections": connections
+        }
+
+    def run(self):
+        """Run every connection on its own thread; blocks until stop()"""
+        for member in self.members:
+            thread = threading.Thread(target=member.run, name=f"relay-{member.slot_id}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.agent_map:
+            # Also persists the last-poll times, so agents that are gone age out across restarts
+            self._agents_timer = self.primary.scheduler.every(600, self._save_agents, blocking=True)
+        log.info("Relay pool started: %d connection(s)", len(self.members))
+        # Short waits keep the main thread responsive to Ctrl+C
+        while not self._stopped.wait(1.0):
+            pass
+
+    def stop(self):
+        """Stop every connection"""
+        self._stopped.set()
+        if self._agents_timer:
+            self._agents_timer.cancel()
+            self._agents_dirty = True
+            self._save_agents()
+        for member in self.members:
+            member.stop()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+TelePAT Slot Router
+
+Front router for several server.py slot processes behind one address.
+Agents point SERVER_URL at the router; it forwards their requests to
+the slot that owns them:
+- /commands?agent_id=N goes to the slot the agent registered through
+  (pinned when the registration answer carries its agent_id), so the
+  agent polls the slot that registered it. Agents without a pin (or
+  whose slot is down) go to the slot chosen by rendezvous (highest random
+  weight) hashing of agent_id over the healthy slots; a slot joining or
+  leaving only moves the agents it wins or owned
+- POST /results goes to the slot that handed out the command (remembered
+  from /commands responses), or by rendezvous hash of command_id; chunks
+  of a file result (/results/file/<command_id>) and streamed output
+  (/results/partial) follow the same rule
+- POST /register is hashed by the registration fields, so retries reach
+  the same slot and join its in-flight ticket; the ticket is remembered
+  so GET /register/<ticket> goes back to that slot
+- Slots join and leave with POST/DELETE /router/slots (server.py does
+  this itself when ROUTER_URL is set) or are listed in ROUTER_SLOTS.
+  Membership changes need the X-Router-Token header matching ROUTER_TOKEN;
+  without a ROUTER_TOKEN they are only accepted from localhost
+- Every slot's /healthz is checked periodically; failing slots are left
+  out of the hash until they recover. A request that cannot reach its
+  slot is retried on the next-ranked one
+- Bodies pass through as they are in both directions: compressed
+  requests reach the slot still compressed, and the slot compresses its
+  response for the agent's Accept-Encoding, so the router only decodes
+  what it has to inspect
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import requests  # type: ignore
+import urllib3
+from flask import Flask, Response, request, jsonify
+
+import jsoncodec
+import keepalive
+from compression import init_compression, decompress, BodyTooLarge
+from scheduler import default_scheduler
+from telelog import get_logger, SAMPLE_100
+
+
+# Configuration
+ROUTER_PORT = int(os.getenv("ROUTER_PORT", "44390"))
+ROUTER_SLOTS = os.getenv("ROUTER_SLOTS", "")  # "slot-a=http://127.0.0.1:44399,slot-b=http://127.0.0.1:44400"
+HEALTH_INTERVAL = float(os.getenv("ROUTER_HEALTH_INTERVAL", "2"))  # seconds between /healthz checks
+HEALTH_FAILURES = int(os.getenv("ROUTER_HEALTH_FAILURES", "2"))  # failed checks before a slot is left out
+UPSTREAM_TIMEOUT = float(os.getenv("ROUTER_UPSTREAM_TIMEOUT", "30"))  # seconds, covers /register long-polls
+UPSTREAM_POOL = int(os.getenv("ROUTER_UPSTREAM_POOL", "64"))  # keep-alive connections per slot
+AFFINITY_LIMIT = int(os.getenv("ROUTER_AFFINITY_LIMIT", "100000"))  # remembered command_id/ticket -> slot entries
+ROUTER_TOKEN = os.getenv("ROUTER_TOKEN", "")  # shared secret for slot join/leave (empty = localhost only)
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+# Headers passed on to the slot and back to the agent
+REQUEST_HEADERS = ("Content-Type", "Content-Encoding", "Accept-Encoding")
+RESPONSE_HEADERS = ("Content-Type", "Content-Encoding", "Vary", "Retry-After", "Location")
+
+app = Flask(__name__)
+jsoncodec.init_app(app)
+init_compression(app, decompress_requests=False)
+log = get_logger("router")
+
+
+def rendezvous_score(slot: str, key: str) -> int:
+    """Weight of a slot for a key; the highest-scoring healthy slot owns the key"""
+    return int.from_bytes(hashlib.blake2b(f"{slot}\x1f{key}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class Slot:
+    """One server.py backend"""
+
+    __slots__ = ("name", "url", "healthy", "failures", "session", "checked", "info")
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.healthy = False  # until the first health check passes
+        self.failures = 0
+        self.session = requests.Session()  # keep-alive connections to the slot
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=UPSTREAM_POOL))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=UPSTREAM_POOL))
+        self.checked: Optional[float] = None
+        self.info: Dict[str, Any] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "url": self.url, "healthy": self.healthy, "failures": self.failures, "health": self.info}
+
+
+class SlotTable:
+    """
+    Slot membership, health and key -> slot affinity
+
+    Args:
+        health_failures: Failed health checks (or proxy errors) before a slot is left out
+        affinity_limit: Max remembered command_id/ticket -> slot entries, and max agent pins
+            (least recently used dropped first)
+    """
+
+    def __init__(self, health_failures: int = 2, affinity_limit: int = 100000):
+        self.health_failures = health_failures
+        self.affinity_limit = affinity_limit
+        self._lock = threading.Lock()
+        self.slots: Dict[str, Slot] = {}
+        self.affinity: "OrderedDict[str, str]" = OrderedDict()  # "command:<id>" / "ticket:<id>" -> slot name
+        self.pins: "OrderedDict[int, str]" = OrderedDict()  # agent_id -> slot it registered through, by last poll
+        self.stats = {"forwarded": 0, "retried": 0, "unavailable": 0, "joined": 0, "left": 0}
+
+    def join(self, name: str, url: str) -> bool:
+        """Add or update a slot; returns True if it is new"""
+        with self._lock:
+            slot = self.slots.get(name)
+            if slot is not None and slot.url == url.rstrip("/"):
+                return False
+            slot = self.slots[name] = Slot(name, url)
+            self.stats["joined"] += 1
+        log.info("Slot %s joined at %s", name, url)
+        # Probe right away instead of waiting for the next health pass
+        default_scheduler().call_later(0, self.probe, slot, blocking=True)
+        return True
+
+    def leave(self, name: str) -> bool:
+        with self._lock:
+            slot = self.slots.pop(name, None)
+            if slot is None:
+                return False
+            self.stats["left"] += 1
+        slot.session.close()
+        log.info("Slot %s left", name)
+        return True
+
+    def ranked(self, key: str) -> List[Slot]:
+        """Healthy slots in rendezvous order for a key (owner first)"""
+        with self._lock:
+            healthy = [slot for slot in self.slots.values() if slot.healthy]
+        return sorted(healthy, key=lambda slot: rendezvous_score(slot.name, key), reverse=True)
+
+    def remember(self, key: str, slot: Slot):
+        with self._lock:
+            self.affinity[key] = slot.name
+            self.affinity.move_to_end(key)
+            while len(self.affinity) > self.affinity_limit:
+                self.affinity.popitem(last=False)
+
+    def pin(self, agent_id: int, slot: Slot):
+        """Keep an agent's polls on the slot that registered it"""
+        with self._lock:
+            self.pins[agent_id] = slot.name
+            self.pins.move_to_end(agent_id)
+            while len(self.pins) > self.affinity_limit:
+                self.pins.popitem(last=False)
+
+    def pinned(self, agent_id: int) -> Optional[Slot]:
+        """Slot an agent is pinned to, if it is still a healthy member (refreshes the pin)"""
+        with self._lock:
+            if agent_id not in self.pins:
+                return None
+            self.pins.move_to_end(agent_id)
+            slot = self.slots.get(self.pins[agent_id])
+            return slot if slot is not None and slot.healthy else None
+
+    def count(self, name: str):
+        """Bump a router counter"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def recall(self, key: str) -> Optional[Slot]:
+        """Slot remembered for a key, if it is still a healthy member"""
+        with self._lock:
+            slot = self.slots.get(self.affinity.get(key, ""))
+            return slot if slot is not None and slot.healthy else None
+
+    def mark(self, slot: Slot, ok: bool, info: Optional[Dict[str, Any]] = None):
+        """Record a health check or proxy outcome"""
+        with self._lock:
+            slot.checked = time.monotonic()
+            if info is not None:
+                slot.info = info
+            if ok:
+                if not slot.healthy:
+                    log.info("Slot %s is healthy", slot.name)
+                slot.failures = 0
+                slot.healthy = True
+                return
+            slot.failures += 1
+            if slot.healthy and slot.failures >= self.health_failures:
+                slot.healthy = False
+                log.warning("Slot %s marked unhealthy after %d failure(s)", slot.name, slot.failures)
+
+    def check_health(self):
+        """Scheduler job: probe every slot's /healthz"""
+        with self._lock:
+            slots = list(self.slots.values())
+        for slot in slots:
+            self.probe(slot)
+
+    def probe(self, slot: Slot):
+        """Check one slot's /healthz"""
+        try:
+            response = slot.session.get(f"{slot.url}/healthz", timeout=min(5.0, HEALTH_INTERVAL * 2))
+            info = jsoncodec.loads(response.content) if response.content else {}
+            self.mark(slot, response.status_code == 200, info if isinstance(info, dict) else {})
+        except (requests.exceptions.RequestException, jsoncodec.DecodeError) as e:
+            log.debug("Health check of %s failed: %s", slot.name, e)
+            self.mark(slot, False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "slots": [slot.to_dict() for slot in self.slots.values()],
+                "affinity": len(self.affinity),
+                "pinned_agents": len(self.pins)
+            }
+
+
+table = SlotTable(health_failures=HEALTH_FAILURES, affinity_limit=AFFINITY_LIMIT)
+
+
+class Upstream(NamedTuple):
+    """A slot's answer, body still encoded as the slot sent it"""
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        """Decoded JSON body (None if it is not JSON)"""
+        try:
+            return jsoncodec.loads(decompress(self.body, self.headers.get("Content-Encoding", "")))
+        except (ValueError, BodyTooLarge):
+            return None
+
+
+def request_json() -> Dict[str, Any]:
+    """JSON body of the current request, decoded for inspection only (it is forwarded as received)"""
+    try:
+        data = jsoncodec.loads(decompress(request.get_data(), request.headers.get("Content-Encoding", "")))
+    except (ValueError, BodyTooLarge):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def forward(candidates: List[Slot], path: str) -> Tuple[Optional[Slot], Optional[Upstream]]:
+    """
+    Send the current request to the first reachable candidate
+
+    Returns:
+        (slot, upstream response), or (None, None) if no candidate answered
+    """
+    headers = {name: request.headers[name] for name in REQUEST_HEADERS if name in request.headers}
+    # Without this requests would ask for gzip and the body would be compressed twice
+    headers.setdefault("Accept-Encoding", "identity")
+    body = request.get_data() if request.method in ("POST", "PUT") else None
+    for slot in candidates:
+        try:
+            response = slot.session.request(request.method, f"{slot.url}{path}", params=request.args,
+                                            data=body, headers=headers, timeout=UPSTREAM_TIMEOUT, stream=True)
+            # Raw bytes: a compressed answer is passed on without decoding it
+            content = response.raw.read(decode_content=False)
+            response.raw.release_conn()
+            upstream = Upstream(response.status_code, {name: response.headers[name] for name in RESPONSE_HEADERS
+                                                       if name in response.headers}, content)
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            # urllib3 errors come from reading the raw body (slot died mid-answer)
+            log.warning("Slot %s unreachable for %s: %s", slot.name, path, e, extra=SAMPLE_100)
+            table.mark(slot, False)
+            table.count("retried")
+            continue
+        table.count("forwarded")
+        return slot, upstream
+    table.count("unavailable")
+    return None, None
+
+
+def relay_response(upstream: Optional[Upstream]) -> Response:
+    """Turn an upstream response into the router's response"""
+    if upstream is None:
+        response = jsonify({"error": "No slot available, retry later"})
+        response.headers["Retry-After"] = "2"
+        response.status_code = 503
+        return response
+    return Response(upstream.body, status=upstream.status, headers=upstream.headers)
+
+
+def with_affinity(key: Optional[str], hash_key: str) -> List[Slot]:
+    """The remembered slot for key (if any) followed by the rendezvous order for hash_key"""
+    ranked = table.ranked(hash_key)
+    remembered = table.recall(key) if key else None
+    if remembered is None:
+        return ranked
+    return [remembered] + [slot for slot in ranked if slot is not remembered]
+
+
+@app.route('/commands', methods=['GET'])
+def route_commands():
+    """Forward an agent poll to the agent's slot and remember which slot handed out each command"""
+    agent_id = request.args.get('agent_id', type=int)
+    if not agent_id:
+        return jsonify({"error": "agent_id required"}), 400
+
+    ranked = table.ranked(f"agent:{agent_id}")
+    pinned = table.pinned(agent_id)
+    if pinned is not None:
+        ranked = [pinned] + [slot for slot in ranked if slot is not pinned]
+    slot, upstream = forward(ranked, "/commands")
+    if slot is not None and upstream.status == 200:
+        data = upstream.json()
+        if isinstance(data, dict):
+            for command in data.get("commands") or [data]:
+                if isinstance(command, dict) and command.get("command_id"):
+                    table.remember(f"command:{command['command_id']}", slot)
+    return relay_response(upstream)
+
+
+@app.route('/results', methods=['POST'])
+def route_results():
+    """Forward a result to the slot that dispatched its command"""
+    command_id = request_json().get('command_id')
+    if not command_id:
+        return jsonify({"error": "command_id required"}), 400
+
+    _, upstream = forward(with_affinity(f"command:{command_id}", f"command:{command_id}"), "/results")
+    return relay_response(upstream)
+
+
+@app.route('/results/partial', methods=['POST'])
+def route_partial_results():
+    """Forward a chunk of streamed output to the slot that dispatched its command"""
+    command_id = request_json().get('command_id')
+    if not command_id:
+        return jsonify({"error": "command_id required"}), 400
+
+    _, upstream = forward(with_affinity(f"command:{command_id}", f"command:{command_id}"), "/results/partial")
+    return relay_response(upstream)
+
+
+@app.route('/results/file/<command_id>', methods=['GET', 'PUT'])
+def route_file_chunk(command_id: str):
+    """Forward a file upload chunk (or its resume query) to the slot that dispatched the command"""
+    key = f"command:{command_id}"
+    slot, upstream = forward(with_affinity(key, key), f"/results/file/{command_id}")
+    if slot is not None and upstream.status < 500:
+        # Keep the chunks of one file on one slot, even if it was not the one that dispatched it
+        table.remember(key, slot)
+    return relay_response(upstream)
+
+
+@app.route('/register', methods=['POST'])
+def route_register():
+    """Forward a registration; identical registrations go to the same slot"""
+    data = request_json()
+    fingerprint = "\x1f".join(str(data.get(field) or "") for field in ("hostname", "description", "instance"))
+
+    slot, upstream = forward(table.ranked(f"register:{fingerprint}"), "/register")
+    if slot is not None and upstream.status in (200, 202):
+        answer = upstream.json() or {}
+        if answer.get("ticket"):
+            table.remember(f"ticket:{answer['ticket']}", slot)
+        pin_registered(answer, slot)
+    return relay_response(upstream)
+
+
+def pin_registered(answer: Dict[str, Any], slot: Slot):
+    """Pin the agent of a finished registration answer to the slot that registered it"""
+    agent_id = answer.get("agent_id")
+    if isinstance(agent_id, int) and not isinstance(agent_id, bool):
+        table.pin(agent_id, slot)
+
+
+@app.route('/register/<ticket>', methods=['GET'])
+def route_register_ticket(ticket: str):
+    """Forward a ticket poll to the slot that issued the ticket"""
+    slot = table.recall(f"ticket:{ticket}")
+    if slot is None:
+        return jsonify({"success": False, "error": "Unknown registration ticket"}), 404
+    _, upstream = forward([slot], f"/register/{ticket}")
+    if upstream is not None and upstream.status == 200:
+        pin_registered(upstream.json() or {}, slot)
+    return relay_response(upstream)
+
+
+@app.route('/router/slots', methods=['GET'])
+def list_slots():
+    """Slots with their health and the router counters"""
+    return jsonify(table.snapshot())
+
+
+def membership_denied() -> Optional[Response]:
+    """403 unless the request may change slot membership (ROUTER_TOKEN, or localhost when unset)"""
+    if ROUTER_TOKEN:
+        allowed = hmac.compare_digest(request.headers.get("X-Router-Token", ""), ROUTER_TOKEN)
+    else:
+        allowed = request.remote_addr in LOCAL_ADDRESSES
+    if allowed:
+        return None
+    log.warning("Refused slot membership change from %s", request.remote_addr, extra=SAMPLE_100)
+    response = jsonify({"error": "Slot membership changes need a valid X-Router-Token"})
+    response.status_code = 403
+    return response
+
+
+@app.route('/router/slots', methods=['POST'])
+def join_slot():
+    """
+    Add a slot (or update its URL)
+
+    JSON body:
+        name: Slot ID
+        url: Base URL of the slot's server.py, e.g. http://127.0.0.1:44399
+    """
+    denied = membership_denied()
+    if denied:
+        return denied
+    data = request_json()
+    name, url = data.get('name'), data.get('url')
+    if not name or not url:
+        return jsonify({"error": "name and url required"}), 400
+    created = table.join(name, url)
+    return jsonify({"success": True, "name": name, "created": created}), 201 if created else 200
+
+
+@app.route('/router/slots/<name>', methods=['DELETE'])
+def leave_slot(name: str):
+    """Remove a slot; its agents move to the remaining slots"""
+    denied = membership_denied()
+    if denied:
+        return denied
+    if not table.leave(name):
+        return jsonify({"error": "Unknown slot"}), 404
+    return jsonify({"success": True, "name": name})
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Router health: 200 while at least one slot is healthy"""
+    healthy = sum(1 for slot in table.snapshot()["slots"] if slot["healthy"])
+    return jsonify({"status": "ok" if healthy else "degraded", "healthy_slots": healthy}), 200 if healthy else 503
+
+
+def main():
+    """Main entry point"""
+    for entry in filter(None, (part.strip() for part in ROUTER_SLOTS.split(","))):
+        name, _, url = entry.partition("=")
+        table.join(name, url)
+    default_scheduler().every(HEALTH_INTERVAL, table.check_health, blocking=True)
+
+    print("=" * 40)
+    print("  TelePAT Slot Router")
+    print("=" * 40)
+    print()
+    print(f"HTTP Port:  {ROUTER_PORT}")
+    print(f"Slots:      {', '.join(table.slots) or '(none yet)'}")
+    print()
+
+    keepalive.serve(app, '0.0.0.0', ROUTER_PORT)
+
+
+if __name__ == "__main__":
+    main()
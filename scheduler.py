@@ -0,0 +1,232 @@
+"""
+TelePAT scheduler
+
+A single timer thread for everything that used to sleep in its own loop:
+heartbeats, request expiry, reconnect backoff and periodic bridge jobs.
+- Deadlines use the monotonic clock and live in a heap
+- The thread sleeps exactly until the earliest deadline (or until a new,
+  earlier one is scheduled), so an idle process does not wake up at all
+- Callbacks must be quick; jobs that block (HTTP calls, relay requests)
+  are scheduled with blocking=True and run on worker threads. Periodic
+  blocking jobs get one worker each (they never overlap themselves), so
+  they keep their cadence however long other jobs block; one-off blocking
+  jobs share blocking_workers workers. Threads are started only when a
+  job finds no idle one
+"""
+
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from telelog import get_logger
+
+
+log = get_logger("scheduler")
+
+BLOCKING_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))  # spare workers for one-off blocking jobs
+
+
+class Timer:
+    """Handle for a scheduled call; cancel() stops it (including future repeats)"""
+
+    __slots__ = ("deadline", "fn", "args", "interval", "blocking", "cancelled")
+
+    def __init__(self, deadline: float, fn: Callable, args: tuple, interval: Optional[float], blocking: bool):
+        self.deadline = deadline
+        self.fn = fn
+        self.args = args
+        self.interval = interval
+        self.blocking = blocking
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the call; a blocking job already running finishes but is not repeated"""
+        self.cancelled = True
+
+
+class _WorkerPool:
+    """Worker threads started on demand, up to a limit that may change"""
+
+    def __init__(self, name: str, limit: Callable[[], int]):
+        self.name = name
+        self.limit = limit
+        self._jobs: queue.Queue = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job: Callable[[], None]):
+        with self._lock:
+            self._jobs.put(job)
+            # Start a worker unless an idle one will take it (at the limit the job waits its turn)
+            if self._jobs.qsize() > self._idle and len(self._workers) < self.limit():
+                worker = threading.Thread(target=self._run, name=f"{self.name}-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+
+    def stop(self):
+        with self._lock:
+            for _ in self._workers:
+                self._jobs.put(None)
+            self._workers = []
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            job = self._jobs.get()
+            with self._lock:
+                self._idle -= 1
+            if job is None:
+                return
+            job()
+
+
+class Scheduler:
+    """
+    Heap-based timer thread
+
+    call_later()/call_at() run a function once, every() runs it
+    periodically. Non-blocking periodic jobs keep a fixed rate; blocking
+    ones are re-armed only after they finish, so they never overlap.
+    """
+
+    def __init__(self, name: str = "telepat-scheduler", blocking_workers: int = BLOCKING_WORKERS):
+        self.name = name
+        self.blocking_workers = blocking_workers
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Blocking jobs: one worker per periodic job, blocking_workers for the one-off ones
+        self._periodic = 0  # periodic blocking jobs that are not cancelled
+        self._periodic_lock = threading.Lock()
+        self._periodic_pool = _WorkerPool(f"{name}-every", lambda: self._periodic)
+        self._oneoff_pool = _WorkerPool(f"{name}-job", lambda: self.blocking_workers)
+
+    def start(self):
+        """Start the timer thread (idempotent)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the timer thread; pending calls are discarded"""
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._cond.notify()
+        self._periodic_pool.stop()
+        self._oneoff_pool.stop()
+        with self._periodic_lock:
+            self._periodic = 0
+
+    def call_at(self, deadline: float, fn: Callable, *args: Any, blocking: bool = False) -> Timer:
+        """Run fn(*args) once at the given time.monotonic() deadline"""
+        return self._push(Timer(deadline, fn, args, None, blocking))
+
+    def call_later(self, delay: float, fn: Callable, *args: Any, blocking: bool = False) -> Timer:
+        """Run fn(*args) once after delay seconds"""
+        return self._push(Timer(time.monotonic() + delay, fn, args, None, blocking))
+
+    def every(self, interval: float, fn: Callable, *args: Any, blocking: bool = False,
+              first_delay: Optional[float] = None) -> Timer:
+        """Run fn(*args) every interval seconds, first after first_delay (default: interval)"""
+        delay = interval if first_delay is None else first_delay
+        if blocking:
+            with self._periodic_lock:
+                self._periodic += 1
+        return self._push(Timer(time.monotonic() + delay, fn, args, interval, blocking))
+
+    def pending(self) -> int:
+        """Number of scheduled (not yet due) calls, cancelled ones included until they expire"""
+        with self._cond:
+            return len(self._heap)
+
+    def _push(self, timer: Timer) -> Timer:
+        with self._cond:
+            heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer))
+            # Only wake the thread if this is now the earliest deadline
+            if self._heap[0][2] is timer:
+                self._cond.notify()
+        if self._thread is None:
+            self.start()
+        return timer
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+                _, _, timer = heapq.heappop(self._heap)
+
+            if timer.cancelled:
+                if timer.blocking and timer.interval is not None:
+                    self._release_periodic()
+                continue
+            if timer.blocking:
+                self._submit_blocking(timer)
+            else:
+                self._call(timer)
+                if timer.interval is not None and not timer.cancelled:
+                    # Fixed rate, but never schedule into the past after a stall
+                    timer.deadline = max(timer.deadline + timer.interval, time.monotonic())
+                    self._push(timer)
+
+    def _call(self, timer: Timer):
+        try:
+            timer.fn(*timer.args)
+        except Exception as e:
+            log.exception("Scheduled call %s failed: %s", getattr(timer.fn, "__name__", timer.fn), e)
+
+    def _submit_blocking(self, timer: Timer):
+        if not self._running:
+            return
+
+        def job():
+            self._call(timer)
+            if timer.interval is None:
+                return
+            if not timer.cancelled and self._running:
+                timer.deadline = time.monotonic() + timer.interval
+                self._push(timer)
+            else:
+                self._release_periodic()
+
+        (self._oneoff_pool if timer.interval is None else self._periodic_pool).submit(job)
+
+    def _release_periodic(self):
+        """A periodic blocking job was cancelled: its worker is no longer reserved"""
+        with self._periodic_lock:
+            self._periodic = max(0, self._periodic - 1)
+
+
+_default: Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> Scheduler:
+    """Return the process-wide scheduler shared by SlotSDK instances and bridges"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Scheduler()
+            _default.start()
+        return _default
@@ -4,27 +4,114 @@ TelePAT Agent Server
 
 Simple HTTP bridge between agents and relay.
 Agents poll for commands and push results.
-Server communicates with relay using SlotSDK (WebSocket).
+Server communicates with relay using SlotSDK (WebSocket), over one or
+several connections (RELAY_CONNECTIONS, RELAY_URLS).
 """
 
+import base64
+import logging
 import os
+import socket
 import threading
 from datetime import datetime, UTC
 from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
-
-from SlotSDK import SlotSDK
+import requests  # type: ignore
+from flask import Flask, request, jsonify, send_file
+
+import jsoncodec
+import keepalive
+from compression import init_compression
+from relaypool import RelayPool
+from spool import SpoolFull
+from forwarder import ResultForwarder
+from prefetch import CommandPrefetcher, Overloaded
+from registrar import Registrar, PENDING, DONE, FAILED
+from scheduler import default_scheduler
+from telelog import get_logger, ring_buffer, SAMPLE_100
+from transfers import TransferStore, OffsetMismatch
 
 
 # Configuration
-SERVER_PORT = 44399
+SERVER_PORT = int(os.getenv("SERVER_PORT", "44399"))
 RELAY_URL = os.getenv("RELAY_URL", "ws://192.168.230.133:8081/ws")
 SLOT_ID = os.getenv("SLOT_ID", "py-slot")
 
+# Relay connections: agents are spread over them by consistent hashing on agent_id
+RELAY_URLS = [url.strip() for url in os.getenv("RELAY_URLS", RELAY_URL).split(",") if url.strip()]
+RELAY_CONNECTIONS = int(os.getenv("RELAY_CONNECTIONS", str(len(RELAY_URLS))))
+# Which relay connection registered each agent, kept across restarts (used with several connections)
+RELAY_AGENT_MAP = os.getenv("RELAY_AGENT_MAP", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state",
+                                                            f"{SLOT_ID}-agents.json"))
+RELAY_AGENT_TTL = float(os.getenv("RELAY_AGENT_TTL", str(7 * 86400)))  # seconds without a poll before an agent is dropped
+
+# Per-agent command prefetching. 0 (default) asks the relay on demand for what each poll can take.
+# Above 0, commands are held for agents and handed back with a "pending" status update when
+# unclaimed; only enable it against a relay that re-queues such commands (see prefetch.py)
+PREFETCH_BATCH = int(os.getenv("PREFETCH_BATCH", "0"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "30"))  # seconds before an unclaimed command is handed back
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "1.0"))  # seconds between refill passes
+PREFETCH_ACTIVE_WINDOW = float(os.getenv("PREFETCH_ACTIVE_WINDOW", "30"))  # stop prefetching for idle agents
+RELAY_MAX_WAITERS = int(os.getenv("RELAY_MAX_WAITERS", "64"))  # polls blocked on the relay before 429
+POLL_RETRY_AFTER = int(os.getenv("POLL_RETRY_AFTER", "5"))  # seconds agents wait while the relay is down
+POLL_MAX_COMMANDS = int(os.getenv("POLL_MAX_COMMANDS", "32"))  # cap for ?max= (and for reported free slots)
+
+# Result forwarding: /results answers 202 and results go to the relay in the background
+RESULT_QUEUE_LIMIT = int(os.getenv("RESULT_QUEUE_LIMIT", "10000"))  # queued results
+RESULT_QUEUE_MB = int(os.getenv("RESULT_QUEUE_MB", "256"))  # queued payload size
+RESULT_BATCH = int(os.getenv("RESULT_BATCH", "50"))  # results handed to the SDK per pass
+RESULT_WINDOW = int(os.getenv("RESULT_WINDOW", "200"))  # results (and status updates) awaiting a relay ACK
+RESULT_ACK_TIMEOUT = float(os.getenv("RESULT_ACK_TIMEOUT", "10"))  # seconds before re-sending, 0 = no ACK tracking
+
+# On-disk spool for results and status updates until the relay ACKs them (empty = memory only)
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", SLOT_ID))
+SPOOL_MAX_MB = int(os.getenv("SPOOL_MAX_MB", "1024"))
+
+# Asynchronous registration: /register answers 202 with a ticket
+REGISTER_MAX_WAIT = float(os.getenv("REGISTER_MAX_WAIT", "20"))  # cap for ?wait= long-polls
+REGISTER_TICKET_TTL = float(os.getenv("REGISTER_TICKET_TTL", "300"))  # seconds finished tickets are kept
+
+# Chunked file uploads from agents (PUT /results/file/<command_id>)
+TRANSFER_DIR = os.getenv("TRANSFER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "transfers", SLOT_ID))
+TRANSFER_MAX_GB = float(os.getenv("TRANSFER_MAX_GB", "16"))  # largest file accepted
+TRANSFER_TTL = float(os.getenv("TRANSFER_TTL", "3600"))  # seconds a staged file is kept after its last write
+# Larger files are sent to the relay as a signed file_url instead of being read into memory
+FILE_INLINE_MAX_MB = float(os.getenv("FILE_INLINE_MAX_MB", "8"))
+TRANSFER_URL_SECRET = os.getenv("TRANSFER_URL_SECRET", "")  # signs file_url tokens (empty = random per process)
+
+# Front router (router.py): when set, this slot joins it on startup and leaves on shutdown
+ROUTER_URL = os.getenv("ROUTER_URL", "")
+SLOT_URL = os.getenv("SLOT_URL", f"http://{socket.gethostname()}:{SERVER_PORT}")  # how the router reaches this slot
+ROUTER_JOIN_INTERVAL = float(os.getenv("ROUTER_JOIN_INTERVAL", "30"))  # re-join so a restarted router relearns us
+ROUTER_TOKEN = os.getenv("ROUTER_TOKEN", "")  # shared secret the router requires for join/leave
+
 app = Flask(__name__)
+jsoncodec.init_app(app)
+init_compression(app)
+log = get_logger("server")
 
 # Global variables
-sdk: Optional[SlotSDK] = None
+sdk: Optional[RelayPool] = None
+prefetcher = CommandPrefetcher(
+    lambda: sdk,
+    batch=max(1, PREFETCH_BATCH),
+    ttl=PREFETCH_TTL,
+    refill_interval=PREFETCH_INTERVAL,
+    active_window=PREFETCH_ACTIVE_WINDOW,
+    empty_ttl=None if PREFETCH_BATCH > 0 else 0,
+    background_refill=PREFETCH_BATCH > 0,
+    max_waiters=RELAY_MAX_WAITERS,
+    max_capacity=POLL_MAX_COMMANDS
+)
+forwarder = ResultForwarder(
+    lambda: sdk,
+    batch=RESULT_BATCH,
+    window=RESULT_WINDOW,
+    max_queued=RESULT_QUEUE_LIMIT,
+    max_bytes=RESULT_QUEUE_MB * 1024 * 1024
+)
+registrar = Registrar(lambda: sdk, ttl=REGISTER_TICKET_TTL)
+transfers = TransferStore(TRANSFER_DIR, max_bytes=int(TRANSFER_MAX_GB * 1024 ** 3), ttl=TRANSFER_TTL,
+                          secret=TRANSFER_URL_SECRET.encode() or None)
 
 
 def handle_relay_command(msg: Dict[str, Any]):
@@ -40,26 +127,43 @@ def handle_relay_command(msg: Dict[str, Any]):
         command_id = payload.get("command_id")
 
         # Log warning - in pull-based mode, commands should only arrive as responses
-        print(f"Warning: Received unsolicited COMMAND (not pull-based): agent_id={agent_id}, command_id={command_id}")
-        print(f"This should not happen in pull-based mode. Message: {msg}")
+        log.warning("Received unsolicited COMMAND (not pull-based): agent_id=%s command_id=%s", agent_id, command_id)
+        log.debug("Unsolicited message: %r", msg)
 
     except Exception as e:
-        print(f"Error handling command: {e}")
+        log.exception("Error handling command: %s", e)
 
 
 @app.route('/commands', methods=['GET'])
 def get_commands():
     """
-    Agent polls for pending commands - forwards request to relay (pull-based)
+    Agent polls for pending commands
+
+    Served from the agent's prefetch queue, which is refilled from the relay
+    in batches in the background (pull-based). With PREFETCH_BATCH=0 the
+    relay is asked on demand. Concurrent polls for one agent share a single
+    relay request, and past RELAY_MAX_WAITERS blocked polls the server
+    answers 429 with Retry-After instead of holding another thread.
 
     Query params:
         agent_id: The agent identifier (integer)
+        free: Free worker slots on the agent (optional); the agent's
+            prefetch queue is kept at least this full
+        max: Max commands to return (optional, up to POLL_MAX_COMMANDS);
+            switches the answer to the list form
 
     Returns:
-        Command payload or {"no_command": true}
+        Command payload or {"no_command": true}; with max,
+        {"commands": [...]} (plus "no_command": true when empty). The
+        answer carries next_poll_ms=0 when more commands are already queued
+        for the agent and it still has free slots after this answer (per
+        free), so it polls again at once; 429/503 answers carry
+        Retry-After.
     """
     agent_id = request.args.get('agent_id', type=int)
-    print(f"[/commands] Agent {agent_id} polling for commands")
+    free = request.args.get('free', type=int)
+    limit = request.args.get('max', type=int)
+    log.debug("/commands poll from agent %s", agent_id)
 
     if not agent_id:
         return jsonify({"error": "agent_id required"}), 400
@@ -67,26 +171,35 @@ def get_commands():
     try:
         # Check if SDK is connected
         if not sdk or not sdk.connected:
-            print(f"[/commands] SDK not connected to relay")
-            return jsonify({"error": "Not connected to relay"}), 503
-
-        # Request command from relay synchronously (waits for response)
-        print(f"[/commands] Requesting commands from relay for agent {agent_id}")
-        command = sdk.request_commands(agent_id, count=1, timeout=5)
-
-        print(f"[/commands] Relay response: {command}")
-
-        if command is None:
+            log.warning("/commands: SDK not connected to relay", extra=SAMPLE_100)
+            response = jsonify({"error": "Not connected to relay"})
+            response.headers["Retry-After"] = str(POLL_RETRY_AFTER)
+            return response, 503
+
+        try:
+            commands = prefetcher.poll_many(agent_id, limit or 1, capacity=free)
+        except Overloaded as e:
+            log.warning("/commands: %s", e, extra=SAMPLE_100)
+            response = jsonify({"error": "Too many pending relay requests", "retry_after": e.retry_after})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, 429
+
+        if not commands:
             # Timeout or no commands available
-            print(f"[/commands] No commands available, returning no_command")
-            return jsonify({"no_command": True})
-
-        # Return command to agent
-        print(f"[/commands] Returning command to agent: {command}")
-        return jsonify(command)
+            log.debug("/commands: no command for agent %s", agent_id)
+            return jsonify({"commands": [], "no_command": True} if limit else {"no_command": True})
+
+        # Return commands to agent
+        log.debug("/commands: dispatching %d command(s) to agent %s: %s", len(commands), agent_id,
+                  ", ".join(str(command.get("command_id")) for command in commands))
+        data = {"commands": commands} if limit else dict(commands[0])
+        idle_slots = (free if free is not None else 1) - len(commands)
+        if idle_slots > 0 and prefetcher.queued(agent_id):
+            data["next_poll_ms"] = 0
+        return jsonify(data)
 
     except Exception as e:
-        print(f"[/commands] Error in get_commands: {e}")
+        log.exception("Error in get_commands: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -100,6 +213,20 @@ def post_results():
         (other result fields: stdout, stderr, exit_code, etc.)
 
     Note: agent_id not required - relay knows from command_id
+
+    A file result with file_transfer "chunked" (file uploaded through
+    /results/file/<command_id> first) is verified against file_size and
+    file_hash, then forwarded with the file inline (file_data) up to
+    FILE_INLINE_MAX_MB, or with a file_url the file can be fetched from
+    (carrying the command's download token).
+
+    The result is queued locally and forwarded to the relay in the
+    background, so the answer does not depend on relay health. With a
+    spool it is written (and fsynced) to disk before the 202, so it also
+    survives a restart.
+
+    Returns:
+        202 once queued, 503 with Retry-After if the queue or spool is full
     """
     try:
         result = request.get_json()
@@ -110,16 +237,180 @@ def post_results():
         if not command_id:
             return jsonify({"error": "command_id required"}), 400
 
-        # Send result to relay (relay will lookup agent from command_id)
-        if sdk and sdk.connected:
-            sdk.send_result(command_id, result)
-            print(f"Result forwarded to relay: {command_id}")
-            return jsonify({"success": True})
+        if result.get('file_transfer') == "chunked":
+            result = _attach_file(result)
+
+        # Queue for the relay (relay will lookup agent from command_id); with a spool it is on disk before the 202
+        if forwarder.accept(result, durable=bool(sdk and sdk.spool)):
+            log.debug("Result queued for relay: %s", command_id)
+            return jsonify({"success": True, "queued": True}), 202
         else:
+            log.warning("Result queue full, rejecting result %s", command_id, extra=SAMPLE_100)
+            response = jsonify({"error": "Result queue full, retry later"})
+            response.headers["Retry-After"] = "5"
+            return response, 503
+
+    except Exception as e:
+        log.exception("Error in post_results: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+def _attach_file(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a chunked file result into one the relay understands (a failed result if the file is incomplete)"""
+    command_id = result['command_id']
+    try:
+        if not transfers.valid(command_id):
+            raise ValueError("command_id cannot be used for a file transfer")
+        path = transfers.finish(command_id, int(result.get('file_size', -1)), str(result.get('file_hash', '')))
+    except (TypeError, ValueError) as e:
+        log.warning("File transfer for %s failed: %s", command_id, e)
+        error = f"File transfer incomplete: {e}"
+        return {"command_id": command_id, "stdout": "", "stderr": error, "exit_code": 1,
+                "duration": result.get('duration', 0), "error": error}
+
+    result = {key: value for key, value in result.items() if key != 'file_transfer'}
+    if os.path.getsize(path) <= FILE_INLINE_MAX_MB * 1024 * 1024:
+        with open(path, 'rb') as f:
+            result['file_data'] = base64.b64encode(f.read()).decode('ascii')
+    else:
+        result['file_url'] = f"{SLOT_URL}/results/file/{command_id}/data?token={transfers.token(command_id)}"
+    return result
+
+
+@app.route('/results/file/<command_id>', methods=['GET'])
+def get_file_offset(command_id: str):
+    """
+    Resume point of a chunked file upload
+
+    Returns:
+        {"command_id": ..., "offset": bytes received so far}
+    """
+    if not transfers.valid(command_id):
+        return jsonify({"error": "Invalid command_id"}), 400
+    return jsonify({"command_id": command_id, "offset": transfers.offset(command_id)})
+
+
+@app.route('/results/file/<command_id>', methods=['PUT'])
+def put_file_chunk(command_id: str):
+    """
+    Agent uploads the next chunk of a file result
+
+    Query params:
+        offset: Position of the chunk; must equal the bytes received so far
+
+    Body: the raw chunk (application/octet-stream), written to disk as it
+    is read. The result itself is posted to /results afterwards.
+
+    Returns:
+        200 with the new offset, 409 with the current offset if the chunk
+        does not continue the file, 413 past TRANSFER_MAX_GB
+    """
+    if not transfers.valid(command_id):
+        return jsonify({"error": "Invalid command_id"}), 400
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({"error": "offset required"}), 400
+
+    try:
+        new_offset = transfers.append(command_id, offset, request.stream, request.content_length)
+    except OffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
+    log.debug("File chunk for %s stored, offset %s", command_id, new_offset)
+    return jsonify({"command_id": command_id, "offset": new_offset})
+
+
+@app.route('/results/file/<command_id>/data', methods=['GET'])
+def get_file_data(command_id: str):
+    """
+    Download a finished file result (supports Range requests)
+
+    Query params:
+        token: The command's download token, as put in its file_url
+
+    Returns:
+        The file, 403 for a wrong token, 404 for an unknown file
+    """
+    if not transfers.valid(command_id):
+        return jsonify({"error": "Unknown file"}), 404
+    if not transfers.check_token(command_id, request.args.get('token', '')):
+        return jsonify({"error": "Invalid token"}), 403
+    if not os.path.exists(transfers.file_path(command_id)):
+        return jsonify({"error": "Unknown file"}), 404
+    return send_file(transfers.file_path(command_id), mimetype="application/octet-stream", conditional=True)
+
+
+def _wait_param() -> float:
+    """Long-poll time from ?wait=, capped at REGISTER_MAX_WAIT"""
+    try:
+        return max(0.0, min(float(request.args.get('wait', 0)), REGISTER_MAX_WAIT))
+    except ValueError:
+        return 0.0
+
+
+def _ticket_response(ticket):
+    """HTTP answer for a registration ticket in its current state"""
+    body = ticket.to_dict()
+    if ticket.status == DONE:
+        body.update(success=True, message=f"Agent registered successfully with ID {ticket.agent_id}")
+        return jsonify(body), 200
+    if ticket.status == PENDING:
+        body.update(success=True, poll=f"/register/{ticket.ticket}")
+        response = jsonify(body)
+        response.headers["Location"] = body["poll"]
+        response.headers["Retry-After"] = "1"
+        return response, 202
+    body["success"] = False
+    return jsonify(body), 400 if ticket.status == FAILED else 504
+
+
+@app.route('/results/partial', methods=['POST'])
+def post_partial_result():
+    """
+    Agent streams output of a command that is still running
+
+    JSON body:
+        command_id: The running command
+        seq: Chunk sequence number, starting at 1
+        stdout, stderr: Output produced since the previous chunk
+        dropped: Output the agent dropped since the previous chunk because
+            the server fell behind (optional)
+
+    The chunk is forwarded to the relay as a "running" status update
+    carrying the output. Chunks are best effort: the final /results post
+    still holds the complete output.
+
+    Returns:
+        202 once handed to the SDK
+    """
+    try:
+        chunk = request.get_json()
+        if not chunk:
+            return jsonify({"error": "JSON body required"}), 400
+
+        command_id = chunk.get('command_id')
+        seq = chunk.get('seq')
+        if not command_id or not isinstance(seq, int):
+            return jsonify({"error": "command_id and integer seq required"}), 400
+
+        if not sdk:
             return jsonify({"error": "Not connected to relay"}), 503
 
+        output = {"seq": seq, "stdout": chunk.get('stdout', ''), "stderr": chunk.get('stderr', '')}
+        if chunk.get('dropped'):
+            output["dropped"] = chunk['dropped']
+        try:
+            sdk.send_status_update(command_id, "running", output=output)
+        except SpoolFull:
+            response = jsonify({"error": "Result spool full, retry later"})
+            response.headers["Retry-After"] = "5"
+            return response, 503
+        log.debug("Partial output %s#%s forwarded", command_id, seq)
+        return jsonify({"success": True, "seq": seq}), 202
+
     except Exception as e:
-        print(f"Error in post_results: {e}")
+        log.exception("Error in post_partial_result: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -135,82 +426,175 @@ def register_agent():
         arch: Architecture
         domain: Domain/environment (e.g., "production", "dev")
         version: Agent version
+        instance: Per-process nonce, keeps identical agents apart
+
+    Query params:
+        wait: Seconds to wait for the agent_id before answering 202 (default 0)
+
+    Identical registrations (same fields) that are in flight, or completed
+    recently, share one ticket and one agent_id.
 
     Returns:
-        success: Boolean
-        message: Status message
-        Note: Core assigns agent_id. Agent should poll API to discover it.
+        200 with agent_id if the registration is already complete,
+        202 with a ticket to poll at GET /register/<ticket> otherwise
     """
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "JSON body required"}), 400
 
-        # All fields are optional
-        description = data.get('description')
-        hostname = data.get('hostname')
-        os_name = data.get('os')
-        arch = data.get('arch')
-        domain = data.get('domain')
-        version = data.get('version', '1.0.0')
-
-        # Send registration to relay (relay will forward to core)
-        if sdk and sdk.connected:
-            # Wait for ACK response with agent_id (timeout after 10 seconds)
-            result = sdk.send_agent_registration(description, hostname, os_name, arch, domain, version, timeout=10)
-
-            if isinstance(result, int):
-                # Success - got agent_id
-                print(f"Agent registered successfully: agent_id={result}")
-                return jsonify({
-                    "success": True,
-                    "agent_id": result,
-                    "message": f"Agent registered successfully with ID {result}"
-                })
-            elif isinstance(result, dict) and "error" in result:
-                # Error from core
-                print(f"Agent registration failed: {result['error']}")
-                return jsonify({
-                    "success": False,
-                    "error": result['error']
-                }), 400
-            else:
-                # Timeout or unexpected response
-                print("Agent registration timeout - no response from core")
-                return jsonify({
-                    "success": False,
-                    "error": "Registration timeout - core did not respond"
-                }), 504
-        else:
+        # Send registration to relay (relay will forward to core); the ACK completes the ticket
+        ticket = registrar.submit(data)
+        if ticket is None:
             # SDK not connected yet
-            print(f"Warning: Agent registration received but SDK not connected yet")
+            log.warning("Agent registration received but SDK not connected yet")
             return jsonify({
                 "success": False,
                 "message": "Slot server connecting to relay, please retry in a moment"
             }), 503
 
+        return _ticket_response(registrar.wait(ticket, _wait_param()))
+
     except Exception as e:
-        print(f"Error in register_agent: {e}")
+        log.exception("Error in register_agent: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/register/<ticket_id>', methods=['GET'])
+def registration_status(ticket_id: str):
+    """
+    Poll a registration ticket
+
+    Query params:
+        wait: Seconds to long-poll while the ticket is pending (capped by REGISTER_MAX_WAIT)
+
+    Returns:
+        200 with agent_id, 202 while pending, 400 if core rejected the
+        registration, 504 on timeout, 404 for an unknown or expired ticket
+    """
+    ticket = registrar.get(ticket_id)
+    if ticket is None:
+        return jsonify({"success": False, "error": "Unknown registration ticket"}), 404
+    return _ticket_response(registrar.wait(ticket, _wait_param()))
+
+
+@app.route('/relay/stats', methods=['GET'])
+def relay_stats():
+    """
+    Keepalive statistics of the relay connection
+
+    Returns:
+        RTT moving average, variance and histogram for the current and
+        previous connection, the request timeout currently in use,
+        prefetch queue counters, the result forwarding backlog,
+        registration ticket counters and file transfer counters
+    """
+    if not sdk:
+        return jsonify({"error": "SDK not started"}), 503
+    stats = sdk.connection_stats()
+    stats["prefetch"] = prefetcher.snapshot()
+    stats["results"] = forwarder.snapshot()
+    stats["registrations"] = registrar.snapshot()
+    stats["transfers"] = transfers.snapshot()
+    return jsonify(stats)
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Health check for router.py and load balancers
+
+    Returns:
+        200 while at least one relay connection is up, 503 otherwise
+    """
+    connected = bool(sdk and sdk.connected)
+    body = {
+        "status": "ok" if connected else "relay_disconnected",
+        "slot_id": SLOT_ID,
+        "relay_connected": connected,
+        "prefetched": prefetcher.queued(),
+        "result_backlog": forwarder.backlog()
+    }
+    return jsonify(body), 200 if connected else 503
+
+
+@app.route('/debug/logs', methods=['GET'])
+def debug_logs():
+    """
+    Dump the in-memory log ring buffer (enabled with TELEPAT_LOG_RING=<records>)
+
+    Query params:
+        limit: Only return the newest N records
+        level: Minimum level name (e.g. WARNING)
+
+    Returns:
+        records: Buffered log records, oldest first
+    """
+    ring = ring_buffer()
+    if ring is None:
+        return jsonify({"error": "Log ring buffer disabled (set TELEPAT_LOG_RING)"}), 404
+
+    limit = request.args.get('limit', type=int)
+    level = logging.getLevelName(request.args.get('level', 'NOTSET').upper())
+    records = ring.dump(limit=limit, min_level=level if isinstance(level, int) else logging.NOTSET)
+    return jsonify({"total": len(records), "records": records})
+
+
 def run_flask():
     """Run Flask HTTP server"""
-    print(f"Starting HTTP server on port {SERVER_PORT}...")
-    app.run(host='0.0.0.0', port=SERVER_PORT, debug=False, use_reloader=False)
+    log.info("Starting HTTP server on port %s...", SERVER_PORT)
+    keepalive.serve(app, '0.0.0.0', SERVER_PORT)
+
+
+def _router_headers() -> Dict[str, str]:
+    return {"X-Router-Token": ROUTER_TOKEN} if ROUTER_TOKEN else {}
+
+
+def join_router():
+    """Announce this slot to the front router (scheduler job, repeated while running)"""
+    try:
+        response = requests.post(f"{ROUTER_URL}/router/slots", json={"name": SLOT_ID, "url": SLOT_URL},
+                                 headers=_router_headers(), timeout=5)
+        if response.status_code == 201:
+            log.info("Joined router %s as %s (%s)", ROUTER_URL, SLOT_ID, SLOT_URL)
+        elif response.status_code != 200:
+            log.warning("Router %s refused join: %s", ROUTER_URL, response.status_code)
+    except requests.exceptions.RequestException as e:
+        log.warning("Could not reach router %s: %s", ROUTER_URL, e, extra=SAMPLE_100)
+
+
+def leave_router():
+    """Remove this slot from the front router so its agents move elsewhere"""
+    try:
+        requests.delete(f"{ROUTER_URL}/router/slots/{SLOT_ID}", headers=_router_headers(), timeout=5)
+        log.info("Left router %s", ROUTER_URL)
+    except requests.exceptions.RequestException as e:
+        log.warning("Could not leave router %s: %s", ROUTER_URL, e)
 
 
 def run_sdk():
-    """Run SlotSDK to connect to relay"""
+    """Run the relay connection pool (one SlotSDK per connection)"""
     global sdk
 
-    print(f"Connecting to relay at {RELAY_URL}...")
-    sdk = SlotSDK(RELAY_URL, SLOT_ID, handle_relay_command)
+    log.info("Connecting to relay at %s (%d connection(s))...", ", ".join(RELAY_URLS), RELAY_CONNECTIONS)
+    sdk = RelayPool(
+        RELAY_URLS,
+        SLOT_ID,
+        handle_relay_command,
+        connections=RELAY_CONNECTIONS,
+        ack_timeout=RESULT_ACK_TIMEOUT,
+        spool_dir=SPOOL_DIR or None,
+        spool_max_bytes=SPOOL_MAX_MB * 1024 * 1024,
+        send_window=RESULT_WINDOW,
+        agent_map=RELAY_AGENT_MAP or None,
+        agent_ttl=RELAY_AGENT_TTL
+    )
 
     try:
         sdk.run()
     except KeyboardInterrupt:
-        print("\nShutting down SDK...")
+        log.info("Shutting down SDK...")
+        prefetcher.shutdown()
         sdk.stop()
 
 
@@ -221,8 +605,11 @@ def main():
     print("=" * 40)
     print()
     print(f"HTTP Port:  {SERVER_PORT}")
-    print(f"Relay URL:  {RELAY_URL}")
+    print(f"Relay URL:  {', '.join(RELAY_URLS)}")
+    print(f"Connections: {RELAY_CONNECTIONS}")
     print(f"Slot ID:   {SLOT_ID}")
+    if ROUTER_URL:
+        print(f"Router:    {ROUTER_URL} (as {SLOT_URL})")
     print()
 
     # Start Flask in separate thread
@@ -233,12 +620,20 @@ def main():
     import time
     time.sleep(2)
 
+    router_timer = None
+    if ROUTER_URL:
+        router_timer = default_scheduler().every(ROUTER_JOIN_INTERVAL, join_router, blocking=True, first_delay=0)
+
     # Run SDK in main thread (handles Ctrl+C)
     try:
         run_sdk()
     except KeyboardInterrupt:
         print("\nServer stopped by user")
     finally:
+        if router_timer:
+            router_timer.cancel()
+            leave_router()
+        prefetcher.shutdown()
         if sdk:
             sdk.stop()
 
@@ -247,9 +642,9 @@ def main():
         if os.path.exists(pid_file):
             try:
                 os.remove(pid_file)
-                print(f"Removed PID file: {pid_file}")
+                log.info("Removed PID file: %s", pid_file)
             except Exception as e:
-                print(f"Warning: Could not remove PID file: {e}")
+                log.warning("Could not remove PID file: %s", e)
 
 
 if __name__ == "__main__":
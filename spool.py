@@ -0,0 +1,332 @@
+"""
+TelePAT message spool
+
+Append-only, segmented on-disk log of outbound messages that must reach
+the relay (RESULT, COMMAND_STATUS_UPDATE), used by SlotSDK:
+- append() writes a DATA record to the active segment; ack() writes an
+  ACK record for it. Both are plain appends, no record is rewritten
+- fsync is batched: the first unsynced write arms one fsync after
+  sync_interval (or runs it at once when sync_batch records are waiting),
+  and append(durable=True) waits for the fsync that covers its record.
+  The batched fsyncs run on the spool's own thread, so durable appends
+  never wait behind other blocking jobs
+- Segments roll over at segment_bytes; the oldest segments are deleted
+  as soon as every DATA record in them is acknowledged. Deleting strictly
+  oldest-first keeps each ACK record alive as long as the DATA it refers to
+- Only the location (segment, offset) of each unacknowledged message is
+  kept in memory; read() loads its payload back from disk for a re-send,
+  so memory does not grow with the spool
+- pending() returns the IDs of the unacknowledged messages in append
+  order, for replay after a restart
+- The total size is bounded by max_bytes: append() waits up to
+  block_timeout for acknowledgements to free space, then raises SpoolFull
+
+Record layout: <u32 body length><u32 crc32(body)><u8 kind> body, where the
+body is <u8 id length><id><payload>. A torn record at the end of a segment
+(crash during write) is truncated away when the spool is opened.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+from telelog import get_logger, SAMPLE_100
+
+
+log = get_logger("spool")
+
+HEADER = struct.Struct("<IIB")
+KIND_DATA = 1
+KIND_ACK = 2
+
+
+class SpoolFull(Exception):
+    """The spool reached max_bytes and no space was freed in time"""
+
+
+class Segment:
+    """One segment file and the IDs of its unacknowledged DATA records"""
+
+    __slots__ = ("number", "path", "size", "live")
+
+    def __init__(self, number: int, path: str, size: int = 0):
+        self.number = number
+        self.path = path
+        self.size = size
+        self.live: Set[str] = set()
+
+
+class Spool:
+    """
+    Durable outbound message log
+
+    Args:
+        directory: Where segment files are kept (created if missing)
+        segment_bytes: Size at which the active segment is rolled over
+        max_bytes: Upper bound for all segments together
+        sync_interval: Max seconds a write waits for its batched fsync
+        sync_batch: Unsynced records that trigger an fsync right away
+        block_timeout: Seconds append() waits for space before SpoolFull
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, max_bytes: int = 1024 * 1024 * 1024,
+                 sync_interval: float = 0.01, sync_batch: int = 256, block_timeout: float = 5.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self.block_timeout = block_timeout
+
+        self._cond = threading.Condition()
+        self.segments: List[Segment] = []
+        self.index: Dict[str, Tuple[Segment, int]] = {}  # unacknowledged message_id -> (segment, record offset)
+        self.total_bytes = 0
+        self._fd: Optional[int] = None
+        self._written = 0  # records written
+        self._synced = 0  # records covered by an fsync
+        self._sync_scheduled = False
+        self._closed = False
+        self.stats = {"appended": 0, "acked": 0, "syncs": 0, "segments_deleted": 0, "full": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._pending = self._load()
+        self._open_active()
+        self._syncer = threading.Thread(target=self._sync_loop, name=f"spool-sync-{os.path.basename(directory)}",
+                                        daemon=True)
+        self._syncer.start()
+
+    def pending(self) -> List[str]:
+        """IDs of the unacknowledged messages found on disk at startup, oldest first"""
+        pending, self._pending = self._pending, []
+        with self._cond:
+            return [message_id for message_id in pending if message_id in self.index]
+
+    def read(self, message_id: str) -> Optional[bytes]:
+        """Payload of an unacknowledged message, read back from its segment (None once acknowledged)"""
+        with self._cond:
+            location = self.index.get(message_id)
+        if location is None:
+            return None
+        segment, offset = location
+        try:
+            with open(segment.path, "rb") as f:
+                f.seek(offset)
+                header = f.read(HEADER.size)
+                length, crc, _ = HEADER.unpack(header)
+                body = f.read(length)
+        except (OSError, struct.error) as e:
+            # Acknowledged and compacted away meanwhile
+            log.debug("Could not read spooled message %s: %s", message_id, e)
+            return None
+        if len(body) < length or zlib.crc32(body) != crc:
+            log.warning("Spooled message %s is corrupt at %s:%d", message_id, segment.path, offset, extra=SAMPLE_100)
+            return None
+        return body[1 + body[0]:]
+
+    def append(self, message_id: str, payload: bytes, durable: bool = False):
+        """
+        Add a message to the spool
+
+        Args:
+            message_id: Unique message ID (appending a known ID is a no-op)
+            payload: Encoded message
+            durable: Wait until the record is fsynced
+
+        Raises:
+            SpoolFull: No room within block_timeout, or the spool is closed
+        """
+        record = self._encode(KIND_DATA, message_id, payload)
+        deadline = time.monotonic() + self.block_timeout
+        with self._cond:
+            if self._closed:
+                raise SpoolFull("spool is closed")
+            if message_id in self.index:
+                return
+            while self.total_bytes + len(record) > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    self.stats["full"] += 1
+                    log.warning("Spool full (%d bytes), rejecting message %s", self.total_bytes, message_id, extra=SAMPLE_100)
+                    raise SpoolFull(f"spool holds {self.total_bytes} of {self.max_bytes} bytes")
+                self._cond.wait(remaining)
+
+            segment, offset = self._write(record)
+            segment.live.add(message_id)
+            self.index[message_id] = (segment, offset)
+            self.stats["appended"] += 1
+            target = self._written
+            self._request_sync()
+
+            if durable:
+                while self._synced < target and not self._closed:
+                    self._cond.wait(1.0)
+
+    def ack(self, message_id: str):
+        """Mark a message as delivered; fully acknowledged old segments are deleted"""
+        with self._cond:
+            location = self.index.pop(message_id, None)
+            if location is None:
+                return
+            location[0].live.discard(message_id)
+            if self._closed:
+                # Not recorded on disk: the message is replayed once more after a restart
+                return
+            self._write(self._encode(KIND_ACK, message_id, b""))
+            self.stats["acked"] += 1
+            self._request_sync()
+            self._compact()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters and sizes for stats endpoints"""
+        with self._cond:
+            return {
+                **self.stats,
+                "pending": len(self.index),
+                "segments": len(self.segments),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def sync(self):
+        """fsync the active segment now"""
+        with self._cond:
+            self._sync_locked()
+
+    def close(self):
+        """Flush and close the active segment"""
+        with self._cond:
+            if self._closed:
+                return
+            self._sync_locked()
+            os.close(self._fd)
+            self._fd = None
+            self._closed = True
+            self._cond.notify_all()
+
+    @staticmethod
+    def _encode(kind: int, message_id: str, payload: bytes) -> bytes:
+        raw_id = message_id.encode("utf-8")
+        body = bytes((len(raw_id),)) + raw_id + payload
+        return HEADER.pack(len(body), zlib.crc32(body), kind) + body
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:08d}.log")
+
+    def _load(self) -> List[str]:
+        """Read existing segments and rebuild the index; returns the unacknowledged IDs"""
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(".log"))
+        for name in names:
+            number = int(name[len("segment-"):-len(".log")])
+            segment = Segment(number, os.path.join(self.directory, name))
+            with open(segment.path, "rb") as f:
+                content = f.read()
+
+            offset = 0
+            while offset + HEADER.size <= len(content):
+                length, crc, kind = HEADER.unpack_from(content, offset)
+                body = content[offset + HEADER.size:offset + HEADER.size + length]
+                if len(body) < length or zlib.crc32(body) != crc:
+                    break
+                message_id = body[1:1 + body[0]].decode("utf-8")
+                if kind == KIND_DATA:
+                    segment.live.add(message_id)
+                    self.index[message_id] = (segment, offset)
+                elif kind == KIND_ACK:
+                    owner = self.index.pop(message_id, None)
+                    if owner:
+                        owner[0].live.discard(message_id)
+                offset += HEADER.size + length
+
+            if offset < len(content):
+                log.warning("Truncating torn record at %s:%d", segment.path, offset)
+                with open(segment.path, "r+b") as f:
+                    f.truncate(offset)
+            segment.size = offset
+            self.total_bytes += offset
+            self.segments.append(segment)
+
+        pending = list(self.index)
+        if pending:
+            log.info("Spool %s holds %d unacknowledged message(s)", self.directory, len(pending))
+        with self._cond:
+            self._compact()
+        return pending
+
+    def _open_active(self):
+        if not self.segments or self.segments[-1].size >= self.segment_bytes:
+            number = self.segments[-1].number + 1 if self.segments else 1
+            self.segments.append(Segment(number, self._segment_path(number)))
+        self._fd = os.open(self.segments[-1].path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+
+    def _write(self, record: bytes) -> Tuple[Segment, int]:
+        """Append a record to the active segment, rolling it over when full; returns where it went (lock held)"""
+        active = self.segments[-1]
+        if active.size >= self.segment_bytes:
+            self._sync_locked()
+            os.close(self._fd)
+            self._open_active()
+            active = self.segments[-1]
+        offset = active.size
+        os.write(self._fd, record)
+        active.size += len(record)
+        self.total_bytes += len(record)
+        self._written += 1
+        return active, offset
+
+    def _request_sync(self):
+        """Batch fsyncs: one is scheduled per sync_interval, or run now for a full batch (lock held)"""
+        if self._written - self._synced >= self.sync_batch:
+            self._sync_locked()
+        elif not self._sync_scheduled:
+            self._sync_scheduled = True
+            self._cond.notify_all()
+
+    def _sync_loop(self):
+        """Sync thread: run the armed fsync sync_interval after the first unsynced write"""
+        with self._cond:
+            while not self._closed:
+                if not self._sync_scheduled:
+                    self._cond.wait()
+                    continue
+                deadline = time.monotonic() + self.sync_interval
+                while self._sync_scheduled and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._sync_locked()
+                        break
+                    self._cond.wait(remaining)
+
+    def _sync_locked(self):
+        self._sync_scheduled = False
+        if self._fd is None or self._synced >= self._written:
+            return
+        os.fsync(self._fd)
+        self._synced = self._written
+        self.stats["syncs"] += 1
+        self._cond.notify_all()
+
+    def _compact(self):
+        """Delete fully acknowledged segments, oldest first (lock held)"""
+        freed = False
+        while self.segments and not self.segments[0].live:
+            if len(self.segments) == 1:
+                # Everything is acknowledged: start the active segment over once it is large
+                if self._fd is None or self.segments[0].size < self.segment_bytes // 4:
+                    break
+                self._sync_locked()
+                os.close(self._fd)
+                oldest = self.segments.pop(0)
+                self.segments.append(Segment(oldest.number + 1, self._segment_path(oldest.number + 1)))
+                self._fd = os.open(self.segments[-1].path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            else:
+                oldest = self.segments.pop(0)
+            os.remove(oldest.path)
+            self.total_bytes -= oldest.size
+            self.stats["segments_deleted"] += 1
+            freed = True
+        if freed:
+            self._cond.notify_all()
@@ -0,0 +1,188 @@
+"""
+TelePAT logging helpers
+
+Thin layer over the standard logging module shared by SlotSDK, server.py
+and agent.py:
+- get_logger(component) returns the "telepat.<component>" logger
+- Levels are configured per component from the environment
+- Hot-path events use lazy %-style formatting and can be sampled
+- An optional in-memory ring buffer keeps the latest records for dumping
+
+Environment:
+    TELEPAT_LOG_LEVEL:  Default level for all components (default: INFO)
+    TELEPAT_LOG_LEVELS: Per-component overrides, e.g. "sdk=DEBUG,server=WARNING"
+    TELEPAT_LOG_FORMAT: "text" (default) or "json" (one JSON object per line)
+    TELEPAT_LOG_RING:   Number of records kept in the ring buffer (default: 0 = off)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+ROOT_LOGGER = "telepat"
+
+# Pass as extra= to let only the first and then every Nth occurrence of a message through
+SAMPLE_10 = {"sample_every": 10}
+SAMPLE_100 = {"sample_every": 100}
+SAMPLE_1000 = {"sample_every": 1000}
+
+_configured = False
+_configure_lock = threading.Lock()
+_ring: Optional["RingBufferHandler"] = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drop repeated high-frequency records
+
+    Records logged with extra={"sample_every": N} pass for the 1st, (N+1)th,
+    (2N+1)th... occurrence of the same message template. Passing records get
+    a "sampled" attribute with the number of occurrences they stand for.
+    Records without sample_every are never filtered.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.counts: Dict[Any, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = getattr(record, "sample_every", None)
+        if not every or every <= 1:
+            return True
+
+        key = (record.name, record.msg)
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        if count % every:
+            return False
+        record.sampled = every if count else 1
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """HH:MM:SS.mmm LEVEL [component] message"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s.%(msecs)03d %(levelname)s [%(component)s] %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.component = record.name.rpartition(".")[2]
+        text = super().format(record)
+        sampled = getattr(record, "sampled", 1)
+        if sampled > 1:
+            text += f" (1 of {sampled})"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record_to_dict(record), default=str)
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keep the most recent records in memory
+
+    Records are stored as-is and only rendered when dump() is called, so
+    the cost on the logging path is a deque append.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+    def dump(self, limit: Optional[int] = None, min_level: int = logging.NOTSET) -> List[Dict[str, Any]]:
+        """Return buffered records (oldest first) as dicts"""
+        records = [r for r in list(self.records) if r.levelno >= min_level]
+        if limit:
+            records = records[-limit:]
+        return [record_to_dict(r) for r in records]
+
+
+def record_to_dict(record: logging.LogRecord) -> Dict[str, Any]:
+    """Render a log record as a plain dict"""
+    data = {
+        "ts": round(record.created, 3),
+        "time": time.strftime("%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+        "level": record.levelname,
+        "component": record.name.rpartition(".")[2],
+        "msg": record.getMessage(),
+        "thread": record.threadName
+    }
+    sampled = getattr(record, "sampled", 1)
+    if sampled > 1:
+        data["sampled"] = sampled
+    if record.exc_info:
+        data["exc"] = logging.Formatter().formatException(record.exc_info)
+    return data
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            component, level = item.split("=", 1)
+            levels[component.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(level: Optional[str] = None, levels: Optional[Dict[str, str]] = None,
+              fmt: Optional[str] = None, ring_size: Optional[int] = None):
+    """
+    Set up the "telepat" logger tree (idempotent unless arguments are given)
+
+    Arguments override the corresponding environment variables.
+    """
+    global _configured, _ring
+
+    with _configure_lock:
+        if _configured and level is None and levels is None and fmt is None and ring_size is None:
+            return
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel((level or os.getenv("TELEPAT_LOG_LEVEL", "INFO")).upper())
+        root.propagate = False
+
+        component_levels = _parse_levels(os.getenv("TELEPAT_LOG_LEVELS", ""))
+        component_levels.update(levels or {})
+        for component, component_level in component_levels.items():
+            logging.getLogger(f"{ROOT_LOGGER}.{component}").setLevel(component_level)
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        stream = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter() if (fmt or os.getenv("TELEPAT_LOG_FORMAT", "text")) == "json" else TextFormatter())
+        stream.addFilter(SamplingFilter())
+        root.addHandler(stream)
+
+        if ring_size is None:
+            ring_size = int(os.getenv("TELEPAT_LOG_RING", "0"))
+        _ring = None
+        if ring_size > 0:
+            _ring = RingBufferHandler(ring_size)
+            _ring.addFilter(SamplingFilter())
+            root.addHandler(_ring)
+
+        _configured = True
+
+
+def get_logger(component: str) -> logging.Logger:
+    """Return the logger for a component (e.g. "sdk", "server", "agent")"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+def ring_buffer() -> Optional[RingBufferHandler]:
+    """Return the ring buffer handler, or None when TELEPAT_LOG_RING is off"""
+    return _ring
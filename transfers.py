@@ -0,0 +1,206 @@
+"""
+TelePAT file transfer staging
+
+Receives large files from agents in chunks for server.py, so neither the
+agent nor the server holds a whole file in memory:
+- Each command's file is staged as "<command_id>.part" in the transfer
+  directory; append() writes a chunk at an offset, which must equal the
+  bytes already received (anything else raises OffsetMismatch carrying the
+  current offset, so the agent can resume from there)
+- offset() reports how much has been received, for resuming after a
+  dropped connection or an agent restart
+- finish() checks the size and sha256 of the staged file (read back in
+  chunks) and renames it to "<command_id>.file"
+- Files are deleted ttl seconds after their last write, whether finished
+  or abandoned
+- token() derives a per-command download token (HMAC of the command ID)
+  for URLs that expose a finished file; check_token() verifies it
+"""
+
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Optional
+
+from scheduler import Scheduler, default_scheduler
+from telelog import get_logger
+
+
+log = get_logger("transfers")
+
+COMMAND_ID = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+COPY_BYTES = 1024 * 1024
+
+
+class OffsetMismatch(Exception):
+    """A chunk does not continue where the staged file ends"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"expected offset {offset}")
+        self.offset = offset
+
+
+class TransferStore:
+    """
+    Chunked, resumable file uploads staged on disk
+
+    Args:
+        directory: Where staged files are kept (created on first use)
+        max_bytes: Largest file accepted
+        ttl: Seconds a file is kept after its last write
+        scheduler: Runs the cleanup pass (default: default_scheduler())
+        secret: Key for download tokens (default: random per process, so
+            tokens stop working after a restart)
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 16 * 1024 ** 3, ttl: float = 3600.0,
+                 scheduler: Optional[Scheduler] = None, secret: Optional[bytes] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.scheduler = scheduler or default_scheduler()
+        self._secret = secret or os.urandom(32)
+
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}  # command_id -> lock held while its file is written
+        self.stats = {"chunks": 0, "bytes": 0, "finished": 0, "mismatches": 0, "expired": 0}
+        self._timer = None
+
+    @staticmethod
+    def valid(command_id: str) -> bool:
+        """Whether a command ID can be used as a file name"""
+        return bool(COMMAND_ID.match(command_id or ""))
+
+    def token(self, command_id: str) -> str:
+        """Download token for a command's finished file"""
+        return hmac.new(self._secret, command_id.encode(), hashlib.sha256).hexdigest()
+
+    def check_token(self, command_id: str, token: str) -> bool:
+        """Whether token is the download token of command_id (constant-time compare)"""
+        return hmac.compare_digest(self.token(command_id), token or "")
+
+    def part_path(self, command_id: str) -> str:
+        return os.path.join(self.directory, f"{command_id}.part")
+
+    def file_path(self, command_id: str) -> str:
+        return os.path.join(self.directory, f"{command_id}.file")
+
+    def offset(self, command_id: str) -> int:
+        """Bytes received so far (0 for an unknown transfer)"""
+        try:
+            return os.path.getsize(self.part_path(command_id))
+        except OSError:
+            return 0
+
+    def append(self, command_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> int:
+        """
+        Write a chunk read from stream at offset
+
+        Args:
+            command_id: Transfer (validated with valid())
+            offset: Position of the chunk in the file
+            stream: Chunk body, copied to disk in COPY_BYTES pieces
+            length: Chunk size if known (checked against max_bytes up front)
+
+        Returns:
+            The new offset
+
+        Raises:
+            OffsetMismatch: offset is not the current end of the staged file
+            ValueError: The file would exceed max_bytes
+        """
+        with self._chunk_lock(command_id):
+            current = self.offset(command_id)
+            if offset != current:
+                self.stats["mismatches"] += 1
+                raise OffsetMismatch(current)
+            if length is not None and offset + length > self.max_bytes:
+                raise ValueError(f"file exceeds {self.max_bytes} bytes")
+            os.makedirs(self.directory, exist_ok=True)
+            if self._timer is None:
+                self._timer = self.scheduler.every(min(300.0, self.ttl), self._cleanup, blocking=True)
+
+            written = 0
+            with open(self.part_path(command_id), "ab") as f:
+                try:
+                    while True:
+                        data = stream.read(COPY_BYTES)
+                        if not data:
+                            break
+                        if offset + written + len(data) > self.max_bytes:
+                            raise ValueError(f"file exceeds {self.max_bytes} bytes")
+                        f.write(data)
+                        written += len(data)
+                except Exception:
+                    # Drop the partial chunk so the next attempt starts at a chunk boundary
+                    f.truncate(offset)
+                    raise
+            self.stats["chunks"] += 1
+            self.stats["bytes"] += written
+            return offset + written
+
+    def finish(self, command_id: str, size: int, sha256: str) -> str:
+        """
+        Verify a completely received file and mark it finished
+
+        Returns:
+            Path of the finished file
+
+        Raises:
+            ValueError: Size or hash do not match, or nothing was received
+        """
+        with self._chunk_lock(command_id):
+            path = self.part_path(command_id)
+            if not os.path.exists(path):
+                if os.path.exists(self.file_path(command_id)):
+                    return self.file_path(command_id)  # finished by an earlier (retried) result
+                raise ValueError(f"no staged file for command {command_id}")
+            received = os.path.getsize(path)
+            if received != size:
+                raise ValueError(f"received {received} of {size} bytes")
+            digest = hashlib.sha256()
+            buffer = bytearray(COPY_BYTES)
+            view = memoryview(buffer)
+            with open(path, "rb") as f:
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+            if digest.hexdigest() != sha256:
+                raise ValueError("sha256 mismatch")
+            os.replace(path, self.file_path(command_id))
+            self.stats["finished"] += 1
+            return self.file_path(command_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for the stats endpoint"""
+        return dict(self.stats)
+
+    def _chunk_lock(self, command_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(command_id)
+            if lock is None:
+                lock = self._locks[command_id] = threading.Lock()
+            return lock
+
+    def _cleanup(self):
+        """Periodic pass: delete files not written for ttl seconds"""
+        cutoff = time.time() - self.ttl
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    self.stats["expired"] += 1
+            except OSError as e:
+                log.debug("Could not remove %s: %s", entry.path, e)
+        with self._lock:
+            self._locks = {cid: lock for cid, lock in self._locks.items()
+                           if lock.locked() or os.path.exists(self.part_path(cid))}